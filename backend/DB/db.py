@@ -1,16 +1,18 @@
 # db.py
-from sqlalchemy import create_engine, text, bindparam
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.dialects.postgresql import JSONB
 from dotenv import load_dotenv
 import os
 import json
 import random
 import string
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Callable
 from contextlib import contextmanager
 from datetime import date
 
+from DB import statements as stmts
+from DB.identity import IdentityResolver
+
 
 # --- Config ---
 load_dotenv()
@@ -65,6 +67,10 @@ engine = create_engine(
     future=True,
 )
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+stmts.instrument(engine)
+
+# Email -> (role, id, trainers_code), shared by the helpers below (see DB/identity.py)
+identities = IdentityResolver(SessionLocal)
 
 # --------------------------
 # Helpers for the ERD schema
@@ -75,11 +81,8 @@ def _sanitize_email(email: str) -> str:
     return (email or "").strip().strip(",;")
 
 def get_trainers_code_by_email(db, email: str) -> Optional[str]:
-    row = db.execute(
-        text("SELECT trainers_code FROM trainer_user WHERE email = :email"),
-        {"email": email},
-    ).fetchone()
-    return row[0] if row else None
+    """trainers_code as seen by the caller's transaction `db`."""
+    return identities.trainers_code(email, db=db)
 
 def upsert_trainer_return_code(
     db,
@@ -92,6 +95,7 @@ def upsert_trainer_return_code(
     Ensure a trainer exists in trainer_user and return trainers_code.
     - If trainer exists (by unique email), optionally updates names and returns existing trainers_code.
     - If not, inserts a new row; if trainers_code not provided, generates a simple code.
+      The caller invalidates `identities` for the email after committing.
     """
     email = _sanitize_email(email)
 
@@ -99,12 +103,7 @@ def upsert_trainer_return_code(
     if code:
         # Optional update of names if given
         db.execute(
-            text("""
-                UPDATE trainer_user
-                   SET first_name = COALESCE(:first_name, first_name),
-                       last_name  = COALESCE(:last_name,  last_name)
-                 WHERE email = :email
-            """),
+            stmts.UPDATE_TRAINER_NAMES,
             {"first_name": first_name, "last_name": last_name, "email": email},
         )
         return code
@@ -114,14 +113,7 @@ def upsert_trainer_return_code(
         trainers_code = (local[:20] + "-001").lower()
 
     row = db.execute(
-        text("""
-            INSERT INTO trainer_user (first_name, last_name, email, password, trainers_code)
-            VALUES (:first_name, :last_name, :email, :password, :trainers_code)
-            ON CONFLICT (email) DO UPDATE
-              SET first_name = EXCLUDED.first_name,
-                  last_name  = EXCLUDED.last_name
-            RETURNING trainers_code
-        """),
+        stmts.UPSERT_TRAINER,
         {
             "first_name": first_name or "",
             "last_name": last_name or "",
@@ -130,16 +122,22 @@ def upsert_trainer_return_code(
             "trainers_code": trainers_code,
         },
     ).fetchone()
+    identities.notify(db, email)
     return row[0]
 
 
 
-def insert_onboarding_form_for_trainer_email(trainer_email: str, form_dict: Dict[str, Any]) -> Dict[str, Any]:
+def insert_onboarding_form_for_trainer_email(
+    trainer_email: str,
+    form_dict: Dict[str, Any],
+    before_commit: Optional[Callable[[Any, str], None]] = None,
+) -> Dict[str, Any]:
     """
     Ensure trainer exists, then insert onboarding_forms with:
       - trainers_code (FK to trainer_user.trainers_code)
       - title, description
       - form_schema_json (JSONB)
+    `before_commit(db, trainers_code)` runs inside the same transaction.
     """
     trainer_email = _sanitize_email(trainer_email)
 
@@ -147,20 +145,11 @@ def insert_onboarding_form_for_trainer_email(trainer_email: str, form_dict: Dict
         try:
             code = upsert_trainer_return_code(db, email=trainer_email)
 
-            stmt = (
-                text("""
-                    INSERT INTO onboarding_forms (trainers_code, title, description, form_schema_json)
-                    VALUES (:trainers_code, :title, :description, :form_schema_json)
-                    RETURNING id
-                """)
-                .bindparams(bindparam("form_schema_json", type_=JSONB))
-            )
-
             title = form_dict.get("name") or "Untitled form"
             description = form_dict.get("description")
 
             row = db.execute(
-                stmt,
+                stmts.INSERT_ONBOARDING_FORM,
                 {
                     "trainers_code": code,
                     "title": title,
@@ -168,8 +157,16 @@ def insert_onboarding_form_for_trainer_email(trainer_email: str, form_dict: Dict
                     "form_schema_json": form_dict,
                 },
             ).fetchone()
+            if before_commit is not None:
+                before_commit(db, code)
             db.commit()
-            return {"status": "success", "onboarding_form_id": int(row[0]), "trainers_code": code}
+            identities.invalidate(trainer_email)
+            return {
+                "status": "success",
+                "onboarding_form_id": int(row.id),
+                "form_version_id": int(row.version_id),
+                "trainers_code": code,
+            }
 
         except Exception:
             db.rollback()
@@ -177,25 +174,14 @@ def insert_onboarding_form_for_trainer_email(trainer_email: str, form_dict: Dict
 
 def list_trainers() -> List[Dict[str, Any]]:
     with SessionLocal() as db:
-        rows = db.execute(
-            text("SELECT id, first_name, last_name, email, trainers_code, created_at FROM trainer_user ORDER BY id")
-        ).fetchall()
+        rows = db.execute(stmts.LIST_TRAINERS).fetchall()
         return [dict(r._mapping) for r in rows]
 
 def get_forms_by_trainer_email(trainer_email: str) -> List[Dict[str, Any]]:
     trainer_email = _sanitize_email(trainer_email)
 
     with SessionLocal() as db:
-        rows = db.execute(
-            text("""
-                SELECT f.id, f.title, f.description, f.form_schema_json, f.created_at
-                  FROM onboarding_forms f
-                  JOIN trainer_user t ON t.trainers_code = f.trainers_code
-                 WHERE t.email = :email
-                 ORDER BY f.created_at DESC, f.id DESC
-            """),
-            {"email": trainer_email},
-        ).fetchall()
+        rows = db.execute(stmts.FORMS_BY_TRAINER_EMAIL, {"email": trainer_email}).fetchall()
 
         out: List[Dict[str, Any]] = []
         for r in rows:
@@ -209,102 +195,37 @@ def get_forms_by_trainer_email(trainer_email: str) -> List[Dict[str, Any]]:
             out.append(m)
         return out
 
-# --- Login helper ---
-def check_login(email: str, password: str) -> Optional[Dict[str, Any]]:
-    """
-    Check if a trainer user with the given email and password exists.
-    Returns user data dict if credentials are valid, else None.
-    """
-    email = _sanitize_email(email)
-    print(email, password)
-    
-    with SessionLocal() as db:
-        row = db.execute(
-            text("SELECT * FROM trainer_user WHERE email = :email AND password = :password"),
-            {"email": email, "password": password}
-        ).fetchone()
-        
-        print("DB query result:", row)
-        
-        if row:
-            # Convert row to dictionary
-            # Assuming your columns are: id, first_name, last_name, email, country, phone_number, etc.
-            return {
-                "id": row.id,
-                "first_name": row.first_name,
-                "last_name": row.last_name,
-                "email": row.email,
-                "country": row.country if hasattr(row, 'country') else None,
-                "phone_number": row.phone_number if hasattr(row, 'phone_number') else None,
-                "role": "trainer"
-            }
-        return None
-
 def show_form(email: str) -> list:
     """
     Retrieve all form schemas for a trainer based on their email.
     Returns a list of form_schema_json objects.
     """
     email = _sanitize_email(email)  # Make sure to sanitize email for safety
-    print(email)
-    
+
     # Query the database
     with SessionLocal() as db:
         # Use the parameterized query correctly to retrieve all form schemas for the email
         rows = db.execute(
-            text("""SELECT onboarding_forms.form_schema_json 
-                    FROM onboarding_forms
-                    JOIN trainer_user 
-                    ON onboarding_forms.trainers_code = trainer_user.trainers_code
-                    WHERE trainer_user.email = :email"""),  # Use :email as placeholder
+            stmts.FORM_SCHEMAS_BY_TRAINER_EMAIL,
             {"email": email}  # Pass email as a parameter
         ).fetchall()
 
-        print("DB query result:", rows)
-    
         # If rows are found, return the list of form_schema_json; otherwise, return an empty list
         return [row[0] for row in rows] if rows else []
 
 
-def check_login_client(email: str, password: str) -> Optional[Dict[str, Any]]:
-    """
-    Check if a client user with the given email and password exists.
-    Returns user data dict if credentials are valid, else None.
-    """
-    email = _sanitize_email(email)
-    print(email, password)
-    
-    with SessionLocal() as db:
-        row = db.execute(
-            text("SELECT * FROM client_user WHERE email = :email AND password = :password"),
-            {"email": email, "password": password}
-        ).fetchone()
-        
-        print("DB query result:", row)
-        
-        if row:
-            # Convert row to dictionary
-            return {
-                "id": row.id,
-                "first_name": row.first_name,
-                "last_name": row.last_name,
-                "email": row.email,
-                "country": row.country if hasattr(row, 'country') else None,
-                "phone_number": row.phone_number if hasattr(row, 'phone_number') else None,
-                "role": "client"
-            }
-        return None
-
-def create_account(client_data: Dict[str, Any], role: str) -> bool:
+def create_account(client_data: Dict[str, Any], role: str, password_hash: str) -> bool:
     """
     Create a new user in the appropriate table based on role.
+    `password_hash` is what gets stored (see passwords.py); the plaintext
+    password in client_data is ignored.
     Returns True if creation is successful, else False.
     """
 
     # Extract once so both branches can use them
     first_name   = client_data.get("first_name") or ""
     last_name    = client_data.get("last_name") or ""
-    password     = client_data.get("password") or ""   # TODO: hash this!
+    password     = password_hash
     phone_number = client_data.get("phone_number") or ""
     country      = client_data.get("country") or ""
     email        = _sanitize_email(client_data.get("email"))
@@ -312,12 +233,7 @@ def create_account(client_data: Dict[str, Any], role: str) -> bool:
 
     # Choose the table explicitly to avoid injection
     if role == "client":
-                insert_sql = text("""
-                    INSERT INTO client_user
-                      (first_name, last_name, email, password, phone_number, country)
-                    VALUES
-                      (:first_name, :last_name, :email, :password, :phone_number, :country)
-                """)
+                insert_sql = stmts.INSERT_CLIENT_USER
                 params = {
                     "first_name": first_name,
                     "last_name": last_name,
@@ -328,12 +244,7 @@ def create_account(client_data: Dict[str, Any], role: str) -> bool:
                 }
     elif role == "trainer":
         trainers_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-        insert_sql = text("""
-            INSERT INTO trainer_user
-              (first_name, last_name, email, password, phone_number, country, trainers_code)
-            VALUES
-              (:first_name, :last_name, :email, :password, :phone_number, :country, :trainers_code)
-        """)
+        insert_sql = stmts.INSERT_TRAINER_USER
         params = {
             "first_name": first_name,
             "last_name": last_name,
@@ -352,7 +263,9 @@ def create_account(client_data: Dict[str, Any], role: str) -> bool:
     with SessionLocal() as db:
         try:
             db.execute(insert_sql, params)
+            identities.notify(db, email)
             db.commit()
+            identities.invalidate(email)
             return True
         except Exception as e:
             print(f"Error creating {role} account:", e)
@@ -360,10 +273,16 @@ def create_account(client_data: Dict[str, Any], role: str) -> bool:
             return False
     
 
-def resave(form_data: Dict[str, Any]) -> bool:
+def resave(
+    form_data: Dict[str, Any],
+    before_commit: Optional[Callable[[Any, str], None]] = None,
+) -> Optional[str]:
     """
     Resave the form data into the onboarding_forms table.
-    Returns True if successful, else False.
+    A changed schema is stored as a new form version; an unchanged one is a no-op.
+    `before_commit(db, trainers_code)` runs inside the same transaction, only
+    when a new version was written.
+    Returns the form's trainers_code if successful, else None.
     """
     # formSchema is the nested object we care about
     form_schema = form_data.get("formSchema") or {}
@@ -371,7 +290,7 @@ def resave(form_data: Dict[str, Any]) -> bool:
 
     if not form_id:
         print("Form ID is required for resaving.")
-        return False
+        return None
 
     # Use fields from formSchema (your payload structure)
     title = form_schema.get("name", "Untitled form")
@@ -380,45 +299,85 @@ def resave(form_data: Dict[str, Any]) -> bool:
 
     with SessionLocal() as db:
         try:
-            stmt = (
-                text("""
-                    UPDATE onboarding_forms
-                    SET
-                        title = :title,
-                        description = :description,
-                        form_schema_json = :form_schema_json,
-                        created_at = NOW()
-                    WHERE
-                        form_schema_json->>'id' = :form_id;
-                """)
-                .bindparams(
-                    bindparam("form_schema_json", type_=JSONB),
-                )
-            )
-
             result = db.execute(
-                stmt,
+                stmts.RESAVE_FORM,
                 {
                     "title": title,
                     "description": description,
                     "form_schema_json": form_schema_json,
                     "form_id": form_id,
                 },
-            )
-            db.commit()
+            ).fetchone()
 
-            if result.rowcount == 0:
+            if not result.found:
+                db.rollback()
                 print(f"No form found with id {form_id}")
-                return False
+                return None
 
-            return True
+            if result.version_id is None:
+                print(f"Form {form_id} unchanged, no new version")
+            elif before_commit is not None:
+                before_commit(db, result.trainers_code)
+            db.commit()
+            return result.trainers_code
 
         except Exception as e:
             print("Error resaving form:", e)
             db.rollback()
-            return False
+            return None
         
 
+def get_form_by_uid(form_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch one onboarding form by its client-side id (form_schema_json's "id").
+    Returns None if there is no such form.
+    """
+    with SessionLocal() as db:
+        row = db.execute(stmts.FORM_BY_UID, {"form_id": form_id}).fetchone()
+        if not row:
+            return None
+
+        m = dict(row._mapping)
+        if isinstance(m.get("form_schema_json"), str):
+            try:
+                m["form_schema_json"] = json.loads(m["form_schema_json"])
+            except Exception:
+                pass
+        return m
+
+
+def get_form_versions(form_id: str) -> List[Dict[str, Any]]:
+    """Version history of a form, newest first."""
+    with SessionLocal() as db:
+        rows = db.execute(stmts.FORM_VERSIONS_BY_UID, {"form_id": form_id}).fetchall()
+        return [dict(r._mapping) for r in rows]
+
+
+def get_form_version_ref(form_id: str, form_version_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    {"id", "content_hash"} of the requested version of a form, or of its current
+    version when none is given. Returns None if the form (or that version) doesn't exist.
+    """
+    with SessionLocal() as db:
+        row = db.execute(
+            stmts.FORM_VERSION_REF,
+            {"form_id": form_id, "form_version_id": form_version_id},
+        ).fetchone()
+        return dict(row._mapping) if row else None
+
+
+def get_form_blob(content_hash: str) -> Optional[Dict[str, Any]]:
+    """The form schema stored under a content hash, or None."""
+    with SessionLocal() as db:
+        schema = db.execute(stmts.FORM_BLOB, {"content_hash": content_hash}).scalar()
+        if isinstance(schema, str):
+            try:
+                schema = json.loads(schema)
+            except Exception:
+                return None
+        return schema
+
+
 def changeTrainerscode(koppelcode: json) -> bool:
     """
     Change the trainers_code for a trainer user.
@@ -426,7 +385,6 @@ def changeTrainerscode(koppelcode: json) -> bool:
     """
     new_code = koppelcode["code"]
     email = _sanitize_email(koppelcode['email'])
-    print(new_code, email)
 
     if not new_code or not email:
         print("Both new trainers_code and email are required.")
@@ -435,14 +393,12 @@ def changeTrainerscode(koppelcode: json) -> bool:
     with SessionLocal() as db:
         try:
             result = db.execute(
-                text("""
-                    UPDATE trainer_user
-                    SET trainers_code = :new_code
-                    WHERE email = :email;
-                """),
+                stmts.UPDATE_TRAINERS_CODE,
                 {"new_code": new_code, "email": email},
             )
+            identities.notify(db, email)
             db.commit()
+            identities.invalidate(email)
 
             if result.rowcount == 0:
                 print(f"No trainer found with email {email}")
@@ -460,21 +416,8 @@ def fetch_trainer_code(email: str) -> Optional[str]:
     Fetch the trainers_code for a trainer user based on email.
     Returns the trainers_code if found, else None.
     """
-    email = _sanitize_email(email)
-    print(email)
+    return identities.trainers_code(_sanitize_email(email))
 
-    with SessionLocal() as db:
-        row = db.execute(
-            text("SELECT trainers_code FROM trainer_user WHERE email = :email"),
-            {"email": email}
-        ).fetchone()
-
-        print("DB query result:", row)
-
-        if row:
-            return row[0]  # Return the trainers_code
-        return None
-    
 
 
 def client_check_trainer(email: str) -> Dict:
@@ -495,18 +438,12 @@ def client_check_trainer(email: str) -> Dict:
         ]
     }
     """
-    email = _sanitize_email(email)
-
-    query = """
-        SELECT tu.trainers_code, tu.first_name, tu.last_name, tu.email, tu.id
-        FROM client_user cu
-        JOIN client_trainer ct ON ct.client_id = cu.id
-        JOIN trainer_user tu ON tu.trainers_code = ct.trainers_code
-        WHERE cu.email = :email;
-    """
+    client_id = identities.client_id(_sanitize_email(email))
+    if client_id is None:
+        return {"has_trainer": False, "trainers": []}
 
     with SessionLocal() as db:
-        rows = db.execute(text(query), {"email": email}).fetchall()
+        rows = db.execute(stmts.TRAINERS_FOR_CLIENT, {"client_id": client_id}).fetchall()
 
     if not rows:
         return {"has_trainer": False, "trainers": []}
@@ -538,7 +475,7 @@ def fetch_trainer_code_based_of_client(trainerscode: str) -> Optional[str]:
 
     with SessionLocal() as db:
         row = db.execute(
-            text("SELECT trainers_code FROM trainer_user WHERE email = :email"),
+            stmts.TRAINER_CODE_BY_EMAIL,
             {"email": email}
         ).fetchone()
 
@@ -555,52 +492,110 @@ def get_forms_for_trainer_code(trainers_code: str) -> List[Dict[str, Any]]:
     """
     with SessionLocal() as db:
         rows = db.execute(
-            text("""
-                SELECT form_schema_json 
-                FROM onboarding_forms
-                WHERE trainers_code = :trainers_code
-            """),
+            stmts.FORM_SCHEMAS_BY_TRAINERS_CODE,
             {"trainers_code": trainers_code}
         ).fetchall()
 
-        print("DB query result:", rows)
-
         return [row[0] for row in rows] if rows else []
 
 
-def get_client_submissions_for_trainers_code(trainers_code: str) -> List[Dict[str, Any]]:
+def get_client_submissions_for_trainers_code(
+    trainers_code: str,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[Any, int]] = None,
+    fields: Optional[List[str]] = None,
+    summary: bool = False,
+) -> List[Dict[str, Any]]:
     """
-    Retrieve client-submitted onboarding forms for a given trainers_code.
-    Returns a list of dicts with client info and parsed form_data.
+    Retrieve client-submitted onboarding forms for a given trainers_code, newest first.
+    - limit/before: page size and the (submitted_at, id) of the last row already seen
+    - fields: only return these field ids of form_data
+    - summary: leave form_data out entirely
     """
+    mode = "summary" if summary else "fields" if fields else "full"
+    before_at, before_id = before if before else (None, None)
+
     with SessionLocal() as db:
         rows = db.execute(
-            text("""
-                SELECT cof.id, cof.client_id, cof.form_data, cof.trainers_code, cof.submitted_at,
-                       cu.email, cu.first_name, cu.last_name
-                  FROM client_onboarding_form cof
-                  JOIN client_user cu ON cof.client_id = cu.id
-                 WHERE cof.trainers_code = :trainers_code
-                 ORDER BY cof.submitted_at DESC
-            """),
-            {"trainers_code": trainers_code},
+            stmts.CLIENT_SUBMISSIONS_BY_TRAINERS_CODE,
+            {
+                "trainers_code": trainers_code,
+                "mode": mode,
+                "fields": fields or [],
+                "before_at": before_at,
+                "before_id": before_id,
+                "limit": limit,
+            },
         ).fetchall()
 
         out: List[Dict[str, Any]] = []
         for r in rows:
             m = dict(r._mapping)
-            # form_data may be stored as JSON string; parse if needed
-            form_data = m.get("form_data")
-            try:
-                if isinstance(form_data, str):
-                    m["form_data"] = json.loads(form_data)
-            except Exception:
-                # leave as-is on parse error
-                pass
+            if summary:
+                m.pop("form_data", None)
             out.append(m)
 
         return out
-    
+
+
+def search_client_submissions(trainers_code: str, q: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Full-text search over a trainer's client submissions (web-search syntax:
+    words, "quoted phrases", -excluded). Best matches first, with snippets.
+    """
+    with SessionLocal() as db:
+        rows = db.execute(
+            stmts.SEARCH_CLIENT_SUBMISSIONS,
+            {"trainers_code": trainers_code, "q": q, "limit": limit},
+        ).fetchall()
+        return [dict(r._mapping) for r in rows]
+
+
+def get_form_answer_stats(
+    trainers_code: str,
+    form_id: str,
+    field_ids: List[str],
+    choice_field_ids: List[str],
+    numeric_field_ids: List[str],
+    buckets: int,
+) -> Dict[str, Any]:
+    """
+    Raw per-field aggregates over a trainer's submissions of one form:
+    {"submissions": n, "answered": {field: n}, "options": {field: {answer: n}},
+     "numeric": {field: {"n", "min", "max", "mean", "median", "buckets": {bucket: n}}}}
+    """
+    params = {"trainers_code": trainers_code, "form_id": form_id}
+    out: Dict[str, Any] = {"submissions": 0, "answered": {}, "options": {}, "numeric": {}}
+
+    with SessionLocal() as db:
+        for r in db.execute(stmts.FORM_ANSWER_COMPLETION, {**params, "field_ids": field_ids}):
+            if r.field_id is None:
+                out["submissions"] = r.n
+            else:
+                out["answered"][r.field_id] = r.n
+
+        if choice_field_ids:
+            for r in db.execute(stmts.FORM_ANSWER_OPTIONS, {**params, "field_ids": choice_field_ids}):
+                out["options"].setdefault(r.field_id, {})[r.answer] = r.n
+
+        if numeric_field_ids:
+            rows = db.execute(
+                stmts.FORM_ANSWER_NUMERIC,
+                {**params, "field_ids": numeric_field_ids, "buckets": buckets},
+            )
+            for r in rows:
+                field = out["numeric"].setdefault(r.field_id, {
+                    "n": r.n,
+                    "min": float(r.lo),
+                    "max": float(r.hi),
+                    "mean": float(r.mean),
+                    "median": float(r.median),
+                    "buckets": {},
+                })
+                field["buckets"][r.bucket] = r.count
+
+    return out
+
 
 def linktrainercode(client_email: str, trainers_code: str) -> bool:
     """
@@ -608,28 +603,16 @@ def linktrainercode(client_email: str, trainers_code: str) -> bool:
     Returns True if successful, else False.
     """
     client_email = _sanitize_email(client_email)
+    client_id = identities.client_id(client_email)
+    if client_id is None:
+        print(f"No client found with email {client_email}")
+        return False
 
     with SessionLocal() as db:
         try:
-            # Fetch client ID based on email
-            client_row = db.execute(
-                text("SELECT id FROM client_user WHERE email = :email"),
-                {"email": client_email}
-            ).fetchone()
-
-            if not client_row:
-                print(f"No client found with email {client_email}")
-                return False
-
-            client_id = client_row[0]
-
             # Insert into client_trainer linking table
             db.execute(
-                text("""
-                    INSERT INTO client_trainer (client_id, trainers_code)
-                    VALUES (:client_id, :trainers_code)
-                    ON CONFLICT DO NOTHING
-                """),
+                stmts.LINK_CLIENT_TRAINER,
                 {"client_id": client_id, "trainers_code": trainers_code}
             )
             db.commit()
@@ -641,72 +624,51 @@ def linktrainercode(client_email: str, trainers_code: str) -> bool:
             return False
         
 
-def save_form_details_client(client_email: str, trainers_code: str, form_id: str, form_data: Dict[str, Any]) -> bool:
+def save_form_details_client(
+    client_email: str,
+    trainers_code: str,
+    form_id: str,
+    form_data: Dict[str, Any],
+    form_version_id: Optional[int] = None,
+    before_commit: Optional[Callable[[Any], None]] = None,
+) -> bool:
     """
     Save client form submission and link to trainer.
+    One row per (client, form) holds the latest answers; every submission is
+    also appended to client_onboarding_form_history, both in one statement.
+    The submission records the form version it answered (`form_version_id`,
+    defaulting to the form's current version). `before_commit(db)` runs inside
+    the same transaction, e.g. to queue a cache invalidation.
     Returns True if successful, else False.
-    
-    Table columns: id (PK), client_id, assigned_at, form_data (jsonb), trainers_code, submitted_at
     """
     client_email = _sanitize_email(client_email)
-    
+    client_id = identities.client_id(client_email)
+    if client_id is None:
+        print(f"No client found with email {client_email}")
+        return False
+
     with SessionLocal() as db:
         try:
-            # Fetch client ID based on email
-            client_row = db.execute(
-                text("SELECT id FROM client_user WHERE email = :email"),
-                {"email": client_email}
+            row = db.execute(
+                stmts.SAVE_CLIENT_SUBMISSION,
+                {
+                    "client_id": client_id,
+                    "form_data": form_data,
+                    "trainers_code": trainers_code,
+                    "form_id": form_id,
+                    "form_version_id": form_version_id
+                }
             ).fetchone()
-            
-            if not client_row:
+
+            if not row:
+                db.rollback()
                 print(f"No client found with email {client_email}")
                 return False
-            
-            client_id = client_row[0]
-            
-            # Convert form_data dict to JSON string for storage
-            form_data_json = json.dumps(form_data)
-            
-            # Check if a record already exists for this client
-            existing = db.execute(
-                text("SELECT id FROM client_onboarding_form WHERE client_id = :client_id"),
-                {"client_id": client_id}
-            ).fetchone()
-            
-            if existing:
-                # Update existing record
-                db.execute(
-                    text("""
-                        UPDATE client_onboarding_form 
-                        SET form_data = :form_data,
-                            trainers_code = :trainers_code,
-                            submitted_at = NOW()
-                        WHERE client_id = :client_id
-                    """),
-                    {
-                        "client_id": client_id,
-                        "form_data": form_data_json,
-                        "trainers_code": trainers_code
-                    }
-                )
-                print(f"Updated existing form for client {client_email}")
-            else:
-                # Insert new record
-                db.execute(
-                    text("""
-                        INSERT INTO client_onboarding_form (client_id, form_data, trainers_code, submitted_at)
-                        VALUES (:client_id, :form_data, :trainers_code, NOW())
-                    """),
-                    {
-                        "client_id": client_id,
-                        "form_data": form_data_json,
-                        "trainers_code": trainers_code
-                    }
-                )
-                print(f"Inserted new form for client {client_email}")
-            
+
+            if before_commit is not None:
+                before_commit(db)
             db.commit()
-            print(f"Successfully saved form for client {client_email} with trainer code {trainers_code}")
+            print(f"{'Inserted' if row.inserted else 'Updated'} form {form_id} for client {client_email} (history {row.history_id})")
             return True
             
         except Exception as e:
@@ -716,6 +678,24 @@ def save_form_details_client(client_email: str, trainers_code: str, form_id: str
 
 
 
+def get_client_form_assignments(client_email: str, pending_only: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """
+    Forms assigned to a client, newest first, each with `answered_at` (None while
+    pending). Returns None if there is no client with that email.
+    """
+    client_id = identities.client_id(_sanitize_email(client_email))
+    if client_id is None:
+        return None
+
+    with SessionLocal() as db:
+        rows = db.execute(
+            stmts.CLIENT_FORM_ASSIGNMENTS,
+            {"client_id": client_id, "pending_only": pending_only}
+        ).fetchall()
+    return [dict(row._mapping) for row in rows]
+
+
+
 def calculate_calories(carbs: float, protein: float, fat: float) -> float:
     """Calculate total calories from macronutrients"""
     return round((carbs * 4) + (protein * 4) + (fat * 9), 2)
@@ -734,20 +714,7 @@ def insert_food_intake(
     If a record exists for the same user, date, and product, it adds to existing values.
     """
     with get_db() as db:
-        query = text("""
-            INSERT INTO daily_food_intake 
-            (user_id, product_name, carbs, protein, fat, quantity_grams, intake_date)
-            VALUES (:user_id, :product_name, :carbs, :protein, :fat, :quantity_grams, :intake_date)
-            ON CONFLICT (user_id, intake_date, product_name) 
-            DO UPDATE SET 
-                carbs = daily_food_intake.carbs + EXCLUDED.carbs,
-                protein = daily_food_intake.protein + EXCLUDED.protein,
-                fat = daily_food_intake.fat + EXCLUDED.fat,
-                quantity_grams = daily_food_intake.quantity_grams + EXCLUDED.quantity_grams
-            RETURNING id, user_id, product_name, carbs, protein, fat, quantity_grams, intake_date
-        """)
-        
-        result = db.execute(query, {
+        result = db.execute(stmts.FOOD_INTAKE_ACCUMULATE, {
             'user_id': user_id,
             'product_name': product_name,
             'carbs': carbs,
@@ -776,14 +743,7 @@ def insert_food_intake(
 def get_intake_by_date(user_id: int, intake_date: date) -> List[Dict]:
     """Retrieve all food intake records for a user on a specific date"""
     with get_db() as db:
-        query = text("""
-            SELECT id, user_id, product_name, carbs, protein, fat, quantity_grams, intake_date
-            FROM daily_food_intake
-            WHERE user_id = :user_id AND intake_date = :intake_date
-            ORDER BY id
-        """)
-        
-        result = db.execute(query, {'user_id': user_id, 'intake_date': intake_date})
+        result = db.execute(stmts.FOOD_INTAKE_BY_DATE, {'user_id': user_id, 'intake_date': intake_date})
         rows = result.fetchall()
         
         records = []
@@ -809,14 +769,7 @@ def get_intake_by_date_range(
 ) -> List[Dict]:
     """Retrieve all food intake records for a user within a date range"""
     with get_db() as db:
-        query = text("""
-            SELECT id, user_id, product_name, carbs, protein, fat, quantity_grams, intake_date
-            FROM daily_food_intake
-            WHERE user_id = :user_id AND intake_date BETWEEN :start_date AND :end_date
-            ORDER BY intake_date DESC, id
-        """)
-        
-        result = db.execute(query, {
+        result = db.execute(stmts.FOOD_INTAKE_BY_DATE_RANGE, {
             'user_id': user_id,
             'start_date': start_date,
             'end_date': end_date
@@ -842,18 +795,7 @@ def get_intake_by_date_range(
 def get_daily_summary(user_id: int, intake_date: date) -> Dict:
     """Get summary statistics for a user's food intake on a specific date"""
     with get_db() as db:
-        query = text("""
-            SELECT 
-                COUNT(*) as meal_count,
-                COALESCE(SUM(carbs), 0) as total_carbs,
-                COALESCE(SUM(protein), 0) as total_protein,
-                COALESCE(SUM(fat), 0) as total_fat,
-                COALESCE(SUM(quantity_grams), 0) as total_quantity_grams
-            FROM daily_food_intake
-            WHERE user_id = :user_id AND intake_date = :intake_date
-        """)
-        
-        result = db.execute(query, {'user_id': user_id, 'intake_date': intake_date})
+        result = db.execute(stmts.FOOD_INTAKE_DAY_TOTALS, {'user_id': user_id, 'intake_date': intake_date})
         row = result.fetchone()
         
         if row and row[0] > 0:
@@ -889,12 +831,7 @@ def get_daily_summary(user_id: int, intake_date: date) -> Dict:
 def delete_food_intake(record_id: int, user_id: int) -> bool:
     """Delete a specific food intake record"""
     with get_db() as db:
-        query = text("""
-            DELETE FROM daily_food_intake
-            WHERE id = :record_id AND user_id = :user_id
-        """)
-        
-        result = db.execute(query, {'record_id': record_id, 'user_id': user_id})
+        result = db.execute(stmts.FOOD_INTAKE_DELETE, {'record_id': record_id, 'user_id': user_id})
         
         return result.rowcount > 0
 
@@ -910,19 +847,7 @@ def update_food_intake(
 ) -> Optional[Dict]:
     """Update an existing food intake record"""
     with get_db() as db:
-        query = text("""
-            UPDATE daily_food_intake
-            SET product_name = :product_name,
-                carbs = :carbs,
-                protein = :protein,
-                fat = :fat,
-                quantity_grams = :quantity_grams,
-                intake_date = :intake_date
-            WHERE id = :record_id AND user_id = :user_id
-            RETURNING id, user_id, product_name, carbs, protein, fat, quantity_grams, intake_date
-        """)
-        
-        result = db.execute(query, {
+        result = db.execute(stmts.FOOD_INTAKE_UPDATE, {
             'product_name': product_name,
             'carbs': carbs,
             'protein': protein,
@@ -952,14 +877,7 @@ def update_food_intake(
 def get_all_intake_for_user(user_id: int) -> List[Dict]:
     """Get all food intake records for a specific user"""
     with get_db() as db:
-        query = text("""
-            SELECT id, user_id, product_name, carbs, protein, fat, quantity_grams, intake_date
-            FROM daily_food_intake
-            WHERE user_id = :user_id
-            ORDER BY intake_date DESC, id
-        """)
-        
-        result = db.execute(query, {'user_id': user_id})
+        result = db.execute(stmts.FOOD_INTAKE_ALL, {'user_id': user_id})
         rows = result.fetchall()
         
         records = []
@@ -981,12 +899,7 @@ def get_all_intake_for_user(user_id: int) -> List[Dict]:
 def delete_all_intake_for_date(user_id: int, intake_date: date) -> int:
     """Delete all food intake records for a user on a specific date"""
     with get_db() as db:
-        query = text("""
-            DELETE FROM daily_food_intake
-            WHERE user_id = :user_id AND intake_date = :intake_date
-        """)
-        
-        result = db.execute(query, {'user_id': user_id, 'intake_date': intake_date})
+        result = db.execute(stmts.FOOD_INTAKE_DELETE_DATE, {'user_id': user_id, 'intake_date': intake_date})
         
         return result.rowcount
 
@@ -1062,14 +975,7 @@ def get_monthly_summary(user_id: int, year: int, month: int) -> Dict:
 def search_intake_by_product(user_id: int, product_name: str) -> List[Dict]:
     """Search for food intake records by product name (case-insensitive partial match)"""
     with get_db() as db:
-        query = text("""
-            SELECT id, user_id, product_name, carbs, protein, fat, quantity_grams, intake_date
-            FROM daily_food_intake
-            WHERE user_id = :user_id AND LOWER(product_name) LIKE LOWER(:product_name)
-            ORDER BY intake_date DESC, id
-        """)
-        
-        result = db.execute(query, {
+        result = db.execute(stmts.FOOD_INTAKE_SEARCH, {
             'user_id': user_id,
             'product_name': f'%{product_name}%'
         })
@@ -1094,22 +1000,7 @@ def search_intake_by_product(user_id: int, product_name: str) -> List[Dict]:
 def get_most_consumed_products(user_id: int, limit: int = 10) -> List[Dict]:
     """Get the most frequently consumed products for a user"""
     with get_db() as db:
-        query = text("""
-            SELECT 
-                product_name,
-                COUNT(*) as consumption_count,
-                SUM(quantity_grams) as total_quantity,
-                AVG(carbs) as avg_carbs,
-                AVG(protein) as avg_protein,
-                AVG(fat) as avg_fat
-            FROM daily_food_intake
-            WHERE user_id = :user_id
-            GROUP BY product_name
-            ORDER BY consumption_count DESC
-            LIMIT :limit
-        """)
-        
-        result = db.execute(query, {'user_id': user_id, 'limit': limit})
+        result = db.execute(stmts.FOOD_INTAKE_MOST_CONSUMED, {'user_id': user_id, 'limit': limit})
         rows = result.fetchall()
         
         products = []
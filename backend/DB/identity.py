@@ -0,0 +1,110 @@
+# identity.py
+"""
+Email -> identity resolution shared by the helpers in DB/db.py.
+
+Trainers and clients are looked up by email all over the DB layer.
+`IdentityResolver` answers those lookups from an in-process LRU and fetches
+every uncached email of a call in one query. Unknown emails are remembered
+only briefly (`unknown_ttl`), since a new account should become visible fast.
+
+Anything that creates a user or changes a trainers_code calls `notify(db,
+email)` inside its transaction and `invalidate(email)` after committing: the
+entry is dropped here and, once the commit lands, on every other worker. A
+lookup that was in flight during an invalidation is returned but not cached.
+Emails are expected already sanitized (db._sanitize_email).
+"""
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import invalidation
+from cache import TTLCache, VersionCounter
+from DB import statements as stmts
+
+
+KIND = "identity"
+
+
+class Identity(NamedTuple):
+    role: str  # "trainer" or "client"
+    id: int
+    trainers_code: Optional[str]  # trainers only
+
+
+class IdentityResolver:
+    def __init__(self, session_factory, maxsize: int = 50000, ttl: float = 600, unknown_ttl: float = 5):
+        self.session_factory = session_factory
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._unknown = TTLCache(maxsize=maxsize, ttl=unknown_ttl)
+        self._versions = VersionCounter(maxsize=maxsize)
+        self.queries = 0
+        invalidation.register(KIND, self.invalidate)
+        invalidation.register_reset(self.reset)
+
+    def resolve_many(self, emails: Iterable[str], db=None) -> Dict[str, Dict[str, Identity]]:
+        """
+        {email: {role: Identity}} for every given email; {} for unknown ones.
+        With `db`, reads through that session (seeing its uncommitted writes)
+        and leaves the cache alone.
+        """
+        emails = list(dict.fromkeys(e for e in emails if e))
+        if db is not None:
+            return self._fetch(db, emails)
+
+        out: Dict[str, Dict[str, Identity]] = {}
+        missing = []
+        for email in emails:
+            cached = self._cache.get(email)
+            if cached is None:
+                cached = self._unknown.get(email)
+            if cached is None:
+                missing.append(email)
+            else:
+                out[email] = cached
+
+        if missing:
+            versions = {email: self._versions.current(email) for email in missing}
+            with self.session_factory() as session:
+                found = self._fetch(session, missing)
+            for email, roles in found.items():
+                # Invalidated while we were reading: the answer may predate the change
+                if self._versions.current(email) == versions[email]:
+                    (self._cache if roles else self._unknown).set(email, roles)
+                out[email] = roles
+
+        return out
+
+    def resolve(self, email: str, role: str, db=None) -> Optional[Identity]:
+        return self.resolve_many([email], db=db).get(email, {}).get(role)
+
+    def client_id(self, email: str, db=None) -> Optional[int]:
+        identity = self.resolve(email, "client", db=db)
+        return identity.id if identity else None
+
+    def trainers_code(self, email: str, db=None) -> Optional[str]:
+        identity = self.resolve(email, "trainer", db=db)
+        return identity.trainers_code if identity else None
+
+    def notify(self, db, email: str) -> None:
+        """Queue the cross-worker invalidation; only sent if `db` commits."""
+        invalidation.notify(db, KIND, email)
+
+    def invalidate(self, email: str) -> None:
+        self._versions.bump(email)
+        self._cache.pop(email)
+        self._unknown.pop(email)
+
+    def reset(self) -> None:
+        """Forget everything, e.g. after invalidation messages may have been missed."""
+        self._versions.bump_all()
+        self._cache.clear()
+        self._unknown.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "unknown": self._unknown.stats(), "queries": self.queries}
+
+    def _fetch(self, db, emails) -> Dict[str, Dict[str, Identity]]:
+        found: Dict[str, Dict[str, Identity]] = {email: {} for email in emails}
+        if emails:
+            self.queries += 1
+            for row in db.execute(stmts.IDENTITIES_BY_EMAIL, {"emails": emails}):
+                found[row.email][row.role] = Identity(row.role, row.id, row.trainers_code)
+        return found
@@ -0,0 +1,57 @@
+# migrate.py
+"""
+Apply the numbered SQL files in DB/migrations in order.
+Each file runs in its own transaction and is recorded in schema_migrations,
+so re-running only applies what is new.
+
+Usage (from backend/):  python -m DB.migrate
+"""
+import os
+from typing import List
+
+from sqlalchemy import text
+
+from DB.db import engine
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def pending_migrations(applied: set) -> List[str]:
+    files = sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+    return [f for f in files if f not in applied]
+
+
+def migrate() -> List[str]:
+    """Apply all pending migrations. Returns the filenames that were applied."""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                filename   TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """))
+        applied = {row[0] for row in conn.execute(text("SELECT filename FROM schema_migrations"))}
+
+    done: List[str] = []
+    for filename in pending_migrations(applied):
+        with open(os.path.join(MIGRATIONS_DIR, filename), encoding="utf-8") as fh:
+            sql = fh.read()
+
+        with engine.begin() as conn:
+            # no_parameters: run the file verbatim so '%' in SQL isn't taken as a placeholder
+            conn.execution_options(no_parameters=True).exec_driver_sql(sql)
+            conn.execute(
+                text("INSERT INTO schema_migrations (filename) VALUES (:filename)"),
+                {"filename": filename},
+            )
+        print(f"Applied migration {filename}")
+        done.append(filename)
+
+    if not done:
+        print("Database schema is up to date")
+    return done
+
+
+if __name__ == "__main__":
+    migrate()
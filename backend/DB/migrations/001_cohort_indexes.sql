@@ -0,0 +1,7 @@
+-- Indexes backing the trainer cohort dashboard (/trainer/{trainers_code}/cohort).
+-- daily_food_intake is always filtered by user_id + intake_date.
+CREATE INDEX IF NOT EXISTS ix_daily_food_intake_user_date
+    ON daily_food_intake (user_id, intake_date);
+
+CREATE INDEX IF NOT EXISTS ix_client_trainer_trainers_code
+    ON client_trainer (trainers_code, client_id);
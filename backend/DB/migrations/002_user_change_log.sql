@@ -0,0 +1,76 @@
+-- Change log behind /sync/{user_id}: one row per intake record, favorite and
+-- goals row, holding its latest state (op 'U' + data) or a tombstone (op 'D').
+--
+-- Rows are stamped with the writing transaction's id. Readers only return rows
+-- whose txid is below the xmin of their snapshot, i.e. from transactions that
+-- have all finished, and hand that xmin back as the next cursor. Unlike a
+-- sequence number, this can never skip a transaction that commits late.
+CREATE TABLE IF NOT EXISTS user_change_log (
+    entity     TEXT        NOT NULL,
+    entity_id  TEXT        NOT NULL,
+    user_id    TEXT        NOT NULL,
+    op         CHAR(1)     NOT NULL,
+    data       JSONB,
+    txid       BIGINT      NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (entity, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_change_log_user_txid
+    ON user_change_log (user_id, txid);
+
+-- TG_ARGV[0] = entity name used by the sync API, TG_ARGV[1] = key column
+CREATE OR REPLACE FUNCTION log_user_change() RETURNS trigger AS $$
+DECLARE
+    rec JSONB;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := to_jsonb(OLD);
+    ELSE
+        rec := to_jsonb(NEW);
+    END IF;
+
+    INSERT INTO user_change_log (entity, entity_id, user_id, op, data, txid, changed_at)
+    VALUES (
+        TG_ARGV[0],
+        rec->>TG_ARGV[1],
+        rec->>'user_id',
+        CASE WHEN TG_OP = 'DELETE' THEN 'D' ELSE 'U' END,
+        CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE rec END,
+        txid_current(),
+        NOW()
+    )
+    ON CONFLICT (entity, entity_id) DO UPDATE
+        SET user_id    = EXCLUDED.user_id,
+            op         = EXCLUDED.op,
+            data       = EXCLUDED.data,
+            txid       = EXCLUDED.txid,
+            changed_at = EXCLUDED.changed_at;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_daily_food_intake_change_log ON daily_food_intake;
+CREATE TRIGGER trg_daily_food_intake_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON daily_food_intake
+    FOR EACH ROW EXECUTE FUNCTION log_user_change('intake', 'id');
+
+DROP TRIGGER IF EXISTS trg_user_favorites_change_log ON user_favorites;
+CREATE TRIGGER trg_user_favorites_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON user_favorites
+    FOR EACH ROW EXECUTE FUNCTION log_user_change('favorites', 'id');
+
+DROP TRIGGER IF EXISTS trg_user_nutrition_goals_change_log ON user_nutrition_goals;
+CREATE TRIGGER trg_user_nutrition_goals_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON user_nutrition_goals
+    FOR EACH ROW EXECUTE FUNCTION log_user_change('goals', 'user_id');
+
+-- Existing rows, so a first sync (since=0) returns everything
+INSERT INTO user_change_log (entity, entity_id, user_id, op, data, txid)
+SELECT 'intake', i.id::text, i.user_id::text, 'U', to_jsonb(i), txid_current() FROM daily_food_intake i
+UNION ALL
+SELECT 'favorites', f.id::text, f.user_id::text, 'U', to_jsonb(f), txid_current() FROM user_favorites f
+UNION ALL
+SELECT 'goals', g.user_id::text, g.user_id::text, 'U', to_jsonb(g), txid_current() FROM user_nutrition_goals g
+ON CONFLICT (entity, entity_id) DO NOTHING;
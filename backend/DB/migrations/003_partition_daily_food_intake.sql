@@ -0,0 +1,72 @@
+-- Monthly range partitioning of daily_food_intake on intake_date.
+--
+-- The existing table is kept as daily_food_intake_unpartitioned (its id
+-- sequence is still used by the new table's default); drop it with CASCADE
+-- only after re-pointing the sequence if it is ever removed.
+-- Upcoming partitions are created by ensure_daily_food_intake_partitions(),
+-- which DB/partitions.py runs at startup; old ones are detached and archived
+-- by `python -m DB.partitions archive`.
+
+ALTER TABLE daily_food_intake RENAME TO daily_food_intake_unpartitioned;
+ALTER INDEX IF EXISTS ix_daily_food_intake_user_date RENAME TO ix_daily_food_intake_unpartitioned_user_date;
+
+CREATE TABLE daily_food_intake (
+    LIKE daily_food_intake_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+) PARTITION BY RANGE (intake_date);
+
+-- Primary and unique keys on a partitioned table must contain the partition key
+ALTER TABLE daily_food_intake ADD PRIMARY KEY (id, intake_date);
+
+-- Created on the parent, so every partition gets its own small local index
+CREATE INDEX ix_daily_food_intake_user_date ON daily_food_intake (user_id, intake_date);
+
+CREATE TABLE daily_food_intake_default PARTITION OF daily_food_intake DEFAULT;
+
+CREATE OR REPLACE FUNCTION create_daily_food_intake_partition(month_start DATE) RETURNS TEXT AS $$
+DECLARE
+    lo   DATE := date_trunc('month', month_start)::date;
+    hi   DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::date;
+    name TEXT := format('daily_food_intake_%s', to_char(lo, 'YYYY_MM'));
+BEGIN
+    -- Fails loudly if rows for this month already sit in the default partition
+    IF to_regclass(name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF daily_food_intake FOR VALUES FROM (%L) TO (%L)',
+            name, lo, hi
+        );
+    END IF;
+    RETURN name;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ensure_daily_food_intake_partitions(months_ahead INT DEFAULT 3) RETURNS SETOF TEXT AS $$
+    SELECT create_daily_food_intake_partition((date_trunc('month', CURRENT_DATE) + make_interval(months => m))::date)
+    FROM generate_series(0, months_ahead) AS m
+$$ LANGUAGE sql;
+
+-- One partition per month of existing data up to three months ahead
+SELECT create_daily_food_intake_partition(m::date)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(intake_date) FROM daily_food_intake_unpartitioned), CURRENT_DATE)),
+    date_trunc('month', CURRENT_DATE) + INTERVAL '3 months',
+    INTERVAL '1 month'
+) AS m;
+
+INSERT INTO daily_food_intake SELECT * FROM daily_food_intake_unpartitioned;
+
+-- Change-log trigger (002) moves to the new table; created after the copy so
+-- the move itself doesn't make every client resync its whole history
+CREATE TRIGGER trg_daily_food_intake_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON daily_food_intake
+    FOR EACH ROW EXECUTE FUNCTION log_user_change('intake', 'id');
+DROP TRIGGER IF EXISTS trg_daily_food_intake_change_log ON daily_food_intake_unpartitioned;
+
+-- Record of partitions moved to cold storage
+CREATE TABLE IF NOT EXISTS daily_food_intake_archive_log (
+    partition_name TEXT PRIMARY KEY,
+    lower_bound    DATE        NOT NULL,
+    upper_bound    DATE        NOT NULL,
+    row_count      BIGINT      NOT NULL,
+    archive_path   TEXT        NOT NULL,
+    archived_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
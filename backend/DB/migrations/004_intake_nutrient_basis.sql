@@ -0,0 +1,60 @@
+-- Per-100g nutrient basis on daily_food_intake, so a quantity change can
+-- rescale every nutrient exactly instead of compounding rounding on each edit.
+--
+-- The basis is maintained by a BEFORE trigger:
+--   * a nutrient written by the statement (every column on INSERT) sets its basis
+--     from the new value and quantity;
+--   * a quantity change that leaves a nutrient untouched rescales that nutrient
+--     from its basis.
+-- Existing rows are not backfilled (that would rewrite every partition and push
+-- the whole history through the change log); their basis is derived from the
+-- old values the first time their quantity changes.
+
+ALTER TABLE daily_food_intake
+    ADD COLUMN IF NOT EXISTS calories_per_100g NUMERIC,
+    ADD COLUMN IF NOT EXISTS protein_per_100g  NUMERIC,
+    ADD COLUMN IF NOT EXISTS carbs_per_100g    NUMERIC,
+    ADD COLUMN IF NOT EXISTS fat_per_100g      NUMERIC,
+    ADD COLUMN IF NOT EXISTS fiber_per_100g    NUMERIC,
+    ADD COLUMN IF NOT EXISTS sugar_per_100g    NUMERIC,
+    ADD COLUMN IF NOT EXISTS sodium_per_100g   NUMERIC;
+
+CREATE OR REPLACE FUNCTION maintain_intake_basis() RETURNS trigger AS $$
+DECLARE
+    nutrient TEXT;
+    basis    TEXT;
+    new_row  JSONB := to_jsonb(NEW);
+    old_row  JSONB;
+    patch    JSONB := '{}';
+    qty      NUMERIC := (new_row->>'quantity_grams')::numeric;
+    per_100g NUMERIC;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        old_row := to_jsonb(OLD);
+    END IF;
+
+    FOREACH nutrient IN ARRAY ARRAY['calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium'] LOOP
+        basis := nutrient || '_per_100g';
+
+        IF TG_OP = 'INSERT' OR new_row->nutrient IS DISTINCT FROM old_row->nutrient THEN
+            patch := patch || jsonb_build_object(basis, (new_row->>nutrient)::numeric * 100 / NULLIF(qty, 0));
+
+        ELSIF new_row->'quantity_grams' IS DISTINCT FROM old_row->'quantity_grams' THEN
+            per_100g := COALESCE(
+                (new_row->>basis)::numeric,
+                (old_row->>nutrient)::numeric * 100 / NULLIF((old_row->>'quantity_grams')::numeric, 0)
+            );
+            IF per_100g IS NOT NULL THEN
+                patch := patch || jsonb_build_object(nutrient, per_100g * qty / 100, basis, per_100g);
+            END IF;
+        END IF;
+    END LOOP;
+
+    RETURN jsonb_populate_record(NEW, patch);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_daily_food_intake_basis ON daily_food_intake;
+CREATE TRIGGER trg_daily_food_intake_basis
+    BEFORE INSERT OR UPDATE ON daily_food_intake
+    FOR EACH ROW EXECUTE FUNCTION maintain_intake_basis();
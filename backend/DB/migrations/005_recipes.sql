@@ -0,0 +1,34 @@
+-- Saved meals: a named set of foods with quantities, logged to
+-- daily_food_intake in one statement by POST /recipes/{id}/log.
+--
+-- Each item stores its per-100g nutrient vector, resolved once from the
+-- favorite or barcode it was created from, so logging never re-reads the
+-- source or calls OpenFoodFacts.
+
+CREATE TABLE IF NOT EXISTS recipes (
+    id         TEXT        PRIMARY KEY,
+    user_id    TEXT        NOT NULL,
+    name       TEXT        NOT NULL,
+    meal_type  TEXT,
+    notes      TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_recipes_user ON recipes (user_id, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS recipe_items (
+    recipe_id         TEXT    NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+    position          INT     NOT NULL,
+    product_name      TEXT    NOT NULL,
+    barcode           TEXT,
+    favorite_id       TEXT,
+    quantity_grams    NUMERIC NOT NULL,
+    calories_per_100g NUMERIC,
+    protein_per_100g  NUMERIC,
+    carbs_per_100g    NUMERIC,
+    fat_per_100g      NUMERIC,
+    fiber_per_100g    NUMERIC,
+    sugar_per_100g    NUMERIC,
+    sodium_per_100g   NUMERIC,
+    PRIMARY KEY (recipe_id, position)
+);
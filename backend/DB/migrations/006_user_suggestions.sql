@@ -0,0 +1,203 @@
+-- Per-user quick-add suggestion index behind /suggestions/{user_id}.
+--
+-- One row per (user, context, item). Contexts:
+--   'all'          every logged item
+--   'meal:<type>'  items logged for that meal_type
+--   'tod:<bucket>' items logged in that time of day (see intake_tod_bucket)
+--   'fav'          the user's favorites
+--
+-- Scores use exponential decay (half-life 14 days) without ever being
+-- rewritten as time passes: an event at time t adds exp(λ·(t - epoch)) and the
+-- row stores the log of the sum. Because every row is anchored to the same
+-- epoch, comparing stored scores is the same as comparing decayed scores at
+-- any moment, so the top k of a context is a plain index scan.
+--
+-- Maintained incrementally by triggers on daily_food_intake (inserts) and
+-- user_favorites. Edits and deletes of intake rows are not subtracted; the
+-- decay lets them fade out.
+
+CREATE OR REPLACE FUNCTION suggestion_score(used_at TIMESTAMP, weight DOUBLE PRECISION DEFAULT 1)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT ln(weight) + (ln(2) / 14) * extract(epoch FROM used_at - TIMESTAMP '2024-01-01') / 86400
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ln(exp(a) + exp(b)) without overflow
+CREATE OR REPLACE FUNCTION logaddexp(a DOUBLE PRECISION, b DOUBLE PRECISION)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT CASE
+        WHEN a IS NULL THEN b
+        WHEN b IS NULL THEN a
+        ELSE GREATEST(a, b) + ln(1 + exp(-abs(a - b)))
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION intake_tod_bucket(t TIME) RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN t IS NULL THEN NULL
+        WHEN t < TIME '05:00' THEN 'night'
+        WHEN t < TIME '11:00' THEN 'morning'
+        WHEN t < TIME '15:00' THEN 'midday'
+        WHEN t < TIME '18:00' THEN 'afternoon'
+        WHEN t < TIME '22:00' THEN 'evening'
+        ELSE 'night'
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS user_suggestions (
+    user_id        TEXT             NOT NULL,
+    context        TEXT             NOT NULL,
+    item_key       TEXT             NOT NULL,
+    product_name   TEXT             NOT NULL,
+    barcode        TEXT,
+    favorite_id    TEXT,
+    meal_type      TEXT,
+    quantity_grams NUMERIC,
+    calories       NUMERIC,
+    protein        NUMERIC,
+    carbs          NUMERIC,
+    fat            NUMERIC,
+    use_count      INT              NOT NULL DEFAULT 0,
+    last_used      TIMESTAMP,
+    score          DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (user_id, context, item_key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_suggestions_rank
+    ON user_suggestions (user_id, context, score DESC);
+
+CREATE OR REPLACE FUNCTION record_intake_suggestion() RETURNS trigger AS $$
+DECLARE
+    used_at TIMESTAMP := NEW.intake_date + COALESCE(NEW.intake_time::time, TIME '12:00');
+    ctx     TEXT;
+BEGIN
+    FOREACH ctx IN ARRAY ARRAY[
+        'all',
+        'meal:' || NEW.meal_type,
+        'tod:' || intake_tod_bucket(NEW.intake_time::time)
+    ] LOOP
+        CONTINUE WHEN ctx IS NULL;
+        INSERT INTO user_suggestions AS s (
+            user_id, context, item_key, product_name, barcode, meal_type,
+            quantity_grams, calories, protein, carbs, fat, use_count, last_used, score
+        ) VALUES (
+            NEW.user_id::text, ctx, COALESCE(NULLIF(NEW.barcode, ''), lower(NEW.product_name)),
+            NEW.product_name, NEW.barcode, NEW.meal_type,
+            NEW.quantity_grams, NEW.calories, NEW.protein, NEW.carbs, NEW.fat, 1, used_at,
+            suggestion_score(used_at)
+        )
+        ON CONFLICT (user_id, context, item_key) DO UPDATE
+            SET product_name   = EXCLUDED.product_name,
+                meal_type      = EXCLUDED.meal_type,
+                quantity_grams = EXCLUDED.quantity_grams,
+                calories       = EXCLUDED.calories,
+                protein        = EXCLUDED.protein,
+                carbs          = EXCLUDED.carbs,
+                fat            = EXCLUDED.fat,
+                use_count      = s.use_count + 1,
+                last_used      = GREATEST(s.last_used, EXCLUDED.last_used),
+                score          = logaddexp(s.score, EXCLUDED.score);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_daily_food_intake_suggestions ON daily_food_intake;
+CREATE TRIGGER trg_daily_food_intake_suggestions
+    AFTER INSERT ON daily_food_intake
+    FOR EACH ROW EXECUTE FUNCTION record_intake_suggestion();
+
+-- A favorite counts as three uses at the moment it was added
+CREATE OR REPLACE FUNCTION record_favorite_suggestion() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM user_suggestions
+        WHERE user_id = OLD.user_id::text AND context = 'fav'
+        AND favorite_id = OLD.id::text;
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO user_suggestions AS s (
+        user_id, context, item_key, product_name, barcode, favorite_id,
+        quantity_grams, calories, protein, carbs, fat, last_used, score
+    ) VALUES (
+        NEW.user_id::text, 'fav', COALESCE(NULLIF(NEW.barcode, ''), lower(NEW.product_name)),
+        NEW.product_name, NEW.barcode, NEW.id::text,
+        NEW.default_quantity, NEW.calories, NEW.protein, NEW.carbs, NEW.fat, NOW()::timestamp,
+        suggestion_score(NOW()::timestamp, 3)
+    )
+    ON CONFLICT (user_id, context, item_key) DO UPDATE
+        SET product_name   = EXCLUDED.product_name,
+            favorite_id    = EXCLUDED.favorite_id,
+            quantity_grams = EXCLUDED.quantity_grams,
+            calories       = EXCLUDED.calories,
+            protein        = EXCLUDED.protein,
+            carbs          = EXCLUDED.carbs,
+            fat            = EXCLUDED.fat,
+            last_used      = EXCLUDED.last_used,
+            score          = GREATEST(s.score, EXCLUDED.score);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_favorites_suggestions ON user_favorites;
+CREATE TRIGGER trg_user_favorites_suggestions
+    AFTER INSERT OR UPDATE OR DELETE ON user_favorites
+    FOR EACH ROW EXECUTE FUNCTION record_favorite_suggestion();
+
+-- Build the index from existing history and favorites
+WITH events AS (
+    SELECT
+        i.user_id::text AS user_id,
+        COALESCE(NULLIF(i.barcode, ''), lower(i.product_name)) AS item_key,
+        i.product_name, i.barcode, i.meal_type,
+        i.quantity_grams, i.calories, i.protein, i.carbs, i.fat,
+        i.intake_date + COALESCE(i.intake_time::time, TIME '12:00') AS used_at,
+        c.context
+    FROM daily_food_intake i
+    CROSS JOIN LATERAL (VALUES
+        ('all'),
+        ('meal:' || i.meal_type),
+        ('tod:' || intake_tod_bucket(i.intake_time::time))
+    ) AS c(context)
+    WHERE c.context IS NOT NULL AND i.product_name IS NOT NULL
+),
+scored AS (
+    SELECT *,
+           suggestion_score(used_at) AS s,
+           MAX(suggestion_score(used_at)) OVER (PARTITION BY user_id, context, item_key) AS m,
+           ROW_NUMBER() OVER (PARTITION BY user_id, context, item_key ORDER BY used_at DESC) AS rn
+    FROM events
+)
+INSERT INTO user_suggestions (
+    user_id, context, item_key, product_name, barcode, meal_type,
+    quantity_grams, calories, protein, carbs, fat, use_count, last_used, score
+)
+SELECT
+    user_id, context, item_key,
+    (array_agg(product_name ORDER BY rn))[1],
+    (array_agg(barcode ORDER BY rn))[1],
+    (array_agg(meal_type ORDER BY rn))[1],
+    (array_agg(quantity_grams ORDER BY rn))[1],
+    (array_agg(calories ORDER BY rn))[1],
+    (array_agg(protein ORDER BY rn))[1],
+    (array_agg(carbs ORDER BY rn))[1],
+    (array_agg(fat ORDER BY rn))[1],
+    COUNT(*), MAX(used_at),
+    m + ln(SUM(exp(s - m)))
+FROM scored
+GROUP BY user_id, context, item_key, m
+ON CONFLICT (user_id, context, item_key) DO NOTHING;
+
+INSERT INTO user_suggestions (
+    user_id, context, item_key, product_name, barcode, favorite_id,
+    quantity_grams, calories, protein, carbs, fat, last_used, score
+)
+SELECT DISTINCT ON (user_id::text, COALESCE(NULLIF(barcode, ''), lower(product_name)))
+    user_id::text, 'fav', COALESCE(NULLIF(barcode, ''), lower(product_name)),
+    product_name, barcode, id::text,
+    default_quantity, calories, protein, carbs, fat, created_at::timestamp,
+    suggestion_score(created_at::timestamp, 3)
+FROM user_favorites
+WHERE product_name IS NOT NULL
+ORDER BY user_id::text, COALESCE(NULLIF(barcode, ''), lower(product_name)), created_at DESC
+ON CONFLICT (user_id, context, item_key) DO NOTHING;
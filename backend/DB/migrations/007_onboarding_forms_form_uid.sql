@@ -0,0 +1,10 @@
+-- The form's client-side id ("form-1759307521509"), promoted from
+-- form_schema_json->>'id' to an indexed column so lookups by id (resave,
+-- fetch) are index scans instead of a JSONB extraction on every row.
+-- Generated, so every writer of form_schema_json keeps it in step; adding it
+-- rewrites the table once, which also backfills existing forms.
+
+ALTER TABLE onboarding_forms
+    ADD COLUMN IF NOT EXISTS form_uid TEXT GENERATED ALWAYS AS (form_schema_json->>'id') STORED;
+
+CREATE INDEX IF NOT EXISTS ix_onboarding_forms_form_uid ON onboarding_forms (form_uid);
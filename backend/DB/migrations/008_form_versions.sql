@@ -0,0 +1,49 @@
+-- Versioned, content-addressed onboarding form schemas.
+--
+-- form_blobs holds each distinct schema once, keyed by the sha256 of its
+-- canonical JSONB text (jsonb normalises key order and whitespace). The
+-- editor's createdAt/updatedAt stamps are left out of the hash, so saving an
+-- unchanged form hashes the same. form_versions is the small per-form history
+-- pointing at those blobs; the newest row is the current version. Blobs are
+-- never modified, so anything derived from a version (validators, renderers)
+-- can be cached for good.
+--
+-- onboarding_forms.form_schema_json stays as the current schema for the
+-- existing readers. Submissions record the version they answered.
+
+CREATE OR REPLACE FUNCTION form_content_hash(schema JSONB) RETURNS TEXT AS $$
+    SELECT encode(sha256(convert_to((schema - 'createdAt' - 'updatedAt')::text, 'UTF8')), 'hex')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS form_blobs (
+    content_hash TEXT        PRIMARY KEY,
+    schema       JSONB       NOT NULL,
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS form_versions (
+    id           BIGSERIAL   PRIMARY KEY,
+    form_id      BIGINT      NOT NULL REFERENCES onboarding_forms (id) ON DELETE CASCADE,
+    content_hash TEXT        NOT NULL REFERENCES form_blobs (content_hash),
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_form_versions_form ON form_versions (form_id, id DESC);
+
+ALTER TABLE onboarding_forms ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+
+ALTER TABLE client_onboarding_form
+    ADD COLUMN IF NOT EXISTS form_uid        TEXT,
+    ADD COLUMN IF NOT EXISTS form_version_id BIGINT REFERENCES form_versions (id);
+
+-- Every existing form becomes version 1 of itself
+INSERT INTO form_blobs (content_hash, schema)
+SELECT form_content_hash(s), s
+FROM (SELECT DISTINCT form_schema_json AS s FROM onboarding_forms WHERE form_schema_json IS NOT NULL) d
+ON CONFLICT DO NOTHING;
+
+INSERT INTO form_versions (form_id, content_hash, created_at)
+SELECT id, form_content_hash(form_schema_json), COALESCE(created_at, NOW())
+FROM onboarding_forms
+WHERE form_schema_json IS NOT NULL
+ORDER BY id;
@@ -0,0 +1,5 @@
+-- Backs the paginated trainer submissions listing (/api/form-submissions):
+-- one trainer's submissions newest first, resumed from a (submitted_at, id)
+-- cursor, is a single index range scan.
+CREATE INDEX IF NOT EXISTS ix_client_onboarding_form_trainer_submitted
+    ON client_onboarding_form (trainers_code, submitted_at DESC, id DESC);
@@ -0,0 +1,14 @@
+-- Full-text search over client onboarding answers (/api/form-submissions/search).
+--
+-- answers_tsv indexes every string in form_data, including the strings inside
+-- arrays (checkbox answers); field ids, numbers and booleans are left out. It
+-- is generated, so every writer keeps it in step, and adding it backfills
+-- existing submissions. The 'simple' configuration doesn't stem or drop stop
+-- words, since answers come in more than one language.
+
+ALTER TABLE client_onboarding_form
+    ADD COLUMN IF NOT EXISTS answers_tsv TSVECTOR
+    GENERATED ALWAYS AS (jsonb_to_tsvector('simple', COALESCE(form_data, '{}'::jsonb), '["string"]')) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_client_onboarding_form_answers_tsv
+    ON client_onboarding_form USING GIN (answers_tsv);
@@ -0,0 +1,43 @@
+-- One current row per (client, form) in client_onboarding_form, written with
+-- a single INSERT ... ON CONFLICT, plus an append-only history of every
+-- submission. Both are written by the same statement (SAVE_CLIENT_SUBMISSION).
+
+CREATE TABLE IF NOT EXISTS client_onboarding_form_history (
+    id              BIGSERIAL   PRIMARY KEY,
+    submission_id   BIGINT      REFERENCES client_onboarding_form (id) ON DELETE SET NULL,
+    client_id       BIGINT      NOT NULL,
+    trainers_code   TEXT,
+    form_uid        TEXT,
+    form_version_id BIGINT      REFERENCES form_versions (id),
+    form_data       JSONB       NOT NULL,
+    submitted_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_client_onboarding_form_history_submission
+    ON client_onboarding_form_history (submission_id, id DESC);
+
+CREATE INDEX IF NOT EXISTS ix_client_onboarding_form_history_client
+    ON client_onboarding_form_history (client_id, form_uid, id DESC);
+
+-- Existing submissions start the history, attached to the row that is kept
+-- for their (client, form): the newest. Rows without a form_uid stay as they are.
+INSERT INTO client_onboarding_form_history (
+    submission_id, client_id, trainers_code, form_uid, form_version_id, form_data, submitted_at
+)
+SELECT FIRST_VALUE(id) OVER (
+           PARTITION BY client_id, COALESCE(form_uid, id::text)
+           ORDER BY submitted_at DESC NULLS LAST, id DESC
+       ),
+       client_id, trainers_code, form_uid, form_version_id,
+       COALESCE(form_data, '{}'::jsonb), COALESCE(submitted_at, NOW())
+FROM client_onboarding_form
+ORDER BY submitted_at NULLS FIRST, id;
+
+DELETE FROM client_onboarding_form c
+USING client_onboarding_form newer
+WHERE newer.client_id = c.client_id
+  AND newer.form_uid = c.form_uid
+  AND (COALESCE(newer.submitted_at, '-infinity'), newer.id) > (COALESCE(c.submitted_at, '-infinity'), c.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_client_onboarding_form_client_form
+    ON client_onboarding_form (client_id, form_uid);
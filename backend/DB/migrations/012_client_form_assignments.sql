@@ -0,0 +1,15 @@
+-- Forms a trainer has assigned to a client, one row per (client, form).
+-- Answers still go to client_onboarding_form; an assignment only records that
+-- the client was asked, so it can be made for a whole cohort in one statement.
+
+CREATE TABLE IF NOT EXISTS client_form_assignments (
+    client_id       BIGINT      NOT NULL,
+    form_uid        TEXT        NOT NULL,
+    trainers_code   TEXT        NOT NULL,
+    form_version_id BIGINT      REFERENCES form_versions (id),
+    assigned_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (client_id, form_uid)
+);
+
+CREATE INDEX IF NOT EXISTS ix_client_form_assignments_trainer_form
+    ON client_form_assignments (trainers_code, form_uid);
@@ -0,0 +1,53 @@
+-- Create a month's partition even when rows for it already sit in the DEFAULT
+-- partition (/intake/add and /sync accept any date).
+--
+-- CREATE TABLE ... PARTITION OF fails in that case, so the partition is built
+-- as a plain table, the month's rows are moved into it from the default
+-- partition and it is then attached. The change-log trigger is switched off on
+-- the default partition during the move, so clients don't see the rows as
+-- deleted. An advisory lock keeps workers that run this at the same time from
+-- racing on the same month.
+
+CREATE OR REPLACE FUNCTION create_daily_food_intake_partition(month_start DATE) RETURNS TEXT AS $$
+DECLARE
+    lo   DATE := date_trunc('month', month_start)::date;
+    hi   DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::date;
+    name TEXT := format('daily_food_intake_%s', to_char(lo, 'YYYY_MM'));
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('daily_food_intake_partitions'));
+    IF to_regclass(name) IS NOT NULL THEN
+        RETURN name;
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM daily_food_intake_default WHERE intake_date >= lo AND intake_date < hi
+    ) THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF daily_food_intake FOR VALUES FROM (%L) TO (%L)',
+            name, lo, hi
+        );
+        RETURN name;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE daily_food_intake INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        name
+    );
+    ALTER TABLE daily_food_intake_default DISABLE TRIGGER USER;
+    EXECUTE format(
+        'WITH moved AS (
+             DELETE FROM daily_food_intake_default
+             WHERE intake_date >= %L AND intake_date < %L
+             RETURNING *
+         )
+         INSERT INTO %I SELECT * FROM moved',
+        lo, hi, name
+    );
+    ALTER TABLE daily_food_intake_default ENABLE TRIGGER USER;
+    EXECUTE format(
+        'ALTER TABLE daily_food_intake ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        name, lo, hi
+    );
+    RETURN name;
+END;
+$$ LANGUAGE plpgsql;
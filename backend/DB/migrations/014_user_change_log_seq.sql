@@ -0,0 +1,66 @@
+-- Per-user sync cursor for user_change_log.
+--
+-- 002 handed out the snapshot xmin as the cursor. That is cluster-wide, so any
+-- long-running transaction (a streaming export, a slow report) held every
+-- user's cursor back, and clients got the same changes again on each call.
+--
+-- Change rows now carry a sequence number instead. The trigger takes a
+-- per-user transaction lock before drawing it, so two transactions writing
+-- the same user's changes commit in sequence order: a reader can never see
+-- a row whose number is above that of a row still to commit for that user,
+-- and "everything >= cursor" never skips a late commit. Other users are not
+-- held up.
+--
+-- Existing rows keep their txid as seq, and the sequence starts above every
+-- txid handed out so far, so cursors issued before this migration stay valid.
+
+CREATE SEQUENCE IF NOT EXISTS user_change_log_seq;
+
+ALTER TABLE user_change_log ADD COLUMN IF NOT EXISTS seq BIGINT;
+UPDATE user_change_log SET seq = txid WHERE seq IS NULL;
+ALTER TABLE user_change_log ALTER COLUMN seq SET NOT NULL;
+
+SELECT setval(
+    'user_change_log_seq',
+    GREATEST(txid_current(), COALESCE((SELECT MAX(txid) FROM user_change_log), 0)) + 1
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_change_log_user_seq
+    ON user_change_log (user_id, seq);
+DROP INDEX IF EXISTS ix_user_change_log_user_txid;
+
+CREATE OR REPLACE FUNCTION log_user_change() RETURNS trigger AS $$
+DECLARE
+    rec JSONB;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := to_jsonb(OLD);
+    ELSE
+        rec := to_jsonb(NEW);
+    END IF;
+
+    -- Held until commit: this user's changes commit in seq order
+    PERFORM pg_advisory_xact_lock(hashtext('user_change_log:' || (rec->>'user_id')));
+
+    INSERT INTO user_change_log (entity, entity_id, user_id, op, data, txid, seq, changed_at)
+    VALUES (
+        TG_ARGV[0],
+        rec->>TG_ARGV[1],
+        rec->>'user_id',
+        CASE WHEN TG_OP = 'DELETE' THEN 'D' ELSE 'U' END,
+        CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE rec END,
+        txid_current(),
+        nextval('user_change_log_seq'),
+        NOW()
+    )
+    ON CONFLICT (entity, entity_id) DO UPDATE
+        SET user_id    = EXCLUDED.user_id,
+            op         = EXCLUDED.op,
+            data       = EXCLUDED.data,
+            txid       = EXCLUDED.txid,
+            seq        = EXCLUDED.seq,
+            changed_at = EXCLUDED.changed_at;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
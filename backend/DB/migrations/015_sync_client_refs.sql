@@ -0,0 +1,13 @@
+-- Creates pushed through POST /sync/{user_id} without a server id, keyed by
+-- the client's own reference for the mutation. A client that lost the
+-- response and pushes the same create again gets the row made the first
+-- time instead of a duplicate.
+
+CREATE TABLE IF NOT EXISTS sync_client_refs (
+    user_id    TEXT        NOT NULL,
+    client_ref TEXT        NOT NULL,
+    entity     TEXT        NOT NULL,
+    entity_id  TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, client_ref)
+);
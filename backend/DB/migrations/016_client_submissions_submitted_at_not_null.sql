@@ -0,0 +1,15 @@
+-- Every submission gets a submitted_at, so the keyset listing (009) can order
+-- and page on (submitted_at, id) without NULLs being skipped or breaking the
+-- cursor. Old rows without one take the time their history row (011) was
+-- given, so listing and history agree.
+
+UPDATE client_onboarding_form c
+SET submitted_at = COALESCE(
+    (SELECT MIN(h.submitted_at) FROM client_onboarding_form_history h WHERE h.submission_id = c.id),
+    NOW()
+)
+WHERE c.submitted_at IS NULL;
+
+ALTER TABLE client_onboarding_form
+    ALTER COLUMN submitted_at SET DEFAULT NOW(),
+    ALTER COLUMN submitted_at SET NOT NULL;
@@ -0,0 +1,63 @@
+-- Unique indexes of the pre-partitioning daily_food_intake, restored on the
+-- partitioned table.
+--
+-- 003 built the partitioned table with LIKE ... INCLUDING DEFAULTS INCLUDING
+-- CONSTRAINTS, which leaves indexes behind, so unique indexes (and ON CONFLICT
+-- targets built on them) were lost. Each plain unique index of
+-- daily_food_intake_unpartitioned is recreated on the parent; unique keys of a
+-- partitioned table must contain the partition key, so intake_date is added
+-- when missing. Expression and partial indexes are reported, not recreated.
+-- If rows written since 003 now duplicate a key, the migration stops and names
+-- the index so they can be resolved first.
+
+DO $$
+DECLARE
+    idx     RECORD;
+    cols    TEXT[];
+    col_sql TEXT;
+    name    TEXT;
+    dupes   BIGINT;
+BEGIN
+    IF to_regclass('daily_food_intake_unpartitioned') IS NULL THEN
+        RETURN;
+    END IF;
+
+    FOR idx IN
+        SELECT i.indexrelid, i.indkey, i.indexprs, i.indpred, c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'daily_food_intake_unpartitioned'::regclass
+          AND i.indisunique
+          AND NOT i.indisprimary
+    LOOP
+        IF idx.indexprs IS NOT NULL OR idx.indpred IS NOT NULL THEN
+            RAISE NOTICE 'Not recreating expression/partial unique index %', idx.relname;
+            CONTINUE;
+        END IF;
+
+        SELECT array_agg(a.attname::text ORDER BY k.ord)
+        INTO cols
+        FROM unnest(idx.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a
+          ON a.attrelid = 'daily_food_intake_unpartitioned'::regclass AND a.attnum = k.attnum;
+
+        IF NOT 'intake_date' = ANY(cols) THEN
+            cols := cols || 'intake_date'::text;
+        END IF;
+
+        SELECT string_agg(quote_ident(c), ', ') INTO col_sql FROM unnest(cols) AS c;
+        name := left('uq_daily_food_intake_' || array_to_string(cols, '_'), 63);
+
+        EXECUTE format(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM daily_food_intake GROUP BY %s HAVING COUNT(*) > 1) d',
+            col_sql
+        ) INTO dupes;
+        IF dupes > 0 THEN
+            RAISE EXCEPTION 'daily_food_intake has % duplicated (%) keys; resolve them before recreating %',
+                dupes, col_sql, idx.relname;
+        END IF;
+
+        EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS %I ON daily_food_intake (%s)', name, col_sql);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,217 @@
+# partitions.py
+"""
+Maintenance for the monthly partitions of daily_food_intake
+(see migrations/003_partition_daily_food_intake.sql).
+
+Usage (from backend/):
+  python -m DB.partitions ensure [--months-ahead 3]
+  python -m DB.partitions archive --older-than-months 24 --dest /var/backups/intake
+  python -m DB.partitions verify --user-id 1 --start 2025-01-06 --end 2025-01-12
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from DB import statements as stmts
+from DB.db import engine
+
+
+PARTITION_NAME = re.compile(r"^daily_food_intake_\d{4}_\d{2}$")
+
+# Same statement as /intake/range and /intake/week in server.py
+RANGE_QUERY = stmts.INTAKE_DAILY_TOTALS.text
+
+
+_maintenance: threading.Thread = None
+
+
+def ensure_future_partitions(months_ahead: int = 3) -> List[str]:
+    """
+    Create this month's and the next `months_ahead` monthly partitions if missing.
+    Each month runs in its own transaction, so one failing month doesn't stop
+    the others; failures are printed and the month is retried on the next run.
+    """
+    today = date.today()
+    present = []
+    for m in range(months_ahead + 1):
+        months = today.year * 12 + today.month - 1 + m
+        month_start = date(months // 12, months % 12 + 1, 1)
+        try:
+            with engine.begin() as conn:
+                present.append(conn.execute(
+                    text("SELECT create_daily_food_intake_partition(:month_start)"),
+                    {"month_start": month_start},
+                ).scalar())
+        except Exception as e:
+            print(f"Could not create the daily_food_intake partition for {month_start:%Y-%m}:", e)
+    return present
+
+
+def _maintain_forever(interval_seconds: float, months_ahead: int) -> None:
+    while True:
+        try:
+            ensure_future_partitions(months_ahead)
+        except Exception as e:
+            print("Partition maintenance failed:", e)
+        time.sleep(interval_seconds)
+
+
+def start_maintenance(interval_seconds: float = 6 * 3600, months_ahead: int = 3) -> None:
+    """Run ensure_future_partitions now and then every `interval_seconds`, once per process."""
+    global _maintenance
+    if _maintenance is not None and _maintenance.is_alive():
+        return
+    _maintenance = threading.Thread(
+        target=_maintain_forever,
+        args=(interval_seconds, months_ahead),
+        name="partition-maintenance",
+        daemon=True,
+    )
+    _maintenance.start()
+
+
+def list_partitions() -> List[Dict[str, Any]]:
+    """Attached monthly partitions with their bounds, oldest first."""
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+              FROM pg_inherits i
+              JOIN pg_class c ON c.oid = i.inhrelid
+             WHERE i.inhparent = 'daily_food_intake'::regclass
+        """)).fetchall()
+
+    out = []
+    for name, bound in rows:
+        if not PARTITION_NAME.match(name):
+            continue  # the DEFAULT partition
+        lo, hi = re.findall(r"'(\d{4}-\d{2}-\d{2})'", bound)
+        out.append({"name": name, "lower_bound": date.fromisoformat(lo), "upper_bound": date.fromisoformat(hi)})
+    return sorted(out, key=lambda p: p["lower_bound"])
+
+
+def archive_partitions(older_than_months: int, dest_dir: str) -> List[Dict[str, Any]]:
+    """
+    Detach every monthly partition that ended more than `older_than_months`
+    ago, copy it to <dest_dir>/<partition>.csv.gz and drop it.
+    A partition whose export fails is re-attached and left in place.
+    """
+    today = date.today()
+    months = today.year * 12 + today.month - 1 - older_than_months
+    cutoff = date(months // 12, months % 12 + 1, 1)
+    os.makedirs(dest_dir, exist_ok=True)
+
+    archived = []
+    for part in list_partitions():
+        if part["upper_bound"] > cutoff:
+            continue
+
+        name = part["name"]
+        path = os.path.join(dest_dir, f"{name}.csv.gz")
+        bounds = {"lo": part["lower_bound"], "hi": part["upper_bound"]}
+
+        # Detached first so nothing writes to it while it is being copied
+        with engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE daily_food_intake DETACH PARTITION "{name}"'))
+
+        try:
+            raw = engine.raw_connection()
+            try:
+                with raw.cursor() as cur, gzip.open(path, "wt", encoding="utf-8") as fh:
+                    cur.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER true)', fh)
+                    cur.execute(f'SELECT COUNT(*) FROM "{name}"')
+                    row_count = cur.fetchone()[0]
+            finally:
+                raw.close()
+        except Exception as e:
+            print(f"Archiving {name} failed, re-attaching:", e)
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f'ALTER TABLE daily_food_intake ATTACH PARTITION "{name}" '
+                    f"FOR VALUES FROM ('{bounds['lo']}') TO ('{bounds['hi']}')"
+                ))
+            continue
+
+        with engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO daily_food_intake_archive_log
+                        (partition_name, lower_bound, upper_bound, row_count, archive_path)
+                    VALUES (:name, :lo, :hi, :row_count, :path)
+                """),
+                {"name": name, "row_count": row_count, "path": path, **bounds},
+            )
+            conn.execute(text(f'DROP TABLE "{name}"'))
+
+        print(f"Archived {name} ({row_count} rows) to {path}")
+        archived.append({"name": name, "row_count": row_count, "archive_path": path})
+
+    return archived
+
+
+def _scanned_relations(plan: Dict[str, Any]) -> List[str]:
+    found = [plan["Relation Name"]] if "Relation Name" in plan else []
+    for child in plan.get("Plans", []):
+        found.extend(_scanned_relations(child))
+    return found
+
+
+def verify_pruning(user_id: str, start_date: date, end_date: date) -> List[str]:
+    """
+    EXPLAIN the range/week aggregation and check that only the partitions
+    overlapping [start_date, end_date] are scanned. Returns the scanned partitions.
+    """
+    with engine.connect() as conn:
+        plan = conn.execute(
+            text("EXPLAIN (FORMAT JSON) " + RANGE_QUERY),
+            {"user_id": user_id, "start_date": start_date, "end_date": end_date},
+        ).scalar()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scanned = sorted(set(_scanned_relations(plan[0]["Plan"])))
+
+    expected = {
+        p["name"] for p in list_partitions()
+        if p["lower_bound"] <= end_date and p["upper_bound"] > start_date
+    }
+    unexpected = [name for name in scanned if name not in expected]
+    if unexpected:
+        raise AssertionError(f"Partition pruning failed, also scanned: {unexpected}")
+    return scanned
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="daily_food_intake partition maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ensure = sub.add_parser("ensure")
+    p_ensure.add_argument("--months-ahead", type=int, default=3)
+
+    p_archive = sub.add_parser("archive")
+    p_archive.add_argument("--older-than-months", type=int, default=24)
+    p_archive.add_argument("--dest", required=True)
+
+    p_verify = sub.add_parser("verify")
+    p_verify.add_argument("--user-id", required=True)
+    p_verify.add_argument("--start", type=date.fromisoformat, required=True)
+    p_verify.add_argument("--end", type=date.fromisoformat, required=True)
+
+    args = parser.parse_args()
+    if args.command == "ensure":
+        print("Partitions present:", ", ".join(ensure_future_partitions(args.months_ahead)))
+    elif args.command == "archive":
+        archive_partitions(args.older_than_months, args.dest)
+    else:
+        print("Scanned partitions:", ", ".join(verify_pruning(args.user_id, args.start, args.end)))
+
+
+if __name__ == "__main__":
+    main()
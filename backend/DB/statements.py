@@ -0,0 +1,1219 @@
+# statements.py
+"""
+Registry of the SQL the backend runs.
+
+Every statement is built once at import with `define()` and reused by name,
+so SQLAlchemy's compiled cache and psycopg3's server-side prepared statements
+(see `prepare_threshold` on the async engine in server.py) are hit on every
+call. Partial updates use fixed-shape COALESCE statements instead of building
+a SET clause per request.
+
+`instrument(engine)` attaches timing hooks; `stats()` reports per-statement
+execution counts and timings (served at /metrics/statements).
+"""
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql.elements import TextClause
+
+
+_registry: Dict[str, TextClause] = {}
+_stats: Dict[str, List[float]] = {}  # name -> [count, total_seconds, max_seconds]
+_stats_lock = threading.Lock()
+
+
+def define(name: str, sql: str, *bindparams) -> TextClause:
+    """Register `sql` under `name` and return the reusable statement."""
+    if name in _registry:
+        raise ValueError(f"Statement '{name}' is already defined")
+    stmt = text(sql)
+    if bindparams:
+        stmt = stmt.bindparams(*bindparams)
+    stmt = stmt.execution_options(statement_name=name)
+    _registry[name] = stmt
+    return stmt
+
+
+def get(name: str) -> TextClause:
+    return _registry[name]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._statement_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    name = context.execution_options.get("statement_name")
+    started = getattr(context, "_statement_started", None)
+    if name is None or started is None:
+        return
+
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        entry = _stats.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+
+
+def instrument(engine) -> None:
+    """Record per-statement timings for every execution on `engine` (sync or async)."""
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+
+
+def stats() -> List[Dict[str, Any]]:
+    """Per-statement counts and timings, most total time first."""
+    with _stats_lock:
+        snapshot = {name: list(entry) for name, entry in _stats.items()}
+
+    out = []
+    for name in _registry:
+        count, total, worst = snapshot.get(name, [0, 0.0, 0.0])
+        out.append({
+            "name": name,
+            "executions": int(count),
+            "total_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / count, 3) if count else None,
+            "max_ms": round(worst * 1000, 3),
+        })
+    return sorted(out, key=lambda s: s["total_ms"], reverse=True)
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+# ============================================================
+# Accounts and trainer linking (DB/db.py)
+# ============================================================
+
+# Identity resolver (DB/identity.py): every trainer and client with one of the emails
+IDENTITIES_BY_EMAIL = define("identities_by_email", """
+    SELECT 'trainer' AS role, id, email, trainers_code
+    FROM trainer_user
+    WHERE email = ANY(CAST(:emails AS TEXT[]))
+    UNION ALL
+    SELECT 'client', id, email, NULL
+    FROM client_user
+    WHERE email = ANY(CAST(:emails AS TEXT[]))
+""")
+
+TRAINER_CODE_BY_EMAIL = define("trainer_code_by_email", """
+    SELECT trainers_code FROM trainer_user WHERE email = :email
+""")
+
+UPDATE_TRAINER_NAMES = define("update_trainer_names", """
+    UPDATE trainer_user
+       SET first_name = COALESCE(:first_name, first_name),
+           last_name  = COALESCE(:last_name,  last_name)
+     WHERE email = :email
+""")
+
+UPSERT_TRAINER = define("upsert_trainer", """
+    INSERT INTO trainer_user (first_name, last_name, email, password, trainers_code)
+    VALUES (:first_name, :last_name, :email, :password, :trainers_code)
+    ON CONFLICT (email) DO UPDATE
+      SET first_name = EXCLUDED.first_name,
+          last_name  = EXCLUDED.last_name
+    RETURNING trainers_code
+""")
+
+LIST_TRAINERS = define("list_trainers", """
+    SELECT id, first_name, last_name, email, trainers_code, created_at FROM trainer_user ORDER BY id
+""")
+
+# Login looks the user up by email; the password is checked against the stored
+# hash in passwords.py, never in SQL
+TRAINER_LOGIN = define("trainer_login", """
+    SELECT * FROM trainer_user WHERE email = :email
+""")
+
+CLIENT_LOGIN = define("client_login", """
+    SELECT * FROM client_user WHERE email = :email
+""")
+
+# Rehash-on-login; only replaces the value that was verified, so a password
+# changed in the meantime is never overwritten
+UPDATE_TRAINER_PASSWORD = define("update_trainer_password", """
+    UPDATE trainer_user SET password = :new_password WHERE id = :id AND password = :old_password
+""")
+
+UPDATE_CLIENT_PASSWORD = define("update_client_password", """
+    UPDATE client_user SET password = :new_password WHERE id = :id AND password = :old_password
+""")
+
+INSERT_CLIENT_USER = define("insert_client_user", """
+    INSERT INTO client_user
+      (first_name, last_name, email, password, phone_number, country)
+    VALUES
+      (:first_name, :last_name, :email, :password, :phone_number, :country)
+""")
+
+INSERT_TRAINER_USER = define("insert_trainer_user", """
+    INSERT INTO trainer_user
+      (first_name, last_name, email, password, phone_number, country, trainers_code)
+    VALUES
+      (:first_name, :last_name, :email, :password, :phone_number, :country, :trainers_code)
+""")
+
+UPDATE_TRAINERS_CODE = define("update_trainers_code", """
+    UPDATE trainer_user
+    SET trainers_code = :new_code
+    WHERE email = :email
+""")
+
+TRAINERS_FOR_CLIENT = define("trainers_for_client", """
+    SELECT tu.trainers_code, tu.first_name, tu.last_name, tu.email, tu.id
+    FROM client_trainer ct
+    JOIN trainer_user tu ON tu.trainers_code = ct.trainers_code
+    WHERE ct.client_id = :client_id
+""")
+
+LINK_CLIENT_TRAINER = define("link_client_trainer", """
+    INSERT INTO client_trainer (client_id, trainers_code)
+    VALUES (:client_id, :trainers_code)
+    ON CONFLICT DO NOTHING
+""")
+
+# ============================================================
+# Onboarding forms and submissions (DB/db.py)
+# ============================================================
+
+# New forms start with version 1 (see 008_form_versions.sql)
+INSERT_ONBOARDING_FORM = define("insert_onboarding_form", """
+    WITH form AS (
+        INSERT INTO onboarding_forms (trainers_code, title, description, form_schema_json)
+        VALUES (:trainers_code, :title, :description, :form_schema_json)
+        RETURNING id, form_schema_json
+    ),
+    blob AS (
+        INSERT INTO form_blobs (content_hash, schema)
+        SELECT form_content_hash(form_schema_json), form_schema_json FROM form
+        ON CONFLICT DO NOTHING
+    ),
+    version AS (
+        INSERT INTO form_versions (form_id, content_hash)
+        SELECT id, form_content_hash(form_schema_json) FROM form
+        RETURNING id
+    )
+    SELECT form.id, version.id AS version_id
+    FROM form, version
+""", bindparam("form_schema_json", type_=JSONB))
+
+FORMS_BY_TRAINER_EMAIL = define("forms_by_trainer_email", """
+    SELECT f.id, f.title, f.description, f.form_schema_json, f.created_at
+      FROM onboarding_forms f
+      JOIN trainer_user t ON t.trainers_code = f.trainers_code
+     WHERE t.email = :email
+     ORDER BY f.created_at DESC, f.id DESC
+""")
+
+FORM_SCHEMAS_BY_TRAINER_EMAIL = define("form_schemas_by_trainer_email", """
+    SELECT onboarding_forms.form_schema_json
+    FROM onboarding_forms
+    JOIN trainer_user
+    ON onboarding_forms.trainers_code = trainer_user.trainers_code
+    WHERE trainer_user.email = :email
+""")
+
+FORM_SCHEMAS_BY_TRAINERS_CODE = define("form_schemas_by_trainers_code", """
+    SELECT form_schema_json
+    FROM onboarding_forms
+    WHERE trainers_code = :trainers_code
+""")
+
+# Adds a version only if the content hash differs from the current one; an
+# unchanged schema writes nothing. found = 0 means no such form, version_id is
+# NULL when nothing changed.
+RESAVE_FORM = define("resave_form", """
+    WITH form AS (
+        SELECT f.id, f.trainers_code,
+               (SELECT v.content_hash FROM form_versions v
+                 WHERE v.form_id = f.id ORDER BY v.id DESC LIMIT 1) AS current_hash
+        FROM onboarding_forms f
+        WHERE f.form_uid = :form_id
+        FOR UPDATE OF f
+    ),
+    changed AS (
+        SELECT id, form_content_hash(:form_schema_json) AS content_hash
+        FROM form
+        WHERE current_hash IS DISTINCT FROM form_content_hash(:form_schema_json)
+    ),
+    blob AS (
+        INSERT INTO form_blobs (content_hash, schema)
+        SELECT DISTINCT content_hash, CAST(:form_schema_json AS JSONB) FROM changed
+        ON CONFLICT DO NOTHING
+    ),
+    version AS (
+        INSERT INTO form_versions (form_id, content_hash)
+        SELECT id, content_hash FROM changed
+        RETURNING id, form_id
+    ),
+    updated AS (
+        UPDATE onboarding_forms f
+        SET title = :title,
+            description = :description,
+            form_schema_json = :form_schema_json,
+            updated_at = NOW()
+        FROM version
+        WHERE f.id = version.form_id
+        RETURNING f.id
+    )
+    SELECT (SELECT COUNT(*) FROM form) AS found,
+           (SELECT MAX(trainers_code) FROM form) AS trainers_code,
+           (SELECT MAX(id) FROM version) AS version_id,
+           (SELECT COUNT(*) FROM updated) AS updated
+""", bindparam("form_schema_json", type_=JSONB))
+
+FORM_VERSIONS_BY_UID = define("form_versions_by_uid", """
+    SELECT v.id, v.content_hash, v.created_at
+    FROM form_versions v
+    JOIN onboarding_forms f ON f.id = v.form_id
+    WHERE f.form_uid = :form_id
+    ORDER BY v.id DESC
+""")
+
+FORM_BY_UID = define("form_by_uid", """
+    SELECT f.id, f.trainers_code, f.title, f.description, f.form_schema_json, f.created_at, f.updated_at,
+           (SELECT MAX(v.id) FROM form_versions v WHERE v.form_id = f.id) AS version_id
+    FROM onboarding_forms f
+    WHERE f.form_uid = :form_id
+""")
+
+# The version a submission answers: the requested one (if it belongs to the
+# form), else the current one. Only the hash, so cached validators skip the blob.
+FORM_VERSION_REF = define("form_version_ref", """
+    SELECT v.id, v.content_hash
+    FROM form_versions v
+    JOIN onboarding_forms f ON f.id = v.form_id
+    WHERE f.form_uid = :form_id
+      AND (CAST(:form_version_id AS BIGINT) IS NULL OR v.id = CAST(:form_version_id AS BIGINT))
+    ORDER BY v.id DESC
+    LIMIT 1
+""")
+
+FORM_BLOB = define("form_blob", """
+    SELECT schema FROM form_blobs WHERE content_hash = :content_hash
+""")
+
+# ---- Answer analytics for one trainer's submissions of one form ----
+# Each submission's form_data is expanded with jsonb_each and grouped per field;
+# only the field ids passed in are looked at. Empty answers ("", [], false,
+# null) don't count as answered.
+
+# field_id NULL carries the number of submissions
+FORM_ANSWER_COMPLETION = define("form_answer_completion", """
+    WITH subs AS (
+        SELECT form_data FROM client_onboarding_form
+        WHERE trainers_code = :trainers_code AND form_uid = :form_id
+    )
+    SELECT NULL AS field_id, COUNT(*) AS n FROM subs
+    UNION ALL
+    SELECT e.key, COUNT(*)
+    FROM subs
+    CROSS JOIN LATERAL jsonb_each(subs.form_data) AS e
+    WHERE e.key = ANY(CAST(:field_ids AS TEXT[]))
+      AND e.value NOT IN ('null'::jsonb, '""'::jsonb, '[]'::jsonb, 'false'::jsonb)
+    GROUP BY e.key
+""")
+
+# Checkbox answers (arrays) count once per ticked option
+FORM_ANSWER_OPTIONS = define("form_answer_options", """
+    SELECT e.key AS field_id, a.answer, COUNT(*) AS n
+    FROM client_onboarding_form cof
+    CROSS JOIN LATERAL jsonb_each(cof.form_data) AS e
+    CROSS JOIN LATERAL (
+        SELECT jsonb_array_elements_text(e.value) WHERE jsonb_typeof(e.value) = 'array'
+        UNION ALL
+        SELECT e.value #>> '{}' WHERE jsonb_typeof(e.value) IN ('string', 'number', 'boolean')
+    ) AS a(answer)
+    WHERE cof.trainers_code = :trainers_code AND cof.form_uid = :form_id
+      AND e.key = ANY(CAST(:field_ids AS TEXT[]))
+      AND a.answer <> ''
+    GROUP BY e.key, a.answer
+""")
+
+# One row per (field, histogram bucket) with the field's summary repeated.
+# Numbers may arrive as JSON numbers or numeric strings.
+FORM_ANSWER_NUMERIC = define("form_answer_numeric", """
+    WITH vals AS (
+        SELECT e.key AS field_id, (e.value #>> '{}')::numeric AS v
+        FROM client_onboarding_form cof
+        CROSS JOIN LATERAL jsonb_each(cof.form_data) AS e
+        WHERE cof.trainers_code = :trainers_code AND cof.form_uid = :form_id
+          AND e.key = ANY(CAST(:field_ids AS TEXT[]))
+          AND jsonb_typeof(e.value) IN ('number', 'string')
+          AND (e.value #>> '{}') ~ '^ *-?[0-9]+([.][0-9]+)? *$'
+    ),
+    summary AS (
+        SELECT field_id, COUNT(*) AS n, MIN(v) AS lo, MAX(v) AS hi, AVG(v) AS mean,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY v) AS median
+        FROM vals
+        GROUP BY field_id
+    )
+    SELECT s.field_id, s.n, s.lo, s.hi, s.mean, s.median, h.bucket, h.count
+    FROM summary s
+    CROSS JOIN LATERAL (
+        SELECT LEAST(width_bucket(v, s.lo, GREATEST(s.hi, s.lo + 1), :buckets), :buckets) AS bucket,
+               COUNT(*) AS count
+        FROM vals
+        WHERE vals.field_id = s.field_id
+        GROUP BY 1
+    ) AS h
+    ORDER BY s.field_id, h.bucket
+""")
+
+# Newest first, resumed after the (before_at, before_id) cursor. mode picks what
+# is sent of form_data: 'full', 'fields' (only the listed field ids, extracted
+# here) or 'summary' (nothing, so the JSONB is never read). A NULL limit is no limit.
+CLIENT_SUBMISSIONS_BY_TRAINERS_CODE = define("client_submissions_by_trainers_code", """
+    SELECT cof.id, cof.client_id, cof.trainers_code, cof.submitted_at,
+           cof.form_uid, cof.form_version_id,
+           cu.email, cu.first_name, cu.last_name,
+           CASE CAST(:mode AS TEXT)
+               WHEN 'full' THEN cof.form_data
+               WHEN 'fields' THEN (
+                   SELECT COALESCE(jsonb_object_agg(k.field_id, v.value), '{}'::jsonb)
+                   FROM unnest(CAST(:fields AS TEXT[])) AS k(field_id)
+                   CROSS JOIN LATERAL jsonb_extract_path(cof.form_data, k.field_id) AS v(value)
+                   WHERE v.value IS NOT NULL
+               )
+           END AS form_data
+      FROM client_onboarding_form cof
+      JOIN client_user cu ON cof.client_id = cu.id
+     WHERE cof.trainers_code = :trainers_code
+       AND (CAST(:before_id AS BIGINT) IS NULL
+            OR (cof.submitted_at, cof.id) < (:before_at, :before_id))
+     ORDER BY cof.submitted_at DESC, cof.id DESC
+     LIMIT CAST(:limit AS INT)
+""")
+
+# Best matches first (see 010_client_submissions_search.sql), each with
+# highlighted snippets from up to three matching answers. Answers are written
+# by clients, so they are HTML-escaped before ts_headline adds the <b> tags.
+SEARCH_CLIENT_SUBMISSIONS = define("search_client_submissions", """
+    WITH q AS (
+        SELECT websearch_to_tsquery('simple', :q) AS query
+    ),
+    hits AS (
+        SELECT cof.id, cof.client_id, cof.form_uid, cof.submitted_at, cof.form_data, q.query,
+               ts_rank_cd(cof.answers_tsv, q.query) AS rank
+        FROM client_onboarding_form cof, q
+        WHERE cof.trainers_code = :trainers_code
+          AND cof.answers_tsv @@ q.query
+        ORDER BY rank DESC, cof.submitted_at DESC
+        LIMIT :limit
+    )
+    SELECT h.id, h.client_id, h.form_uid, h.submitted_at, h.rank,
+           cu.email, cu.first_name, cu.last_name,
+           COALESCE((
+               SELECT jsonb_agg(jsonb_build_object(
+                          'field_id', m.field_id,
+                          'snippet', ts_headline(
+                              'simple',
+                              replace(replace(replace(replace(replace(m.answer,
+                                  '&', '&amp;'), '<', '&lt;'), '>', '&gt;'), '"', '&quot;'), '''', '&#39;'),
+                              h.query,
+                              'StartSel=<b>, StopSel=</b>, MaxWords=20, MinWords=5, MaxFragments=2'
+                          )
+                      ))
+               FROM (
+                   SELECT a.field_id, a.answer
+                   FROM (
+                       SELECT e.key AS field_id,
+                              CASE jsonb_typeof(e.value)
+                                  WHEN 'string' THEN e.value #>> '{}'
+                                  ELSE (SELECT string_agg(x, ', ') FROM jsonb_array_elements_text(e.value) AS x)
+                              END AS answer
+                       FROM jsonb_each(h.form_data) AS e
+                       WHERE jsonb_typeof(e.value) IN ('string', 'array')
+                   ) a
+                   WHERE to_tsvector('simple', COALESCE(a.answer, '')) @@ h.query
+                   LIMIT 3
+               ) m
+           ), '[]'::jsonb) AS snippets
+    FROM hits h
+    JOIN client_user cu ON cu.id = h.client_id
+    ORDER BY h.rank DESC, h.submitted_at DESC
+""")
+
+# One round trip per submission: upserts the current answers for (client, form)
+# and appends them to the history. The version answered is the one the client
+# sent, else the form's current version. No row back means the client is gone.
+SAVE_CLIENT_SUBMISSION = define("save_client_submission", """
+    WITH saved AS (
+        INSERT INTO client_onboarding_form AS cof (
+            client_id, form_data, trainers_code, form_uid, form_version_id, submitted_at
+        )
+        SELECT cu.id, CAST(:form_data AS JSONB), CAST(:trainers_code AS TEXT), CAST(:form_id AS TEXT),
+               COALESCE(CAST(:form_version_id AS BIGINT), (
+                   SELECT MAX(v.id) FROM form_versions v
+                   JOIN onboarding_forms f ON f.id = v.form_id
+                   WHERE f.form_uid = :form_id
+               )),
+               NOW()
+        FROM client_user cu
+        WHERE cu.id = :client_id
+        ON CONFLICT (client_id, form_uid) DO UPDATE
+            SET form_data       = EXCLUDED.form_data,
+                trainers_code   = EXCLUDED.trainers_code,
+                form_version_id = EXCLUDED.form_version_id,
+                submitted_at    = EXCLUDED.submitted_at
+        RETURNING cof.id, cof.client_id, cof.trainers_code, cof.form_uid, cof.form_version_id,
+                  cof.form_data, cof.submitted_at, (cof.xmax = 0) AS inserted
+    ),
+    history AS (
+        INSERT INTO client_onboarding_form_history (
+            submission_id, client_id, trainers_code, form_uid, form_version_id, form_data, submitted_at
+        )
+        SELECT id, client_id, trainers_code, form_uid, form_version_id, form_data, submitted_at
+        FROM saved
+        RETURNING id
+    )
+    SELECT saved.id, saved.client_id, saved.inserted, (SELECT MAX(id) FROM history) AS history_id
+    FROM saved
+""", bindparam("form_data", type_=JSONB))
+
+# ============================================================
+# Legacy food intake helpers (DB/db.py, used by app.py)
+# ============================================================
+
+_FOOD_INTAKE_COLUMNS = "id, user_id, product_name, carbs, protein, fat, quantity_grams, intake_date"
+
+# Adds to the user's first row for that product and day, or inserts one. Not an
+# ON CONFLICT upsert: since partitioning (003) the table only has the unique
+# indexes 017 could restore, so there may be no arbiter for this key.
+FOOD_INTAKE_ACCUMULATE = define("food_intake_accumulate", f"""
+    WITH updated AS (
+        UPDATE daily_food_intake
+        SET carbs = carbs + :carbs,
+            protein = protein + :protein,
+            fat = fat + :fat,
+            quantity_grams = quantity_grams + :quantity_grams
+        WHERE (id, intake_date) = (
+            SELECT id, intake_date
+            FROM daily_food_intake
+            WHERE user_id = :user_id AND intake_date = :intake_date AND product_name = :product_name
+            ORDER BY id
+            LIMIT 1
+        )
+        RETURNING {_FOOD_INTAKE_COLUMNS}
+    ),
+    inserted AS (
+        INSERT INTO daily_food_intake
+        (user_id, product_name, carbs, protein, fat, quantity_grams, intake_date)
+        SELECT :user_id, :product_name, :carbs, :protein, :fat, :quantity_grams, :intake_date
+        WHERE NOT EXISTS (SELECT 1 FROM updated)
+        RETURNING {_FOOD_INTAKE_COLUMNS}
+    )
+    SELECT * FROM updated
+    UNION ALL
+    SELECT * FROM inserted
+""")
+
+FOOD_INTAKE_BY_DATE = define("food_intake_by_date", f"""
+    SELECT {_FOOD_INTAKE_COLUMNS}
+    FROM daily_food_intake
+    WHERE user_id = :user_id AND intake_date = :intake_date
+    ORDER BY id
+""")
+
+FOOD_INTAKE_BY_DATE_RANGE = define("food_intake_by_date_range", f"""
+    SELECT {_FOOD_INTAKE_COLUMNS}
+    FROM daily_food_intake
+    WHERE user_id = :user_id AND intake_date BETWEEN :start_date AND :end_date
+    ORDER BY intake_date DESC, id
+""")
+
+FOOD_INTAKE_DAY_TOTALS = define("food_intake_day_totals", """
+    SELECT
+        COUNT(*) as meal_count,
+        COALESCE(SUM(carbs), 0) as total_carbs,
+        COALESCE(SUM(protein), 0) as total_protein,
+        COALESCE(SUM(fat), 0) as total_fat,
+        COALESCE(SUM(quantity_grams), 0) as total_quantity_grams
+    FROM daily_food_intake
+    WHERE user_id = :user_id AND intake_date = :intake_date
+""")
+
+FOOD_INTAKE_DELETE = define("food_intake_delete", """
+    DELETE FROM daily_food_intake
+    WHERE id = :record_id AND user_id = :user_id
+""")
+
+FOOD_INTAKE_UPDATE = define("food_intake_update", f"""
+    UPDATE daily_food_intake
+    SET product_name = :product_name,
+        carbs = :carbs,
+        protein = :protein,
+        fat = :fat,
+        quantity_grams = :quantity_grams,
+        intake_date = :intake_date
+    WHERE id = :record_id AND user_id = :user_id
+    RETURNING {_FOOD_INTAKE_COLUMNS}
+""")
+
+FOOD_INTAKE_ALL = define("food_intake_all", f"""
+    SELECT {_FOOD_INTAKE_COLUMNS}
+    FROM daily_food_intake
+    WHERE user_id = :user_id
+    ORDER BY intake_date DESC, id
+""")
+
+FOOD_INTAKE_DELETE_DATE = define("food_intake_delete_date", """
+    DELETE FROM daily_food_intake
+    WHERE user_id = :user_id AND intake_date = :intake_date
+""")
+
+FOOD_INTAKE_SEARCH = define("food_intake_search", f"""
+    SELECT {_FOOD_INTAKE_COLUMNS}
+    FROM daily_food_intake
+    WHERE user_id = :user_id AND LOWER(product_name) LIKE LOWER(:product_name)
+    ORDER BY intake_date DESC, id
+""")
+
+FOOD_INTAKE_MOST_CONSUMED = define("food_intake_most_consumed", """
+    SELECT
+        product_name,
+        COUNT(*) as consumption_count,
+        SUM(quantity_grams) as total_quantity,
+        AVG(carbs) as avg_carbs,
+        AVG(protein) as avg_protein,
+        AVG(fat) as avg_fat
+    FROM daily_food_intake
+    WHERE user_id = :user_id
+    GROUP BY product_name
+    ORDER BY consumption_count DESC
+    LIMIT :limit
+""")
+
+# ============================================================
+# Nutrition API (server.py)
+# ============================================================
+
+INSERT_INTAKE = define("insert_intake", """
+    INSERT INTO daily_food_intake (
+        user_id, product_name, quantity_grams, carbs, protein, fat,
+        fiber, sugar, sodium, calories, meal_type, intake_date, intake_time,
+        barcode, created_at
+    ) VALUES (
+        :user_id, :product_name, :quantity, :carbs, :protein, :fat,
+        :fiber, :sugar, :sodium, :calories, :meal_type, :intake_date, :intake_time,
+        :barcode, :created_at
+    )
+    RETURNING id, user_id, product_name, quantity_grams, carbs, protein, fat,
+              calories, meal_type, intake_date, intake_time, created_at
+""")
+
+# Many INSERT_INTAKE rows at once (group_commit.py); rows come back in "ord" order
+GROUP_INSERT_INTAKE = define("group_insert_intake", """
+    INSERT INTO daily_food_intake (
+        user_id, product_name, quantity_grams, carbs, protein, fat,
+        fiber, sugar, sodium, calories, meal_type, intake_date, intake_time,
+        barcode, created_at
+    )
+    SELECT
+        r.user_id, r.product_name, r.quantity, r.carbs, r.protein, r.fat,
+        r.fiber, r.sugar, r.sodium, r.calories, r.meal_type, r.intake_date, r.intake_time,
+        r.barcode, r.created_at
+    FROM jsonb_to_recordset(:rows) AS r(
+        ord INT, user_id TEXT, product_name TEXT, quantity FLOAT8,
+        carbs FLOAT8, protein FLOAT8, fat FLOAT8, fiber FLOAT8, sugar FLOAT8, sodium FLOAT8,
+        calories FLOAT8, meal_type TEXT, intake_date DATE, intake_time TIME,
+        barcode TEXT, created_at TIMESTAMP
+    )
+    ORDER BY r.ord
+    RETURNING id, user_id, product_name, quantity_grams, carbs, protein, fat,
+              calories, meal_type, intake_date, intake_time, created_at
+""", bindparam("rows", type_=JSONB))
+
+INSERT_INTAKE_WITH_ID = define("insert_intake_with_id", """
+    INSERT INTO daily_food_intake (
+        id, user_id, product_name, quantity_grams,
+        calories, protein, carbs, fat, fiber, sugar, sodium,
+        meal_type, intake_date, intake_time, barcode, created_at
+    ) VALUES (
+        :id, :user_id, :product_name, :quantity,
+        :calories, :protein, :carbs, :fat, :fiber, :sugar, :sodium,
+        :meal_type, :intake_date, :intake_time, :barcode, :created_at
+    )
+    RETURNING id, product_name, quantity_grams, calories, protein, carbs, fat
+""")
+
+DAILY_INTAKE = define("daily_intake", """
+    SELECT
+        id,
+        product_name,
+        quantity_grams,
+        calories,
+        protein,
+        carbs,
+        fat,
+        meal_type,
+        intake_time,
+        intake_date
+    FROM daily_food_intake
+    WHERE user_id = :user_id
+    AND intake_date = :target_date
+    ORDER BY intake_time
+""")
+
+DELETE_INTAKE = define("delete_intake", """
+    DELETE FROM daily_food_intake
+    WHERE id = :id
+    RETURNING id, user_id, intake_date
+""")
+
+# Used by both /intake/range and /intake/week
+INTAKE_DAILY_TOTALS = define("intake_daily_totals", """
+    SELECT
+        intake_date,
+        COUNT(*) as total_records,
+        SUM(calories) as total_calories,
+        SUM(protein) as total_protein,
+        SUM(carbs) as total_carbs,
+        SUM(fat) as total_fat
+    FROM daily_food_intake
+    WHERE user_id = :user_id
+    AND intake_date BETWEEN :start_date AND :end_date
+    GROUP BY intake_date
+    ORDER BY intake_date
+""")
+
+# Fields passed as NULL keep their value. A new quantity rescales the nutrients
+# from their per-100g basis (trigger from 004_intake_nutrient_basis.sql), all in
+# this one statement; the previous date is returned so both days can be invalidated.
+UPDATE_INTAKE = define("update_intake", """
+    WITH prev AS (
+        SELECT id, intake_date
+        FROM daily_food_intake
+        WHERE id = :record_id
+        FOR UPDATE
+    )
+    UPDATE daily_food_intake f
+    SET quantity_grams = COALESCE(:quantity, f.quantity_grams),
+        meal_type = COALESCE(:meal_type, f.meal_type),
+        intake_date = COALESCE(:intake_date, f.intake_date),
+        intake_time = COALESCE(:intake_time, f.intake_time)
+    FROM prev
+    WHERE f.id = prev.id AND f.intake_date = prev.intake_date
+    RETURNING f.id, f.user_id, f.product_name, f.quantity_grams,
+              f.calories, f.protein, f.carbs, f.fat, f.fiber, f.sugar, f.sodium,
+              f.meal_type, f.intake_date, f.intake_time,
+              prev.intake_date AS previous_intake_date
+""")
+
+# Re-log a whole day (optionally one meal) on another date in one statement
+COPY_INTAKE = define("copy_intake", """
+    INSERT INTO daily_food_intake (
+        user_id, product_name, quantity_grams, carbs, protein, fat,
+        fiber, sugar, sodium, calories, meal_type, intake_date, intake_time,
+        barcode, created_at
+    )
+    SELECT
+        user_id, product_name, quantity_grams, carbs, protein, fat,
+        fiber, sugar, sodium, calories, meal_type, :target_date, intake_time,
+        barcode, :created_at
+    FROM daily_food_intake
+    WHERE user_id = :user_id
+    AND intake_date = :source_date
+    AND (CAST(:meal_type AS TEXT) IS NULL OR meal_type = :meal_type)
+    ORDER BY intake_time, id
+    RETURNING id, user_id, product_name, quantity_grams, carbs, protein, fat,
+              calories, meal_type, intake_date, intake_time, created_at
+""")
+
+INSERT_FAVORITE = define("insert_favorite", """
+    INSERT INTO user_favorites (
+        id, user_id, product_name, default_quantity, unit,
+        calories, protein, carbs, fat, fiber, sugar, sodium,
+        barcode, notes, created_at
+    ) VALUES (
+        :id, :user_id, :product_name, :default_quantity, :unit,
+        :calories, :protein, :carbs, :fat, :fiber, :sugar, :sodium,
+        :barcode, :notes, :created_at
+    )
+    RETURNING id, user_id, product_name, default_quantity, unit, barcode, created_at
+""")
+
+FAVORITES_BY_USER = define("favorites_by_user", """
+    SELECT
+        id, product_name, default_quantity, unit,
+        calories, protein, carbs, fat,
+        barcode, notes, created_at
+    FROM user_favorites
+    WHERE user_id = :user_id
+    ORDER BY created_at DESC
+""")
+
+FAVORITE_BY_ID = define("favorite_by_id", """
+    SELECT *
+    FROM user_favorites
+    WHERE id = :favorite_id AND user_id = :user_id
+""")
+
+DELETE_FAVORITE = define("delete_favorite", """
+    DELETE FROM user_favorites
+    WHERE id = :favorite_id AND user_id = :user_id
+    RETURNING id
+""")
+
+GOALS_BY_USER = define("goals_by_user", """
+    SELECT
+        calorie_goal,
+        carbs_goal,
+        protein_goal,
+        fat_goal,
+        updated_at
+    FROM user_nutrition_goals
+    WHERE user_id = :user_id
+""")
+
+UPSERT_GOALS = define("upsert_goals", """
+    INSERT INTO user_nutrition_goals (
+        user_id, calorie_goal, carbs_goal, protein_goal, fat_goal, created_at, updated_at
+    ) VALUES (
+        :user_id, :calorie_goal, :carbs_goal, :protein_goal, :fat_goal, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+    )
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+        calorie_goal = EXCLUDED.calorie_goal,
+        carbs_goal = EXCLUDED.carbs_goal,
+        protein_goal = EXCLUDED.protein_goal,
+        fat_goal = EXCLUDED.fat_goal,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING user_id, calorie_goal, carbs_goal, protein_goal, fat_goal, updated_at
+""")
+
+DELETE_GOALS = define("delete_goals", """
+    DELETE FROM user_nutrition_goals
+    WHERE user_id = :user_id
+    RETURNING user_id
+""")
+
+NOTIFY = define("notify", """
+    SELECT pg_notify(:channel, :payload)
+""")
+
+# ============================================================
+# Recipes (server.py)
+# ============================================================
+
+FAVORITES_BY_IDS = define("favorites_by_ids", """
+    SELECT id::text AS id, product_name, barcode, default_quantity,
+           calories, protein, carbs, fat, fiber, sugar, sodium
+    FROM user_favorites
+    WHERE user_id = :user_id AND id::text = ANY(:favorite_ids)
+""")
+
+INSERT_RECIPE = define("insert_recipe", """
+    INSERT INTO recipes (id, user_id, name, meal_type, notes)
+    VALUES (:id, :user_id, :name, :meal_type, :notes)
+    RETURNING id, user_id, name, meal_type, notes, created_at
+""")
+
+INSERT_RECIPE_ITEM = define("insert_recipe_item", """
+    INSERT INTO recipe_items (
+        recipe_id, position, product_name, barcode, favorite_id, quantity_grams,
+        calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
+        fiber_per_100g, sugar_per_100g, sodium_per_100g
+    ) VALUES (
+        :recipe_id, :position, :product_name, :barcode, :favorite_id, :quantity_grams,
+        :calories_per_100g, :protein_per_100g, :carbs_per_100g, :fat_per_100g,
+        :fiber_per_100g, :sugar_per_100g, :sodium_per_100g
+    )
+""")
+
+RECIPES_BY_USER = define("recipes_by_user", """
+    SELECT
+        r.id, r.name, r.meal_type, r.notes, r.created_at,
+        COALESCE(
+            json_agg(json_build_object(
+                'product_name', i.product_name,
+                'barcode', i.barcode,
+                'favorite_id', i.favorite_id,
+                'quantity_grams', i.quantity_grams,
+                'calories', i.calories_per_100g * i.quantity_grams / 100,
+                'protein', i.protein_per_100g * i.quantity_grams / 100,
+                'carbs', i.carbs_per_100g * i.quantity_grams / 100,
+                'fat', i.fat_per_100g * i.quantity_grams / 100
+            ) ORDER BY i.position) FILTER (WHERE i.recipe_id IS NOT NULL),
+            '[]'
+        ) AS items
+    FROM recipes r
+    LEFT JOIN recipe_items i ON i.recipe_id = r.id
+    WHERE r.user_id = :user_id
+    GROUP BY r.id
+    ORDER BY r.created_at DESC
+""")
+
+DELETE_RECIPE = define("delete_recipe", """
+    DELETE FROM recipes
+    WHERE id = :recipe_id AND user_id = :user_id
+    RETURNING id
+""")
+
+# Every item of the recipe becomes one intake row, in a single INSERT ... SELECT
+LOG_RECIPE = define("log_recipe", """
+    INSERT INTO daily_food_intake (
+        user_id, product_name, quantity_grams, carbs, protein, fat,
+        fiber, sugar, sodium, calories, meal_type, intake_date, intake_time,
+        barcode, created_at
+    )
+    SELECT
+        r.user_id, i.product_name, i.quantity_grams * :scale,
+        i.carbs_per_100g * i.quantity_grams * :scale / 100,
+        i.protein_per_100g * i.quantity_grams * :scale / 100,
+        i.fat_per_100g * i.quantity_grams * :scale / 100,
+        i.fiber_per_100g * i.quantity_grams * :scale / 100,
+        i.sugar_per_100g * i.quantity_grams * :scale / 100,
+        i.sodium_per_100g * i.quantity_grams * :scale / 100,
+        i.calories_per_100g * i.quantity_grams * :scale / 100,
+        COALESCE(:meal_type, r.meal_type), :intake_date, :intake_time,
+        i.barcode, :created_at
+    FROM recipes r
+    JOIN recipe_items i ON i.recipe_id = r.id
+    WHERE r.id = :recipe_id AND r.user_id = :user_id
+    ORDER BY i.position
+    RETURNING id, user_id, product_name, quantity_grams, carbs, protein, fat,
+              calories, meal_type, intake_date, intake_time, created_at
+""")
+
+# ============================================================
+# Suggestions (server.py)
+# ============================================================
+
+# Top k of the requested context, of all history and of the favorites (three
+# index scans), merged per item by adding their decayed weights (log-sum-exp).
+# See 006_user_suggestions.sql for how scores are kept.
+SUGGESTIONS = define("suggestions", """
+    WITH candidates AS (
+        (SELECT item_key, product_name, barcode, favorite_id, meal_type, quantity_grams,
+                calories, protein, carbs, fat, use_count, last_used, score + :context_boost AS s
+         FROM user_suggestions
+         WHERE user_id = :user_id AND context = :context
+         ORDER BY score DESC LIMIT :k)
+        UNION ALL
+        (SELECT item_key, product_name, barcode, favorite_id, meal_type, quantity_grams,
+                calories, protein, carbs, fat, use_count, last_used, score AS s
+         FROM user_suggestions
+         WHERE user_id = :user_id AND context = 'all'
+         ORDER BY score DESC LIMIT :k)
+        UNION ALL
+        (SELECT item_key, product_name, barcode, favorite_id, meal_type, quantity_grams,
+                calories, protein, carbs, fat, use_count, last_used, score AS s
+         FROM user_suggestions
+         WHERE user_id = :user_id AND context = 'fav'
+         ORDER BY score DESC LIMIT :k)
+    ),
+    bounded AS (
+        SELECT *, MAX(s) OVER (PARTITION BY item_key) AS m
+        FROM candidates
+    )
+    SELECT
+        item_key,
+        m + ln(SUM(exp(s - m))) AS score,
+        (array_agg(product_name ORDER BY s DESC))[1] AS product_name,
+        (array_agg(barcode ORDER BY s DESC))[1] AS barcode,
+        MAX(favorite_id) AS favorite_id,
+        (array_agg(meal_type ORDER BY s DESC) FILTER (WHERE meal_type IS NOT NULL))[1] AS meal_type,
+        (array_agg(quantity_grams ORDER BY s DESC))[1] AS quantity_grams,
+        (array_agg(calories ORDER BY s DESC))[1] AS calories,
+        (array_agg(protein ORDER BY s DESC))[1] AS protein,
+        (array_agg(carbs ORDER BY s DESC))[1] AS carbs,
+        (array_agg(fat ORDER BY s DESC))[1] AS fat,
+        MAX(use_count) AS use_count,
+        MAX(last_used) AS last_used
+    FROM bounded
+    GROUP BY item_key, m
+    ORDER BY score DESC
+    LIMIT :limit
+""")
+
+# ============================================================
+# Autocomplete (server.py)
+# ============================================================
+
+# A user's distinct logged items and favorites, best first
+AUTOCOMPLETE_USER_ITEMS = define("autocomplete_user_items", """
+    SELECT product_name, barcode, favorite_id, context, score
+    FROM user_suggestions
+    WHERE user_id = :user_id AND context IN ('all', 'fav')
+    ORDER BY score DESC
+""")
+
+# Most used items across all users
+AUTOCOMPLETE_TOP_PRODUCTS = define("autocomplete_top_products", """
+    SELECT MIN(product_name) AS product_name, MIN(barcode) AS barcode, SUM(use_count) AS uses
+    FROM user_suggestions
+    WHERE context = 'all'
+    GROUP BY item_key
+    ORDER BY SUM(use_count) DESC
+    LIMIT :limit
+""")
+
+# ============================================================
+# Delta sync (server.py)
+# ============================================================
+
+# Changed rows and tombstones with seq >= `since`, oldest first; the next
+# cursor is the last seq + 1. Per-user seq order matches commit order (see
+# 014_user_change_log_seq.sql), so a late commit is never skipped.
+SYNC_CHANGES = define("sync_changes", """
+    SELECT l.seq, l.entity, l.entity_id, l.op, l.data
+    FROM user_change_log l
+    WHERE l.user_id = :user_id
+      AND l.seq >= :since
+    ORDER BY l.seq
+""")
+
+# Idempotent creates (015_sync_client_refs.sql): the first push of a client_ref
+# claims it and records the new row's id; a replay finds the recorded id.
+# A concurrent replay waits on the primary key until the first one finishes.
+SYNC_CLAIM_CLIENT_REF = define("sync_claim_client_ref", """
+    INSERT INTO sync_client_refs (user_id, client_ref, entity)
+    VALUES (:user_id, :client_ref, :entity)
+    ON CONFLICT (user_id, client_ref) DO NOTHING
+    RETURNING client_ref
+""")
+
+SYNC_CLIENT_REF_ENTITY = define("sync_client_ref_entity", """
+    SELECT entity, entity_id
+    FROM sync_client_refs
+    WHERE user_id = :user_id AND client_ref = :client_ref
+""")
+
+SYNC_RECORD_CLIENT_REF = define("sync_record_client_ref", """
+    UPDATE sync_client_refs
+    SET entity_id = :entity_id
+    WHERE user_id = :user_id AND client_ref = :client_ref
+""")
+
+SYNC_UPDATE_INTAKE = define("sync_update_intake", """
+    UPDATE daily_food_intake
+    SET product_name = COALESCE(:product_name, product_name),
+        quantity_grams = COALESCE(:quantity, quantity_grams),
+        calories = COALESCE(:calories, calories),
+        protein = COALESCE(:protein, protein),
+        carbs = COALESCE(:carbs, carbs),
+        fat = COALESCE(:fat, fat),
+        fiber = COALESCE(:fiber, fiber),
+        sugar = COALESCE(:sugar, sugar),
+        sodium = COALESCE(:sodium, sodium),
+        meal_type = COALESCE(:meal_type, meal_type),
+        intake_date = COALESCE(:intake_date, intake_date),
+        intake_time = COALESCE(:intake_time, intake_time),
+        barcode = COALESCE(:barcode, barcode)
+    WHERE id = :id AND user_id = :user_id
+    RETURNING id
+""")
+
+# Favorites keep their client-generated id: a known id is updated in place
+# (fields left out are kept), but only when it belongs to the same user.
+SYNC_UPSERT_FAVORITE = define("sync_upsert_favorite", """
+    INSERT INTO user_favorites (
+        id, user_id, product_name, default_quantity, unit,
+        calories, protein, carbs, fat, fiber, sugar, sodium,
+        barcode, notes, created_at
+    ) VALUES (
+        :id, :user_id, :product_name, :default_quantity, COALESCE(:unit, 'g'),
+        :calories, :protein, :carbs, :fat, :fiber, :sugar, :sodium,
+        :barcode, :notes, :created_at
+    )
+    ON CONFLICT (id) DO UPDATE SET
+        product_name = COALESCE(:product_name, user_favorites.product_name),
+        default_quantity = COALESCE(:default_quantity, user_favorites.default_quantity),
+        unit = COALESCE(:unit, user_favorites.unit),
+        calories = COALESCE(:calories, user_favorites.calories),
+        protein = COALESCE(:protein, user_favorites.protein),
+        carbs = COALESCE(:carbs, user_favorites.carbs),
+        fat = COALESCE(:fat, user_favorites.fat),
+        fiber = COALESCE(:fiber, user_favorites.fiber),
+        sugar = COALESCE(:sugar, user_favorites.sugar),
+        sodium = COALESCE(:sodium, user_favorites.sodium),
+        barcode = COALESCE(:barcode, user_favorites.barcode),
+        notes = COALESCE(:notes, user_favorites.notes)
+    WHERE user_favorites.user_id = EXCLUDED.user_id
+    RETURNING id
+""")
+
+# Partial goals: a new row starts from the defaults, an existing one keeps
+# every goal the client left out.
+SYNC_UPSERT_GOALS = define("sync_upsert_goals", """
+    INSERT INTO user_nutrition_goals (
+        user_id, calorie_goal, carbs_goal, protein_goal, fat_goal, created_at, updated_at
+    ) VALUES (
+        :user_id,
+        COALESCE(CAST(:calorie_goal AS NUMERIC), :default_calorie_goal),
+        COALESCE(CAST(:carbs_goal AS NUMERIC), :default_carbs_goal),
+        COALESCE(CAST(:protein_goal AS NUMERIC), :default_protein_goal),
+        COALESCE(CAST(:fat_goal AS NUMERIC), :default_fat_goal),
+        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+    )
+    ON CONFLICT (user_id) DO UPDATE SET
+        calorie_goal = COALESCE(CAST(:calorie_goal AS NUMERIC), user_nutrition_goals.calorie_goal),
+        carbs_goal = COALESCE(CAST(:carbs_goal AS NUMERIC), user_nutrition_goals.carbs_goal),
+        protein_goal = COALESCE(CAST(:protein_goal AS NUMERIC), user_nutrition_goals.protein_goal),
+        fat_goal = COALESCE(CAST(:fat_goal AS NUMERIC), user_nutrition_goals.fat_goal),
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING user_id
+""")
+
+SYNC_DELETE_INTAKE = define("sync_delete_intake", """
+    DELETE FROM daily_food_intake
+    WHERE id = :id AND user_id = :user_id
+    RETURNING id
+""")
+
+# ============================================================
+# Export (server.py)
+# ============================================================
+
+_EXPORT_FILTERS = [
+    ("user", "f.user_id = :user_id"),
+    ("trainer", "f.user_id IN (SELECT ct.client_id::text FROM client_trainer ct WHERE ct.trainers_code = :trainers_code)"),
+    ("start", "f.intake_date >= :start_date"),
+    ("end", "f.intake_date <= :end_date"),
+]
+
+_INTAKE_EXPORT: Dict[Tuple[str, ...], TextClause] = {}
+for _n in range(1, len(_EXPORT_FILTERS) + 1):
+    for _combo in itertools.combinations(_EXPORT_FILTERS, _n):
+        _keys = tuple(key for key, _ in _combo)
+        _INTAKE_EXPORT[_keys] = define(f"intake_export[{','.join(_keys)}]", f"""
+            SELECT
+                f.id::text, f.user_id::text, f.product_name, f.barcode, f.meal_type,
+                f.intake_date, f.intake_time::time, f.quantity_grams::float8,
+                f.calories::float8, f.protein::float8, f.carbs::float8, f.fat::float8,
+                f.fiber::float8, f.sugar::float8, f.sodium::float8,
+                f.created_at::timestamp
+            FROM daily_food_intake f
+            WHERE {" AND ".join(clause for _, clause in _combo)}
+        """)
+
+
+def intake_export(user: bool, trainer: bool, start: bool, end: bool) -> TextClause:
+    """The export SELECT with a predicate for each filter that was given."""
+    keys = tuple(key for key, on in (("user", user), ("trainer", trainer), ("start", start), ("end", end)) if on)
+    return _INTAKE_EXPORT[keys]
+
+# ============================================================
+# Trainer cohort (server.py)
+# ============================================================
+
+COHORT = define("cohort", """
+    WITH clients AS (
+        SELECT ct.client_id, ct.client_id::text AS user_key
+        FROM client_trainer ct
+        WHERE ct.trainers_code = :trainers_code
+    ),
+    totals AS (
+        SELECT
+            f.user_id,
+            COUNT(*) AS total_records,
+            COUNT(DISTINCT f.intake_date) AS days_logged,
+            SUM(f.calories) AS total_calories,
+            SUM(f.protein) AS total_protein,
+            SUM(f.carbs) AS total_carbs,
+            SUM(f.fat) AS total_fat
+        FROM daily_food_intake f
+        JOIN clients c ON f.user_id = c.user_key
+        WHERE f.intake_date BETWEEN :start_date AND :end_date
+        GROUP BY f.user_id
+    )
+    SELECT
+        c.client_id,
+        cu.first_name,
+        cu.last_name,
+        cu.email,
+        COALESCE(t.total_records, 0) AS total_records,
+        COALESCE(t.days_logged, 0) AS days_logged,
+        t.total_calories,
+        t.total_protein,
+        t.total_carbs,
+        t.total_fat,
+        g.calorie_goal,
+        g.carbs_goal,
+        g.protein_goal,
+        g.fat_goal,
+        last_log.intake_date AS last_intake_date,
+        last_log.intake_time AS last_intake_time
+    FROM clients c
+    JOIN client_user cu ON cu.id = c.client_id
+    LEFT JOIN totals t ON t.user_id = c.user_key
+    LEFT JOIN user_nutrition_goals g ON g.user_id = c.user_key
+    LEFT JOIN LATERAL (
+        SELECT f.intake_date, f.intake_time
+        FROM daily_food_intake f
+        WHERE f.user_id = c.user_key
+        ORDER BY f.intake_date DESC, f.intake_time DESC
+        LIMIT 1
+    ) last_log ON TRUE
+    ORDER BY cu.last_name, cu.first_name, c.client_id
+""")
+
+
+# ============================================================
+# Form assignment (server.py)
+# ============================================================
+
+# Assigns one of the trainer's forms (at its current version) to every linked
+# client in a single INSERT ... SELECT; clients who already have it are left
+# alone. found = 0 means the trainer has no such form.
+ASSIGN_FORM_TO_CLIENTS = define("assign_form_to_clients", """
+    WITH form AS (
+        SELECT f.id,
+               (SELECT MAX(v.id) FROM form_versions v WHERE v.form_id = f.id) AS version_id
+        FROM onboarding_forms f
+        WHERE f.form_uid = :form_id AND f.trainers_code = :trainers_code
+    ),
+    targets AS (
+        SELECT DISTINCT ct.client_id
+        FROM client_trainer ct
+        WHERE ct.trainers_code = :trainers_code
+    ),
+    created AS (
+        INSERT INTO client_form_assignments (client_id, form_uid, trainers_code, form_version_id)
+        SELECT t.client_id, CAST(:form_id AS TEXT), CAST(:trainers_code AS TEXT), form.version_id
+        FROM targets t, form
+        ON CONFLICT (client_id, form_uid) DO NOTHING
+        RETURNING client_id
+    )
+    SELECT (SELECT COUNT(*) FROM form) AS found,
+           (SELECT COUNT(*) FROM targets) AS targets,
+           (SELECT MAX(version_id) FROM form) AS version_id,
+           COALESCE((SELECT array_agg(client_id ORDER BY client_id) FROM created), '{}') AS created
+""")
+
+# A client's assigned forms, answered once a submission for the form arrived
+# after the assignment; pending_only leaves just the ones still to fill in.
+CLIENT_FORM_ASSIGNMENTS = define("client_form_assignments", """
+    SELECT a.form_uid, a.trainers_code, a.form_version_id, a.assigned_at,
+           f.title, f.description,
+           s.submitted_at AS answered_at
+    FROM client_form_assignments a
+    LEFT JOIN LATERAL (
+        SELECT o.title, o.description
+        FROM onboarding_forms o
+        WHERE o.form_uid = a.form_uid AND o.trainers_code = a.trainers_code
+        ORDER BY o.id DESC
+        LIMIT 1
+    ) f ON TRUE
+    LEFT JOIN client_onboarding_form s
+           ON s.client_id = a.client_id
+          AND s.form_uid = a.form_uid
+          AND s.submitted_at >= a.assigned_at
+    WHERE a.client_id = :client_id
+      AND (NOT CAST(:pending_only AS BOOLEAN) OR s.id IS NULL)
+    ORDER BY a.assigned_at DESC, a.form_uid
+""")
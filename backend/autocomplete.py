@@ -0,0 +1,107 @@
+# autocomplete.py
+"""
+In-memory prefix index for product-name typeahead.
+
+Names are indexed at the start of every word ("greek yogurt" is found by "gre"
+and by "yog") in one sorted list, so a lookup is a bisect plus a short scan.
+Short prefixes match too many keys for that scan, so their best TOP_K entries
+are ranked once when the index is built; longer prefixes rank every match.
+Indexes are immutable once built; callers swap in a new one instead of
+updating in place.
+"""
+import heapq
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional
+
+
+_WORD_START = re.compile(r"(?:^|(?<=[\s\-/(,]))\w", re.UNICODE)
+
+# Prefixes up to this length are answered from the precomputed rankings
+SHORT_PREFIX = 3
+
+# Entries kept per short prefix; room for `limit` plus names excluded by merge_results
+TOP_K = 100
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class PrefixIndex:
+    """
+    Sorted word-start keys over a list of entries.
+    Each entry is a dict with at least "product_name" and a numeric "weight";
+    lookups return the best-weighted entries whose words start with the prefix.
+    Names are de-duplicated case-insensitively, keeping the first occurrence,
+    so pass entries best first.
+    """
+
+    def __init__(self, entries: Iterable[Dict[str, Any]]):
+        self.entries: List[Dict[str, Any]] = []
+        seen = set()
+        for entry in entries:
+            name = normalize(entry.get("product_name") or "")
+            if not name or name in seen:
+                continue
+            seen.add(name)
+            self.entries.append(entry)
+
+        keys = []
+        for position, entry in enumerate(self.entries):
+            name = normalize(entry["product_name"])
+            for match in _WORD_START.finditer(name):
+                keys.append((name[match.start():], position))
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._positions = [position for _, position in keys]
+
+        # Best-weighted entries per short prefix (ties keep entry order)
+        by_prefix: Dict[str, set] = {}
+        for key, position in keys:
+            for n in range(1, min(SHORT_PREFIX, len(key)) + 1):
+                by_prefix.setdefault(key[:n], set()).add(position)
+        self._top: Dict[str, List[int]] = {
+            prefix: sorted(positions, key=lambda p: (-self.entries[p]["weight"], p))[:TOP_K]
+            for prefix, positions in by_prefix.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, prefix: str, limit: int = 10, exclude: Optional[set] = None) -> List[Dict[str, Any]]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        if len(prefix) <= SHORT_PREFIX:
+            hits = []
+            for position in self._top.get(prefix, ()):
+                entry = self.entries[position]
+                if exclude and normalize(entry["product_name"]) in exclude:
+                    continue
+                hits.append(entry)
+                if len(hits) >= limit:
+                    break
+            return hits
+
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        matched = set(self._positions[start:end])
+        if exclude:
+            matched = {p for p in matched if normalize(self.entries[p]["product_name"]) not in exclude}
+        best = heapq.nsmallest(limit, matched, key=lambda p: (-self.entries[p]["weight"], p))
+        return [self.entries[p] for p in best]
+
+
+def merge_results(prefix: str, limit: int, *indexes: Optional[PrefixIndex]) -> List[Dict[str, Any]]:
+    """Search indexes in priority order, filling up to `limit` without repeating a name."""
+    results: List[Dict[str, Any]] = []
+    names: set = set()
+    for index in indexes:
+        if index is None or len(results) >= limit:
+            continue
+        for entry in index.search(prefix, limit - len(results), exclude=names):
+            names.add(normalize(entry["product_name"]))
+            results.append(entry)
+    return results
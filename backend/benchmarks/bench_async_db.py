@@ -0,0 +1,116 @@
+# bench_async_db.py
+"""
+Requests per second for the daily-intake read, sync vs async DB layer.
+
+Both modes run the same query at the same concurrency inside one process:
+  - sync:  SessionLocal on a 40-thread pool (the AnyIO threadpool default that
+           caps sync `def` endpoints in a single uvicorn worker)
+  - async: AsyncSessionLocal on the event loop, as the endpoints now do
+
+With --url the script instead drives a running server over HTTP, so the same
+numbers can be taken against a build of either version at a fixed worker count.
+
+Usage (from backend/):
+  python -m benchmarks.bench_async_db --user-id 1 --requests 2000 --concurrency 200
+  python -m benchmarks.bench_async_db --url http://127.0.0.1:8000 --user-id 1
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from sqlalchemy import text
+
+from server import SessionLocal, AsyncSessionLocal, async_engine
+
+
+DAILY_QUERY = text("""
+    SELECT id, product_name, quantity_grams, calories, protein, carbs, fat,
+           meal_type, intake_time, intake_date
+    FROM daily_food_intake
+    WHERE user_id = :user_id AND intake_date = :target_date
+    ORDER BY intake_time
+""")
+
+ANYIO_THREADPOOL_SIZE = 40
+
+
+def _report(label: str, latencies: list, elapsed: float) -> None:
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<6} {len(latencies) / elapsed:>9.1f} req/s   "
+        f"p50 {statistics.median(latencies) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms"
+    )
+
+
+def bench_sync(params: dict, total: int) -> None:
+    def one() -> float:
+        t0 = time.perf_counter()
+        with SessionLocal() as session:
+            session.execute(DAILY_QUERY, params).fetchall()
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=ANYIO_THREADPOOL_SIZE) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda _: one(), range(total)))
+        _report("sync", latencies, time.perf_counter() - start)
+
+
+async def bench_async(params: dict, total: int, concurrency: int) -> None:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one() -> float:
+        async with gate:
+            t0 = time.perf_counter()
+            async with AsyncSessionLocal() as session:
+                (await session.execute(DAILY_QUERY, params)).fetchall()
+            return time.perf_counter() - t0
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(total)))
+    _report("async", list(latencies), time.perf_counter() - start)
+    await async_engine.dispose()
+
+
+async def bench_http(url: str, user_id: str, total: int, concurrency: int) -> None:
+    import httpx
+
+    gate = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        async def one() -> float:
+            async with gate:
+                t0 = time.perf_counter()
+                response = await client.get(f"/intake/daily/{user_id}")
+                response.raise_for_status()
+                return time.perf_counter() - t0
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(total)))
+        _report("http", list(latencies), time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", default="1")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--url", help="benchmark a running server instead of the DB layer")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_http(args.url, args.user_id, args.requests, args.concurrency))
+        return
+
+    params = {"user_id": args.user_id, "target_date": date.today().isoformat()}
+    print(f"{args.requests} daily-intake reads, concurrency {args.concurrency}")
+    bench_sync(params, args.requests)
+    asyncio.run(bench_async(params, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
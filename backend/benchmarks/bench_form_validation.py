@@ -0,0 +1,177 @@
+# bench_form_validation.py
+"""
+Validation cost per submission for large onboarding forms, compiled vs interpreted.
+
+  - interpreted: walks the raw schema on every submission (finds visibility
+                 sources by scanning `fields`, rebuilds option lists, parses
+                 rule values and regexes each time)
+  - compiled:    form_validation.compile_form() once, then validate() only
+
+The one-off compile time is reported separately; with validators cached per
+form version it is paid once per version, not per submission.
+
+Usage (from backend/):
+  python -m benchmarks.bench_form_validation
+  python -m benchmarks.bench_form_validation --fields 300 1000 --submissions 2000
+"""
+import argparse
+import random
+import re
+import time
+
+import form_validation
+
+
+TYPES = ["text", "number", "email", "select", "radio", "checkbox", "date", "textarea"]
+
+
+def build_form(n_fields: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    fields = []
+    for i in range(n_fields):
+        kind = TYPES[i % len(TYPES)]
+        field = {"id": f"field-{i}", "type": kind, "label": f"Question {i}", "required": rng.random() < 0.5}
+        if kind in ("select", "radio") or (kind == "checkbox" and i % 2):
+            field["options"] = [f"option {k}" for k in range(8)]
+        if kind in ("text", "textarea"):
+            field["validation"] = [
+                {"type": "minLength", "value": 2},
+                {"type": "maxLength", "value": 200},
+                {"type": "pattern", "value": r"^[\w\s.,-]+$"},
+            ]
+        if kind == "number":
+            field["validation"] = [{"type": "min", "value": 0}, {"type": "max", "value": 500}]
+        # A third of the fields depend on an earlier select or number field
+        if i > 8 and rng.random() < 0.33:
+            source = rng.randrange(0, i)
+            source_kind = TYPES[source % len(TYPES)]
+            if source_kind in ("select", "radio"):
+                field["visibilityRules"] = [{"fieldId": f"field-{source}", "condition": "notEquals", "value": "option 0"}]
+            elif source_kind == "number":
+                field["visibilityRules"] = [{"fieldId": f"field-{source}", "condition": "greaterThan", "value": "10"}]
+        fields.append(field)
+    return {"id": f"form-bench-{n_fields}", "fields": fields}
+
+
+def build_values(schema: dict, seed: int) -> dict:
+    rng = random.Random(seed)
+    values = {}
+    for field in schema["fields"]:
+        kind = field["type"]
+        if rng.random() < 0.1:
+            continue
+        if kind == "number":
+            values[field["id"]] = str(rng.randint(0, 600))
+        elif kind == "email":
+            values[field["id"]] = f"client{rng.randint(0, 999)}@example.com"
+        elif kind in ("select", "radio"):
+            values[field["id"]] = rng.choice(field["options"])
+        elif kind == "checkbox":
+            values[field["id"]] = rng.sample(field["options"], 2) if field.get("options") else True
+        elif kind == "date":
+            values[field["id"]] = "2025-03-14"
+        else:
+            values[field["id"]] = "some answer " * rng.randint(1, 5)
+    return values
+
+
+def interpreted_validate(schema: dict, values: dict) -> list:
+    """Straightforward per-request interpretation of the schema, no precomputation."""
+    fields = schema.get("fields") or []
+    errors = []
+
+    def is_visible(field, seen=()):
+        for rule in field.get("visibilityRules") or []:
+            source = next((f for f in fields if f.get("id") == rule.get("fieldId")), None)
+            if source is None:
+                continue
+            actual = values.get(source["id"]) if source["id"] not in seen and is_visible(source, seen + (field["id"],)) else None
+            expected = rule.get("value")
+            condition = rule.get("condition")
+            if condition == "equals" and str(actual if actual is not None else "") != str(expected):
+                return False
+            if condition == "notEquals" and str(actual if actual is not None else "") == str(expected):
+                return False
+            if condition in ("greaterThan", "lessThan"):
+                try:
+                    a, e = float(actual or 0), float(expected)
+                except (TypeError, ValueError):
+                    return False
+                if (condition == "greaterThan" and not a > e) or (condition == "lessThan" and not a < e):
+                    return False
+        return True
+
+    for field in fields:
+        if not is_visible(field):
+            continue
+        value = values.get(field["id"])
+        if value in (None, "", [], False):
+            if field.get("required"):
+                errors.append(field["id"])
+            continue
+        kind = field.get("type")
+        options = [str(o) for o in field.get("options") or []]
+        if kind in ("select", "radio") and options and str(value) not in options:
+            errors.append(field["id"])
+            continue
+        if kind == "checkbox" and options and not all(str(v) in options for v in value):
+            errors.append(field["id"])
+            continue
+        if kind == "number":
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                errors.append(field["id"])
+                continue
+        for rule in field.get("validation") or []:
+            kind_ = rule.get("type")
+            if kind_ == "minLength" and len(str(value)) < float(rule["value"]):
+                errors.append(field["id"])
+                break
+            if kind_ == "maxLength" and len(str(value)) > float(rule["value"]):
+                errors.append(field["id"])
+                break
+            if kind_ == "min" and float(value) < float(rule["value"]):
+                errors.append(field["id"])
+                break
+            if kind_ == "max" and float(value) > float(rule["value"]):
+                errors.append(field["id"])
+                break
+            if kind_ == "pattern" and not re.compile(rule["value"]).search(str(value)):
+                errors.append(field["id"])
+                break
+    return errors
+
+
+def _per_submission(label: str, fn, submissions: list) -> float:
+    start = time.perf_counter()
+    for values in submissions:
+        fn(values)
+    elapsed = time.perf_counter() - start
+    per = elapsed / len(submissions)
+    print(f"  {label:<12} {per * 1e6:10.1f} us/submission   {len(submissions) / elapsed:9.0f} submissions/s")
+    return per
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fields", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--submissions", type=int, default=1000)
+    args = parser.parse_args()
+
+    for n_fields in args.fields:
+        schema = build_form(n_fields)
+        submissions = [build_values(schema, seed) for seed in range(args.submissions)]
+
+        start = time.perf_counter()
+        compiled = form_validation.compile_form(schema)
+        compile_time = time.perf_counter() - start
+
+        print(f"{n_fields} fields, {args.submissions} submissions (compile once: {compile_time * 1000:.2f} ms)")
+        slow = _per_submission("interpreted", lambda v: interpreted_validate(schema, v), submissions)
+        fast = _per_submission("compiled", compiled.validate, submissions)
+        print(f"  speedup      {slow / fast:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# cache.py
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache for in-process result caching.
+    - Entries are evicted least-recently-used once `maxsize` is reached.
+    - If `ttl` (seconds) is given, entries older than that are treated as missing.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches `predicate`. Returns how many were dropped."""
+        with self._lock:
+            stale = [k for k in self._data if predicate(k)]
+            for k in stale:
+                del self._data[k]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class VersionCounter:
+    """
+    Per-key version tokens for conditional GETs (ETag / If-None-Match).
+    - `current(key)` returns the key's token, assigning a fresh one if unseen.
+    - `bump(key)` forgets the token so the next read gets a new, never-used one.
+    Tokens come from one process-wide sequence plus a per-process epoch, so a
+    forgotten, evicted or restarted key can never reuse an old token.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = itertools.count(1)
+        self._versions: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def current(self, key: Hashable) -> str:
+        with self._lock:
+            version = self._versions.get(key)
+            if version is None:
+                version = next(self._seq)
+                self._versions[key] = version
+                while len(self._versions) > self.maxsize:
+                    self._versions.popitem(last=False)
+            else:
+                self._versions.move_to_end(key)
+            return f"{self.epoch}-{version}"
+
+    def bump(self, key: Hashable) -> None:
+        with self._lock:
+            self._versions.pop(key, None)
+
+    def bump_all(self) -> None:
+        with self._lock:
+            self._versions.clear()
+
+    def bump_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for k in [k for k in self._versions if predicate(k)]:
+                del self._versions[k]
@@ -0,0 +1,127 @@
+# export.py
+"""
+Columnar (Parquet / Arrow IPC) encoding of daily_food_intake rows.
+
+Rows arrive in batches from a server-side cursor and each batch is encoded and
+handed back as bytes straight away, so memory stays bounded by the batch size
+no matter how many rows are exported. Encoding runs in a worker thread so the
+event loop keeps serving other requests meanwhile.
+"""
+import asyncio
+from typing import AsyncIterator, Iterable, List, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the /export endpoints
+    pa = None
+
+
+# Column order of the export query; must match intake_schema()
+INTAKE_EXPORT_COLUMNS = [
+    "id", "user_id", "product_name", "barcode", "meal_type",
+    "intake_date", "intake_time", "quantity_grams",
+    "calories", "protein", "carbs", "fat", "fiber", "sugar", "sodium",
+    "created_at",
+]
+
+
+def intake_schema():
+    return pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("product_name", pa.string()),
+        ("barcode", pa.string()),
+        ("meal_type", pa.string()),
+        ("intake_date", pa.date32()),
+        ("intake_time", pa.time64("us")),
+        ("quantity_grams", pa.float64()),
+        ("calories", pa.float64()),
+        ("protein", pa.float64()),
+        ("carbs", pa.float64()),
+        ("fat", pa.float64()),
+        ("fiber", pa.float64()),
+        ("sugar", pa.float64()),
+        ("sodium", pa.float64()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _to_record_batch(rows: Sequence[Sequence], schema) -> "pa.RecordBatch":
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    arrays = [pa.array(list(col), type=field.type) for col, field in zip(columns, schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _open_writer(sink: _ChunkSink, schema, fmt: str):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    return pa.ipc.new_stream(sink, schema, options=options)
+
+
+def _encode(writer, sink: _ChunkSink, rows: List[Sequence], schema) -> bytes:
+    writer.write_batch(_to_record_batch(rows, schema))
+    return sink.drain()
+
+
+def _close(writer, sink: _ChunkSink) -> bytes:
+    writer.close()
+    return sink.drain()
+
+
+async def encode_batches(batches: AsyncIterator[Iterable[Sequence]], fmt: str) -> AsyncIterator[bytes]:
+    """
+    Encode an async iterator of row batches as a zstd-compressed Parquet file
+    (fmt="parquet", one row group per batch) or Arrow IPC stream (fmt="arrow").
+    """
+    schema = intake_schema()
+    sink = _ChunkSink()
+    writer = await asyncio.to_thread(_open_writer, sink, schema, fmt)
+
+    try:
+        async for rows in batches:
+            chunk = await asyncio.to_thread(_encode, writer, sink, list(rows), schema)
+            if chunk:
+                yield chunk
+    except BaseException:
+        # Client went away or the query failed: just release the writer
+        writer.close()
+        raise
+
+    tail = await asyncio.to_thread(_close, writer, sink)
+    if tail:
+        yield tail
@@ -0,0 +1,246 @@
+# form_validation.py
+"""
+Server-side validation of onboarding form submissions.
+
+`compile_form(schema)` turns a form schema (the builder's `fields` list with
+`required`, `type`, `options`, `validation` and `visibilityRules`) into a
+`CompiledForm` once: type checks, option sets, regexes and rule thresholds are
+resolved up front, and fields are put in dependency order so visibility can be
+decided in a single pass. `CompiledForm.validate(values)` then only walks that
+prepared plan.
+
+Visibility follows the form preview: a field is shown when all of its rules
+hold. A hidden field is not validated, and it counts as empty for the rules
+of fields that depend on it.
+"""
+import heapq
+import re
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+URL = re.compile(r"^https?://\S+$", re.IGNORECASE)
+COLOR = re.compile(r"^#[0-9a-fA-F]{6}$")
+
+NUMERIC_TYPES = {"number", "range"}
+CHOICE_TYPES = {"select", "radio"}
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value is False
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parses(parser: Callable[[str], Any]) -> Callable[[Any], bool]:
+    def check(value: Any) -> bool:
+        if not isinstance(value, str):
+            return False
+        try:
+            parser(value)
+            return True
+        except ValueError:
+            return False
+    return check
+
+
+def _type_check(field: Dict[str, Any]) -> Tuple[Optional[Callable[[Any], bool]], str]:
+    """Checker for a non-empty value of this field type, and its error message."""
+    kind = field.get("type")
+    options = frozenset(str(o) for o in field.get("options") or [])
+
+    if kind in NUMERIC_TYPES:
+        return (lambda v: _as_number(v) is not None), "must be a number"
+    if kind == "email":
+        return (lambda v: isinstance(v, str) and EMAIL.match(v) is not None), "must be a valid email address"
+    if kind == "url":
+        return (lambda v: isinstance(v, str) and URL.match(v) is not None), "must be a valid URL"
+    if kind == "color":
+        return (lambda v: isinstance(v, str) and COLOR.match(v) is not None), "must be a color like #a1b2c3"
+    if kind == "date":
+        return _parses(date.fromisoformat), "must be a date (YYYY-MM-DD)"
+    if kind == "time":
+        return _parses(time.fromisoformat), "must be a time (HH:MM)"
+    if kind == "datetime-local":
+        return _parses(datetime.fromisoformat), "must be a date and time"
+    if kind in CHOICE_TYPES:
+        if not options:
+            return None, ""
+        return (lambda v: str(v) in options), "must be one of the listed options"
+    if kind == "checkbox":
+        if options:
+            return (
+                lambda v: isinstance(v, list) and all(str(item) in options for item in v)
+            ), "must only contain listed options"
+        return (lambda v: isinstance(v, bool)), "must be true or false"
+    if kind == "file":
+        return None, ""
+    return (lambda v: isinstance(v, (str, int, float)) and not isinstance(v, bool)), "must be text"
+
+
+def _length(value: Any) -> int:
+    return len(value) if isinstance(value, (str, list)) else len(str(value))
+
+
+def _rule_check(rule: Dict[str, Any], label: str) -> Optional[Tuple[Callable[[Any], bool], str]]:
+    """Checker and error message for one `validation` entry; None for rules with nothing to check."""
+    kind = rule.get("type")
+    raw = rule.get("value")
+    message = rule.get("message")
+
+    if kind in ("minLength", "maxLength"):
+        limit = _as_number(raw)
+        if limit is None:
+            return None
+        if kind == "minLength":
+            return (lambda v: _length(v) >= limit), message or f"{label} must be at least {int(limit)} characters"
+        return (lambda v: _length(v) <= limit), message or f"{label} must be at most {int(limit)} characters"
+
+    if kind in ("min", "max"):
+        bound = _as_number(raw)
+        if bound is None:
+            return None
+        if kind == "min":
+            return (lambda v: (_as_number(v) or 0.0) >= bound), message or f"{label} must be at least {raw}"
+        return (lambda v: (_as_number(v) or 0.0) <= bound), message or f"{label} must be at most {raw}"
+
+    if kind == "pattern" and raw:
+        try:
+            pattern = re.compile(str(raw))
+        except re.error:
+            return None
+        return (lambda v: pattern.search(str(v)) is not None), message or f"{label} has an invalid format"
+
+    return None
+
+
+def _visibility_check(rule: Dict[str, Any]) -> Optional[Tuple[str, Callable[[Any], bool]]]:
+    """(field id it depends on, predicate on that field's value) for one visibility rule."""
+    source = rule.get("fieldId")
+    if not source:
+        return None
+    condition = rule.get("condition")
+    expected = rule.get("value")
+    expected_str = "" if expected is None else str(expected)
+    expected_num = _as_number(expected)
+
+    if condition == "equals":
+        return source, lambda v: ("" if v is None else str(v)) == expected_str
+    if condition == "notEquals":
+        return source, lambda v: ("" if v is None else str(v)) != expected_str
+    if condition == "contains":
+        return source, lambda v: v is not None and (
+            expected_str in v if isinstance(v, (str, list)) else expected_str in str(v)
+        )
+    if condition in ("greaterThan", "lessThan"):
+        if expected_num is None:
+            return source, lambda v: False
+        if condition == "greaterThan":
+            return source, lambda v: (_as_number(v) or 0.0) > expected_num
+        return source, lambda v: (_as_number(v) or 0.0) < expected_num
+    return None
+
+
+class CompiledField:
+    __slots__ = ("id", "label", "type", "options", "required", "required_message", "type_check", "type_message", "rules", "visibility")
+
+    def __init__(self, field: Dict[str, Any]):
+        self.id = str(field["id"])
+        self.label = field.get("label") or self.id
+        self.type = field.get("type")
+        self.options = [str(o) for o in field.get("options") or []]
+        rules = field.get("validation") or []
+
+        required_rule = next((r for r in rules if r.get("type") == "required"), None)
+        self.required = bool(field.get("required")) or required_rule is not None
+        self.required_message = (required_rule or {}).get("message") or f"{self.label} is required"
+
+        type_check, type_message = _type_check(field)
+        self.type_check = type_check
+        self.type_message = f"{self.label} {type_message}"
+        self.rules = [check for check in (_rule_check(rule, self.label) for rule in rules) if check is not None]
+        self.visibility = [check for check in map(_visibility_check, field.get("visibilityRules") or []) if check]
+
+
+class CompiledForm:
+    def __init__(self, schema: Dict[str, Any]):
+        fields = [CompiledField(f) for f in schema.get("fields") or [] if f.get("id")]
+        self.form_id = schema.get("id")
+        self.by_id: Dict[str, CompiledField] = {f.id: f for f in fields}
+        self.order: List[CompiledField] = self._dependency_order(fields)
+
+    def _dependency_order(self, fields: List[CompiledField]) -> List[CompiledField]:
+        """Fields after the fields their visibility depends on (form order otherwise; cycles keep form order)."""
+        # Kahn's algorithm; a heap on form position keeps form order among ready fields.
+        # A repeated field id is only placed once, at its first occurrence.
+        unique: Dict[str, CompiledField] = {}
+        for field in fields:
+            unique.setdefault(field.id, field)
+        fields = list(unique.values())
+        position = {field.id: i for i, field in enumerate(fields)}
+        waiting: Dict[str, int] = {}
+        dependents: Dict[str, List[int]] = {}
+        for i, field in enumerate(fields):
+            sources = {source for source, _ in field.visibility if source in position and source != field.id}
+            waiting[field.id] = len(sources)
+            for source in sources:
+                dependents.setdefault(source, []).append(i)
+
+        ready = [i for i, field in enumerate(fields) if not waiting[field.id]]
+        heapq.heapify(ready)
+        ordered: List[CompiledField] = []
+        while ready:
+            field = fields[heapq.heappop(ready)]
+            ordered.append(field)
+            for i in dependents.get(field.id, ()):
+                waiting[fields[i].id] -= 1
+                if not waiting[fields[i].id]:
+                    heapq.heappush(ready, i)
+
+        # Fields on (or behind) a cycle: appended in form order
+        if len(ordered) < len(fields):
+            done = {field.id for field in ordered}
+            ordered.extend(field for field in fields if field.id not in done)
+        return ordered
+
+    def validate(self, values: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Errors as [{"field_id", "label", "message"}]; empty when the submission is valid."""
+        errors: List[Dict[str, str]] = []
+        hidden = set()
+
+        for field in self.order:
+            if field.visibility and not all(
+                predicate(None if source in hidden else values.get(source))
+                for source, predicate in field.visibility
+            ):
+                hidden.add(field.id)
+                continue
+
+            value = values.get(field.id)
+            if _is_empty(value):
+                if field.required:
+                    errors.append({"field_id": field.id, "label": field.label, "message": field.required_message})
+                continue
+
+            if field.type_check is not None and not field.type_check(value):
+                errors.append({"field_id": field.id, "label": field.label, "message": field.type_message})
+                continue
+
+            for check, message in field.rules:
+                if not check(value):
+                    errors.append({"field_id": field.id, "label": field.label, "message": message})
+                    break
+
+        return errors
+
+
+def compile_form(schema: Dict[str, Any]) -> CompiledForm:
+    return CompiledForm(schema)
@@ -0,0 +1,164 @@
+# group_commit.py
+"""
+Group commit for single-row inserts.
+
+Concurrent callers hand their row to `GroupCommitWriter.submit()`. Rows that
+arrive within `window_ms` of the first one are written together by one
+multi-row statement in one transaction, so a burst of N requests costs one
+commit (one WAL flush) instead of N. Each caller's future is resolved with its
+own returned row only after that commit. If the insert itself rejects the
+batch (a bad value, a violated constraint) nothing was written, so it is split
+in halves and each half retried, down to single rows: only the callers whose
+own row is bad get the exception. Any other failure, including one during
+commit or a lost connection, may leave the batch written, so every caller in
+it gets the exception and nothing is retried.
+
+The statement takes a single `rows` parameter (a JSON array of the submitted
+rows, each with an "ord" field) and must return rows in "ord" order;
+`INSERT ... SELECT ... ORDER BY ord RETURNING ...` does.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+
+class _RejectedRows(Exception):
+    """The insert statement refused the batch's data; nothing was written."""
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+
+
+class GroupCommitWriter:
+    def __init__(
+        self,
+        session_factory,
+        statement,
+        window_ms: float = 5.0,
+        max_batch: int = 256,
+        check_fields: Sequence[str] = (),
+        before_commit: Optional[Callable[[Any, List[Dict[str, Any]]], Awaitable[None]]] = None,
+        after_commit: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        self.session_factory = session_factory
+        self.statement = statement
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.check_fields = check_fields
+        self.before_commit = before_commit
+        self.after_commit = after_commit
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.rows = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+        self.largest_batch = 0
+
+    async def submit(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue one row and wait until it is committed; returns the inserted row."""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((params, future))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "rows": self.rows,
+            "failed_batches": self.failed_batches,
+            "failed_rows": self.failed_rows,
+            "largest_batch": self.largest_batch,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0,
+        }
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        try:
+            saved = await self._write(batch)
+        except _RejectedRows as e:
+            self.failed_batches += 1
+            if len(batch) > 1:
+                # Find the offending rows: retry each half on its own
+                middle = len(batch) // 2
+                await self._flush(batch[:middle])
+                await self._flush(batch[middle:])
+                return
+            self._fail(batch, e.error)
+            return
+        except Exception as e:
+            # Possibly committed already: retrying could insert the rows twice
+            self.failed_batches += 1
+            self._fail(batch, e)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        if self.after_commit is not None:
+            try:
+                self.after_commit(saved)
+            except Exception as e:
+                print("Group commit after_commit hook failed:", e)
+
+        for (_, future), row in zip(batch, saved):
+            if not future.done():
+                future.set_result(row)
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> List[Dict[str, Any]]:
+        """Insert and commit the batch in one transaction; returns the saved rows in order."""
+        payload = [{**params, "ord": i} for i, (params, _) in enumerate(batch)]
+        async with self.session_factory() as session:
+            try:
+                try:
+                    result = await session.execute(self.statement, {"rows": payload})
+                except (DataError, IntegrityError) as e:
+                    raise _RejectedRows(e)
+                saved = [row._asdict() for row in result]
+                self._check(payload, saved)
+                if self.before_commit is not None:
+                    await self.before_commit(session, saved)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        return saved
+
+    def _fail(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]], error: Exception) -> None:
+        self.failed_rows += len(batch)
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _check(self, payload: List[Dict[str, Any]], saved: List[Dict[str, Any]]) -> None:
+        """Refuse to hand out rows unless they line up with the submitted ones."""
+        if len(saved) != len(payload):
+            raise RuntimeError(f"Group insert returned {len(saved)} rows for {len(payload)} submitted")
+        for params, row in zip(payload, saved):
+            for field in self.check_fields:
+                if str(params.get(field)) != str(row.get(field)):
+                    raise RuntimeError("Group insert returned rows out of order")
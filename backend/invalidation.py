@@ -0,0 +1,112 @@
+# invalidation.py
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+Each uvicorn worker keeps its own in-process caches. When one worker changes
+data it calls `notify(session, kind, key)` inside the same transaction as the
+write; Postgres delivers the message to every listening worker only after the
+commit, and each worker runs the handlers registered for that `kind`.
+
+Messages sent while a worker's LISTEN connection is down are lost, so on every
+(re)connect the worker runs its `register_reset` handlers, which drop
+everything the missed messages could have invalidated.
+"""
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List
+
+import psycopg2
+from DB import statements as stmts
+
+
+CHANNEL = "coachconnect_invalidate"
+
+# Identifies this process so it can skip its own (already applied) messages
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_handlers: Dict[str, List[Callable[[str], None]]] = {}
+_reset_handlers: List[Callable[[], None]] = []
+_listener: threading.Thread = None
+
+
+def register(kind: str, handler: Callable[[str], None]) -> None:
+    """Run `handler(key)` whenever another worker broadcasts `kind`."""
+    _handlers.setdefault(kind, []).append(handler)
+
+
+def register_reset(handler: Callable[[], None]) -> None:
+    """Run `handler()` whenever the listener (re)connects and may have missed messages."""
+    _reset_handlers.append(handler)
+
+
+def _reset_all() -> None:
+    for handler in _reset_handlers:
+        try:
+            handler()
+        except Exception as e:
+            print("Invalidation reset handler failed:", e)
+
+
+def notify(session, kind: str, key) -> None:
+    """Queue an invalidation message; it is only sent if the session commits."""
+    payload = json.dumps({"kind": kind, "key": str(key), "origin": WORKER_ID})
+    session.execute(stmts.NOTIFY, {"channel": CHANNEL, "payload": payload})
+
+
+async def anotify(session, kind: str, key) -> None:
+    """`notify` for an AsyncSession."""
+    payload = json.dumps({"kind": kind, "key": str(key), "origin": WORKER_ID})
+    await session.execute(stmts.NOTIFY, {"channel": CHANNEL, "payload": payload})
+
+
+def _dispatch(raw_payload: str) -> None:
+    try:
+        message = json.loads(raw_payload)
+    except ValueError:
+        return
+    if message.get("origin") == WORKER_ID:
+        return
+    for handler in _handlers.get(message.get("kind"), []):
+        try:
+            handler(message.get("key"))
+        except Exception as e:
+            print("Invalidation handler failed:", e)
+
+
+def _listen_forever(dsn: str) -> None:
+    while True:
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            print(f"Listening for cache invalidations on '{CHANNEL}' (worker {WORKER_ID})")
+            # Anything cached before LISTEN took effect may have missed its invalidation
+            _reset_all()
+
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _dispatch(conn.notifies.pop(0).payload)
+        except Exception as e:
+            print("Invalidation listener error, reconnecting:", e)
+            time.sleep(2)
+
+
+def start_listener(database_url: str) -> None:
+    """Start the background LISTEN thread once per process."""
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+
+    # psycopg2 wants a plain libpq URL, not the SQLAlchemy driver form
+    dsn = database_url.split("://", 1)[1]
+    dsn = f"postgresql://{dsn}"
+    _listener = threading.Thread(target=_listen_forever, args=(dsn,), name="cache-invalidation", daemon=True)
+    _listener.start()
@@ -0,0 +1,184 @@
+# passwords.py
+"""
+bcrypt password hashing on a dedicated process pool.
+
+A bcrypt hash or verify costs 100-300 ms of CPU at the usual cost factors. Run
+inline it stalls the event loop, and run in the request threadpool it still
+competes for the GIL with every other sync endpoint. `PasswordHasher` sends the
+work to a small, bounded ProcessPoolExecutor and is awaited from async
+endpoints, so a login storm queues behind the pool instead of slowing the rest
+of the API down.
+
+- The cost (bcrypt rounds) is configurable. A stored hash made with other
+  parameters verifies normally, and `verify` hands back a replacement hash so
+  the caller can store it (rehash-on-login).
+- Rows that still hold a plaintext password are accepted once and come back
+  with a hash to store, so legacy accounts migrate as their owners log in.
+- Once `max_queue` calls are pending, new calls fail fast with
+  `PasswordHasherBusy` instead of piling up behind the pool.
+- `verify_unknown` spends a real verify on a dummy hash when there is no
+  account, so login time doesn't reveal which emails are registered.
+"""
+import asyncio
+import hmac
+import multiprocessing
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+
+# bcrypt only looks at the first 72 bytes
+BCRYPT_MAX_BYTES = 72
+
+_contexts: Dict[int, CryptContext] = {}
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hash/verify calls are already waiting for the pool."""
+
+
+def _context(rounds: int) -> CryptContext:
+    context = _contexts.get(rounds)
+    if context is None:
+        # min = max = default, so a hash made at any other cost is flagged for rehash
+        context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        _contexts[rounds] = context
+    return context
+
+
+def _secret(password: str) -> bytes:
+    return password.encode("utf-8")[:BCRYPT_MAX_BYTES]
+
+
+# ---- Run inside the worker processes ----
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(_secret(password))
+
+
+def _verify(password: str, stored: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """(matches, replacement hash to store or None)."""
+    context = _context(rounds)
+    if not stored:
+        return False, None
+    if context.identify(stored, required=False) is None:
+        # Legacy plaintext password: compare in constant time, upgrade on success
+        if hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")):
+            return True, context.hash(_secret(password))
+        return False, None
+    return context.verify_and_update(_secret(password), stored)
+
+
+def _timed(fn: Callable, *args) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = 2, rounds: int = 12, max_queue: int = 256):
+        self.workers = workers
+        self.rounds = rounds
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._dummy_hash: Optional[str] = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.legacy_upgraded = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify(self, password: str, stored: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check `password` against the stored value. Returns (matches, new_hash);
+        new_hash is set when the caller should replace the stored value.
+        """
+        ok, new_hash = await self._submit(_verify, password, stored or "", self.rounds)
+        if new_hash is not None:
+            if _context(self.rounds).identify(stored or "", required=False) is None:
+                self.legacy_upgraded += 1
+            else:
+                self.rehashed += 1
+        return ok, new_hash
+
+    async def verify_unknown(self, password: str) -> None:
+        """Take as long as `verify` would for an existing account; always fails."""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash(secrets.token_urlsafe(32))
+        await self.verify(password, self._dummy_hash)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "queued": max(self.pending - self.workers, 0),
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "legacy_upgraded": self.legacy_upgraded,
+            "avg_wait_ms": round(self._wait_seconds / self.completed * 1000, 2) if self.completed else 0,
+            "avg_run_ms": round(self._run_seconds / self.completed * 1000, 2) if self.completed else 0,
+        }
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a server process that already runs threads and DB pools is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _submit(self, fn: Callable, *args):
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy(f"{self.pending} password operations already pending")
+
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        submitted = time.perf_counter()
+        try:
+            result, run_seconds = await asyncio.get_running_loop().run_in_executor(
+                self._pool(), _timed, fn, *args
+            )
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            self.failed += 1
+            self.shutdown()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self._run_seconds += run_seconds
+        self._wait_seconds += max(time.perf_counter() - submitted - run_seconds, 0.0)
+        return result
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 import json
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import requests
 from typing import Dict, Any
 from sqlalchemy import create_engine, text
@@ -9,17 +10,26 @@ from fastapi import FastAPI, Query, HTTPException, Body
 
 from sqlalchemy import create_engine, text, bindparam
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.dialects.postgresql import JSONB
 from dotenv import load_dotenv
 import os
 import json
+import base64
+import re
 import random
 import string
 from typing import Optional, Dict, Any, List
 from contextlib import contextmanager
-from datetime import date
+from datetime import date, datetime
 
-from DB.db import insert_onboarding_form_for_trainer_email, check_login, check_login_client ,create_account, show_form, resave, changeTrainerscode, fetch_trainer_code, client_check_trainer, get_forms_for_trainer_code, linktrainercode, save_form_details_client, get_client_submissions_for_trainers_code
+from DB.db import _sanitize_email, identities, insert_onboarding_form_for_trainer_email, create_account, show_form, resave, changeTrainerscode, fetch_trainer_code, client_check_trainer, get_forms_for_trainer_code, linktrainercode, save_form_details_client, get_client_submissions_for_trainers_code, get_form_by_uid, get_form_versions, get_form_version_ref, get_form_blob, get_form_answer_stats, search_client_submissions, get_client_form_assignments
+import invalidation
+import form_validation
+import passwords
+from cache import TTLCache
+from DB import partitions
+from DB import statements as stmts
 
 app = FastAPI()
 
@@ -60,6 +70,46 @@ engine = create_engine(
     future=True,
 )
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+stmts.instrument(engine)
+
+# --- Async SQLAlchemy setup (nutrition endpoints) ---
+# psycopg3's async driver, so intake/favorites/goals queries don't each hold a
+# threadpool worker; one process can keep hundreds of queries in flight.
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("postgresql+psycopg2://", "postgresql+psycopg://", 1),
+)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=int(os.getenv("ASYNC_DB_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "40")),
+    pool_timeout=30,
+    # psycopg3 prepares a statement server-side once it has run this many times on a connection
+    connect_args={"prepare_threshold": int(os.getenv("DB_PREPARE_THRESHOLD", "2"))},
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+stmts.instrument(async_engine)
+
+
+@app.on_event("startup")
+def start_cache_invalidation():
+    """Listen for cache invalidations broadcast by the other workers."""
+    invalidation.start_listener(DATABASE_URL)
+
+
+@app.on_event("startup")
+def ensure_intake_partitions():
+    """Keep daily_food_intake partitioned for the coming months while the worker runs."""
+    partitions.start_maintenance(
+        interval_seconds=float(os.getenv("PARTITION_ENSURE_INTERVAL_HOURS", "6")) * 3600,
+        months_ahead=3,
+    )
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
 
 
 
@@ -94,7 +144,9 @@ def save_form(form_data: Dict[str, Any]):
     form_id = form_data["formSchema"]
 
     if(form_id):
-        resave(form_data)
+        trainers_code = resave(form_data, before_commit=notify_trainer_forms_changed)
+        if trainers_code:
+            drop_trainer_forms(trainers_code)
         return {"message": "Form saved successfully", "form_data": form_data}
 
     else:
@@ -115,13 +167,32 @@ async def get_forms(request: Request):
     print("User email:", user_email)
     if user_email:
         # Process form data with user email
-        insert_onboarding_form_for_trainer_email(user_email, data)
+        saved = insert_onboarding_form_for_trainer_email(user_email, data, before_commit=notify_trainer_forms_changed)
+        drop_trainer_forms(saved["trainers_code"])
     else:
         return {"error": "User email not provided"}, 400
     
     return {"message": "Form received successfully", "data": data}
 
 
+@app.get("/api/forms/{form_id}")
+def get_form_by_id(form_id: str):
+    """Fetch one onboarding form by its id."""
+    form = get_form_by_uid(form_id)
+    if not form:
+        raise HTTPException(status_code=404, detail="Form not found")
+    return form
+
+
+@app.get("/api/forms/{form_id}/versions")
+def list_form_versions(form_id: str):
+    """Version history of a form (content hash and date per version), newest first."""
+    versions = get_form_versions(form_id)
+    if not versions:
+        raise HTTPException(status_code=404, detail="Form not found")
+    return {"form_id": form_id, "versions": versions}
+
+
 form = {
     "id": "form-1759307521509",
     "name": "joshuas form",
@@ -187,37 +258,99 @@ def signup(user: dict):
 
 from fastapi import HTTPException
 
+# ==================== PASSWORDS ====================
+
+# bcrypt runs on its own process pool (see passwords.py); raise PASSWORD_BCRYPT_ROUNDS
+# to make hashes more expensive, existing ones are upgraded as users log in
+password_hasher = passwords.PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    rounds=int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12")),
+    max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "256")),
+)
+
+LOGIN_STATEMENTS = {
+    "trainer": (stmts.TRAINER_LOGIN, stmts.UPDATE_TRAINER_PASSWORD),
+    "client": (stmts.CLIENT_LOGIN, stmts.UPDATE_CLIENT_PASSWORD),
+}
+
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+
+def _password_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many login attempts in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 @app.post('/login')
-def login(credentials: dict):
-    print("Received login request:", credentials)
+async def login(credentials: dict):
     email = credentials.get("email")
     password = credentials.get("password")
-    role = credentials.get("role")
+    role = "trainer" if credentials.get("role") == "trainer" else "client"
     
     if not email or not password:
         print("Missing email or password")
         raise HTTPException(status_code=400, detail="Email and password required")
-    
-    if role == "trainer":
-        user_data = check_login(email, password)
-        if user_data:
-            return {
-                "success": True, 
-                "message": "Login successful",
-                "user": user_data
-            }
-        else:
-            return {"success": False, "message": "Invalid credentials"}
-    else:
-        user_data = check_login_client(email, password)
-        if user_data:
-            return {
-                "success": True, 
-                "message": "Login successful",
-                "user": user_data
-            }
-        else:
+
+    find_user, update_password = LOGIN_STATEMENTS[role]
+
+    async with AsyncSessionLocal() as session:
+        try:
+            row = (await session.execute(find_user, {"email": _sanitize_email(email)})).fetchone()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    # No DB connection is held while bcrypt runs. Unknown emails get a dummy
+    # verify too, so the response time doesn't tell which emails have accounts.
+    try:
+        if not row:
+            await password_hasher.verify_unknown(password)
             return {"success": False, "message": "Invalid credentials"}
+        ok, new_hash = await password_hasher.verify(password, row.password)
+    except passwords.PasswordHasherBusy:
+        raise _password_busy()
+
+    if not ok:
+        return {"success": False, "message": "Invalid credentials"}
+
+    # Cost changed or legacy plaintext row: store the fresh hash
+    if new_hash is not None:
+        async with AsyncSessionLocal() as session:
+            try:
+                await session.execute(update_password, {
+                    "id": row.id,
+                    "new_password": new_hash,
+                    "old_password": row.password
+                })
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                print("Could not store rehashed password:", e)
+
+    return {
+        "success": True, 
+        "message": "Login successful",
+        "user": {
+            "id": row.id,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "email": row.email,
+            "country": getattr(row, "country", None),
+            "phone_number": getattr(row, "phone_number", None),
+            "role": role
+        }
+    }
+
+
+@app.get("/metrics/passwords")
+def password_metrics():
+    """Queue depth, throughput and timings of the password hashing pool."""
+    return password_hasher.stats()
 
 
 
@@ -228,7 +361,7 @@ def form_show(payload: dict = Body(...)):
     if not trainer_code:
         raise HTTPException(status_code=422, detail="trainer_code is required")
 
-    forms = get_forms_for_trainer_code(trainer_code)
+    forms = _trainer_forms(trainer_code.strip().upper())
     if not forms:
         raise HTTPException(status_code=404, detail="No forms found for this trainer")
     return {"form_schemas": forms}
@@ -239,19 +372,28 @@ engine = create_engine(db_url, pool_pre_ping=True)
 
 
 @app.post("/register")
-def register_client(client_data: dict):
-    print("Received client registration data:", client_data)
+async def register_client(client_data: dict):
+    public_data = {k: v for k, v in client_data.items() if k != "password"}
+    print("Received client registration data:", public_data)
 
     role = client_data.get("role")
     if role not in {"client", "trainer"}:
         raise HTTPException(status_code=400, detail="role must be 'client' or 'trainer'")
 
-    success = create_account(client_data, role)
+    if not client_data.get("password"):
+        raise HTTPException(status_code=400, detail="password is required")
+
+    try:
+        password_hash = await password_hasher.hash(client_data["password"])
+    except passwords.PasswordHasherBusy:
+        raise _password_busy()
+
+    success = await run_in_threadpool(create_account, client_data, role, password_hash)
     if not success:
         # In production, you might map specific DB errors to 409 (duplicate email), etc.
         raise HTTPException(status_code=500, detail=f"Could not create {role} account")
 
-    return {"message": f"{role.capitalize()} registered successfully", "client_data": client_data}
+    return {"message": f"{role.capitalize()} registered successfully", "client_data": public_data}
 
 
 @app.post("/saveonboardingform")
@@ -380,31 +522,106 @@ def link_trainer(payload: dict = Body(...)):
 
 
 
+# ==================== TRAINER FORM LISTS ====================
+
+# Form schemas per trainers_code. Creating or resaving a form drops the entry
+# and bumps its ETag on every worker, so an unchanged list is answered with 304
+# without touching the database. The TTL only guards against missed messages.
+trainer_forms_cache = TTLCache(maxsize=5000, ttl=3600)
+
+
+def _forms_code(trainers_code) -> str:
+    """Cache key form of a trainers_code, the same for request input and DB values."""
+    return str(trainers_code).strip().upper()
+
+
+def _trainer_forms_key(trainers_code) -> tuple:
+    return ("forms", _forms_code(trainers_code))
+
+
+def notify_trainer_forms_changed(db, trainers_code) -> None:
+    """Tell the other workers a trainer's forms changed; only sent if `db` commits."""
+    invalidation.notify(db, "forms", trainers_code)
+
+
+def drop_trainer_forms(trainers_code) -> None:
+    trainer_forms_cache.pop(_forms_code(trainers_code))
+    data_versions.bump(_trainer_forms_key(trainers_code))
+
+
+invalidation.register("forms", drop_trainer_forms)
+invalidation.register_reset(trainer_forms_cache.clear)
+
+
+def _trainer_forms(trainers_code: str) -> list:
+    trainers_code = _forms_code(trainers_code)
+    forms = trainer_forms_cache.get(trainers_code)
+    if forms is None:
+        version = data_versions.current(_trainer_forms_key(trainers_code))
+        forms = get_forms_for_trainer_code(trainers_code)
+        # Don't cache a list that was already replaced while it was being read
+        if data_versions.current(_trainer_forms_key(trainers_code)) == version:
+            trainer_forms_cache.set(trainers_code, forms)
+    return forms
+
+
 @app.get('/api/formshowfortrainer')
-def get_form(request: Request):
-    # Get the email from the query parameters
+def get_form(request: Request, response: Response):
+    """
+    All form schemas of the trainer with this email.
+    Supports If-None-Match: an unchanged list is answered with 304 and no query.
+    """
     email = request.query_params.get("email")
 
     if not email:
         raise HTTPException(status_code=422, detail="Email is required")
-    
-    print(f"Received request for form with email: {email}")
-    
-    # Simulate fetching form schemas based on the email
-    form_schemas = show_form(email)  # This function should return form data for the given email
-    print(f"Fetched form schemas: {form_schemas}")
-    
+
+    trainers_code = fetch_trainer_code(email)
+    if not trainers_code:
+        raise HTTPException(status_code=404, detail="No forms found for the given email")
+
+    etag = _etag(_trainer_forms_key(trainers_code))
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    form_schemas = _trainer_forms(trainers_code)
     if form_schemas:
+        response.headers["ETag"] = etag
         return {"form_schemas": form_schemas}
     else:
         raise HTTPException(status_code=404, detail="No forms found for the given email")
 
 
+SUBMISSIONS_MAX_PAGE = 200
+
+
+def _submissions_cursor(row: Dict[str, Any]) -> str:
+    raw = f"{row['submitted_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _parse_submissions_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        submitted_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(submitted_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+
 @app.get('/api/form-submissions')
-def form_submissions(trainers_code: Optional[str] = None, email: Optional[str] = None):
+def form_submissions(
+    trainers_code: Optional[str] = None,
+    email: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=SUBMISSIONS_MAX_PAGE, description="Page size; all submissions when omitted"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated field ids to return from form_data"),
+    summary: bool = Query(False, description="Leave form_data out")
+):
     """
-    Return client submissions visible to a trainer.
+    Return client submissions visible to a trainer, newest first.
     Provide either `trainers_code` or `email` (trainer email) as query parameter.
+    With `limit`, pass the returned `next_cursor` to get the following page.
     """
     # Resolve trainers_code from email if provided
     if not trainers_code and email:
@@ -413,13 +630,71 @@ def form_submissions(trainers_code: Optional[str] = None, email: Optional[str] =
     if not trainers_code:
         raise HTTPException(status_code=422, detail="trainers_code or trainer email is required")
 
+    before = _parse_submissions_cursor(cursor) if cursor else None
+    field_ids = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
     try:
-        submissions = get_client_submissions_for_trainers_code(trainers_code)
-        return {"submissions": submissions}
+        submissions = get_client_submissions_for_trainers_code(
+            trainers_code,
+            limit=limit + 1 if limit else None,
+            before=before,
+            fields=field_ids,
+            summary=summary
+        )
     except Exception as e:
         print("Error fetching submissions:", e)
         raise HTTPException(status_code=500, detail="Failed to fetch submissions")
 
+    next_cursor = None
+    if limit and len(submissions) > limit:
+        submissions = submissions[:limit]
+        next_cursor = _submissions_cursor(submissions[-1])
+
+    return {"submissions": submissions, "next_cursor": next_cursor}
+
+
+@app.get('/api/form-submissions/search')
+def search_form_submissions(
+    q: str = Query(..., min_length=1, description='Words, "phrases" or -excluded words'),
+    trainers_code: Optional[str] = None,
+    email: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Search the answers of a trainer's client submissions, best matches first.
+    Each result has up to three snippets: HTML-escaped answer text with the
+    matching words in <b>...</b>, safe to render as HTML.
+    Provide either `trainers_code` or `email` (trainer email).
+    """
+    if not trainers_code and email:
+        trainers_code = fetch_trainer_code(email)
+
+    if not trainers_code:
+        raise HTTPException(status_code=422, detail="trainers_code or trainer email is required")
+
+    try:
+        results = search_client_submissions(trainers_code, q, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    return {"query": q, "results": results}
+
+
+# Compiled validators per form version. Versions are immutable (content-addressed,
+# see 008_form_versions.sql), so entries never go stale and need no TTL.
+form_validators = TTLCache(maxsize=int(os.getenv("FORM_VALIDATOR_CACHE_SIZE", "1024")))
+
+
+def _form_validator(content_hash: str) -> Optional[form_validation.CompiledForm]:
+    validator = form_validators.get(content_hash)
+    if validator is None:
+        schema = get_form_blob(content_hash)
+        if schema is None:
+            return None
+        validator = form_validation.compile_form(schema)
+        form_validators.set(content_hash, validator)
+    return validator
+
 
 @app.post('/form-submit-client')
 def submit_form_client(submission_data: Dict[str, Any]):
@@ -430,6 +705,7 @@ def submit_form_client(submission_data: Dict[str, Any]):
         "email": "client@example.com",
         "trainer_code": "P4ON0",
         "form_id": "form-1762988893132",
+        "form_version_id": 42,  (optional, defaults to the form's current version)
         "values": { "field-1762988910056": "joshua", ... }
     }
     """
@@ -439,37 +715,173 @@ def submit_form_client(submission_data: Dict[str, Any]):
     email = submission_data.get("email")
     trainer_code = submission_data.get("trainer_code")
     form_id = submission_data.get("form_id")
+    form_version_id = submission_data.get("form_version_id")
     values = submission_data.get("values", {})
     
     # Validate required fields
     if not email:
-        return {"success": False, "detail": "Email is required"}, 400
+        raise HTTPException(status_code=400, detail="Email is required")
     
     if not trainer_code:
-        return {"success": False, "detail": "Trainer code is required"}, 400
+        raise HTTPException(status_code=400, detail="Trainer code is required")
     
     if not form_id:
-        return {"success": False, "detail": "Form ID is required"}, 400
-    
+        raise HTTPException(status_code=400, detail="Form ID is required")
+
+    if not isinstance(values, dict):
+        raise HTTPException(status_code=400, detail="Values must be an object")
+
+    # Validate against the version being answered
+    version = get_form_version_ref(form_id, form_version_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Form not found")
+
+    validator = _form_validator(version["content_hash"])
+    if validator is not None:
+        errors = validator.validate(values)
+        if errors:
+            return JSONResponse(
+                status_code=422,
+                content={"success": False, "detail": "Form submission is invalid", "errors": errors},
+            )
+
     # Save form data
     success = save_form_details_client(
         client_email=email,
         trainers_code=trainer_code,
         form_id=form_id,
-        form_data=values
+        form_data=values,
+        form_version_id=version["id"],
+        before_commit=lambda db: invalidation.notify(db, "form_submissions", trainer_code)
     )
     
     if success:
+        drop_form_analytics(trainer_code)
         return {
             "success": True,
             "message": "Form submitted successfully",
             "form_id": form_id
         }
     else:
-        return {
-            "success": False,
-            "detail": "Failed to save form submission"
-        }, 500
+        raise HTTPException(status_code=500, detail="Failed to save form submission")
+
+
+# Per-field answer analytics, cached per (trainer, form, version) and dropped
+# whenever that trainer receives a submission (on every worker)
+FORM_ANALYTICS_BUCKETS = 10
+form_analytics_cache = TTLCache(maxsize=512, ttl=3600)
+
+
+def _form_analytics_key(trainers_code) -> tuple:
+    return ("form_analytics", str(trainers_code))
+
+
+def drop_form_analytics(trainers_code) -> None:
+    data_versions.bump(_form_analytics_key(trainers_code))
+    form_analytics_cache.invalidate_where(lambda key: key[0] == str(trainers_code))
+
+
+invalidation.register("form_submissions", drop_form_analytics)
+invalidation.register_reset(form_analytics_cache.clear)
+
+
+def _form_analytics(trainers_code: str, form_id: str, version: Dict[str, Any], validator) -> Dict[str, Any]:
+    fields = list(validator.by_id.values())
+    numeric = [f.id for f in fields if f.type in form_validation.NUMERIC_TYPES]
+    choice = [f.id for f in fields if f.type in form_validation.CHOICE_TYPES or f.type == "checkbox"]
+
+    stats = get_form_answer_stats(
+        trainers_code,
+        form_id,
+        field_ids=[f.id for f in fields],
+        choice_field_ids=choice,
+        numeric_field_ids=numeric,
+        buckets=FORM_ANALYTICS_BUCKETS
+    )
+    total = stats["submissions"]
+
+    out = []
+    for f in fields:
+        answered = stats["answered"].get(f.id, 0)
+        entry = {
+            "field_id": f.id,
+            "label": f.label,
+            "type": f.type,
+            "answered": answered,
+            "completion_rate": round(answered / total, 4) if total else 0.0,
+        }
+        if f.id in choice:
+            counts = stats["options"].get(f.id, {})
+            # Listed options first (zero counts included), then anything else clients sent
+            options = {o: counts.get(o, 0) for o in f.options}
+            options.update({a: n for a, n in counts.items() if a not in options})
+            entry["options"] = options
+        if f.id in numeric:
+            summary = stats["numeric"].get(f.id)
+            if summary:
+                width = (max(summary["max"], summary["min"] + 1) - summary["min"]) / FORM_ANALYTICS_BUCKETS
+                entry["numeric"] = {
+                    "count": summary["n"],
+                    "min": summary["min"],
+                    "max": summary["max"],
+                    "mean": round(summary["mean"], 2),
+                    "median": summary["median"],
+                    "histogram": [
+                        {
+                            "from": round(summary["min"] + (b - 1) * width, 2),
+                            "to": round(summary["min"] + b * width, 2),
+                            "count": summary["buckets"].get(b, 0)
+                        }
+                        for b in range(1, FORM_ANALYTICS_BUCKETS + 1)
+                    ]
+                }
+            else:
+                entry["numeric"] = None
+        out.append(entry)
+
+    return {
+        "trainers_code": trainers_code,
+        "form_id": form_id,
+        "form_version_id": version["id"],
+        "submissions": total,
+        "fields": out
+    }
+
+
+@app.get('/api/form-analytics')
+def form_analytics(
+    trainers_code: str = Query(..., description="Trainer whose clients' submissions are aggregated"),
+    form_id: str = Query(..., description="Client-side form id"),
+    form_version_id: Optional[int] = Query(None, description="Version whose fields are reported; defaults to the current one")
+):
+    """
+    How a trainer's clients answered each question of a form: completion rate per
+    field, option counts for select/radio/checkbox fields and a histogram for
+    numeric fields. Submissions of every version of the form are included.
+    """
+    version = get_form_version_ref(form_id, form_version_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Form not found")
+
+    key = (trainers_code, form_id, version["id"])
+    cached = form_analytics_cache.get(key)
+    if cached is not None:
+        return cached
+
+    validator = _form_validator(version["content_hash"])
+    if validator is None:
+        raise HTTPException(status_code=404, detail="Form not found")
+
+    data_version = data_versions.current(_form_analytics_key(trainers_code))
+    try:
+        result = _form_analytics(trainers_code, form_id, version, validator)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    # Don't cache stats that a submission made stale while they were computed
+    if data_versions.current(_form_analytics_key(trainers_code)) == data_version:
+        form_analytics_cache.set(key, result)
+    return result
 
 
 
@@ -489,8 +901,16 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime, date, timedelta
 from pydantic import BaseModel, Field
 import uuid
+import asyncio
+import math
+import time
 import httpx
 
+from cache import TTLCache, VersionCounter
+import autocomplete
+import export
+from group_commit import GroupCommitWriter
+
 
 # OpenFoodFacts API URLs
 BASE_URL = 'https://world.openfoodfacts.org/api/v2'
@@ -529,6 +949,12 @@ class UpdateIntakeRequest(BaseModel):
     intake_date: Optional[str] = None
     intake_time: Optional[str] = None
 
+class CopyIntakeRequest(BaseModel):
+    user_id: str
+    source_date: str
+    target_date: str
+    meal_type: Optional[str] = None  # only copy this meal
+
 class AddFavoriteRequest(BaseModel):
     user_id: str
     product_name: str
@@ -558,6 +984,36 @@ class AddFavoriteToIntakeRequest(BaseModel):
     intake_date: Optional[str] = None
     intake_time: Optional[str] = None
 
+class SyncMutation(BaseModel):
+    entity: str                       # "intake", "favorites" or "goals"
+    op: str                           # "upsert" or "delete"
+    id: Optional[str] = None          # server id; omit to create a new intake/favorite
+    client_ref: Optional[str] = None  # echoed back so the client can map new ids; a create is applied once per client_ref
+    data: Dict[str, Any] = {}
+
+class SyncRequest(BaseModel):
+    since: int = 0
+    mutations: List[SyncMutation] = []
+
+class RecipeItemRequest(BaseModel):
+    favorite_id: Optional[str] = None  # one of favorite_id / barcode
+    barcode: Optional[str] = None
+    quantity: Optional[float] = None   # grams; defaults to the favorite's default_quantity
+
+class CreateRecipeRequest(BaseModel):
+    user_id: str
+    name: str
+    meal_type: Optional[str] = None
+    notes: Optional[str] = None
+    items: List[RecipeItemRequest]
+
+class LogRecipeRequest(BaseModel):
+    user_id: str
+    scale: float = 1.0                 # portion multiplier applied to every item
+    meal_type: Optional[str] = None    # defaults to the recipe's meal_type
+    intake_date: Optional[str] = None
+    intake_time: Optional[str] = None
+
 # ==================== OPENFOODFACTS HELPER FUNCTIONS ====================
 
 async def search_products_openfoodfacts(query: str, page_size: int, page: int) -> tuple[List[Dict], int]:
@@ -771,58 +1227,118 @@ import uuid
 
 # ==================== INTAKE OPERATIONS ====================
 
-def insert_intake_record(session, intake_data: dict):
+async def insert_intake_record(session, intake_data: dict):
     """
     Insert a food intake record into the database.
+    With group commit enabled the row is written by `intake_writer` instead,
+    together with the other rows of its burst, and `session` is not used.
     """
-    query = text("""
-        INSERT INTO daily_food_intake (
-            id, user_id, product_name, quantity_grams, carbs, protein, fat,
-            fiber, sugar, sodium, calories, meal_type, intake_date, intake_time,
-            barcode, created_at
-        ) VALUES (
-            :id, :user_id, :product_name, :quantity, :carbs, :protein, :fat,
-            :fiber, :sugar, :sodium, :calories, :meal_type, :intake_date, :intake_time,
-            :barcode, :created_at
-        )
-        RETURNING id, user_id, product_name, quantity_grams, carbs, protein, fat,
-                  calories, meal_type, intake_date, intake_time, created_at
-    """)
-    
-    result = session.execute(query, intake_data)
-    session.commit()
-    return result.fetchone()._asdict()
-from sqlalchemy import text
-from datetime import datetime, date
-import uuid
+    if intake_writer is not None:
+        return await intake_writer.submit(intake_data)
 
-# ==================== INTAKE OPERATIONS ====================
+    result = await session.execute(stmts.INSERT_INTAKE, intake_data)
+    saved = result.fetchone()._asdict()
+    await notify_intake_changed(session, intake_data["user_id"])
+    await session.commit()
+    bump_intake_version(intake_data["user_id"], saved["intake_date"])
+    return saved
+
+
+# ==================== CONDITIONAL GET ====================
+
+# Version tokens for /intake/daily (per user and day) and /favorites (per user).
+# Every intake or favorite mutation bumps them after commit, so a matching
+# If-None-Match is answered with 304 before the database is queried at all.
+data_versions = VersionCounter()
+
+
+def _intake_key(user_id, intake_date) -> tuple:
+    day = str(intake_date)
+    try:
+        day = date.fromisoformat(day[:10]).isoformat()
+    except ValueError:
+        pass
+    return ("intake", str(user_id), day)
+
+
+def _favorites_key(user_id) -> tuple:
+    return ("favorites", str(user_id))
+
+
+def _etag(key: tuple) -> str:
+    return f'"{key[0]}-{data_versions.current(key)}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+
+
+async def notify_intake_changed(session, user_id) -> None:
+    """Tell the other workers a user's intake changed; only sent if `session` commits."""
+    await invalidation.anotify(session, "intake", user_id)
+
+
+def bump_intake_version(user_id, intake_date=None) -> None:
+    """Invalidate intake ETags after commit: one day, or every day if `intake_date` is None."""
+    if intake_date is not None:
+        data_versions.bump(_intake_key(user_id, intake_date))
+    else:
+        data_versions.bump_where(lambda k: k[0] == "intake" and k[1] == str(user_id))
+    autocomplete_indexes.pop(str(user_id))
+
+
+async def notify_favorites_changed(session, user_id) -> None:
+    await invalidation.anotify(session, "favorites", user_id)
+
+
+def bump_favorites_version(user_id) -> None:
+    data_versions.bump(_favorites_key(user_id))
+    autocomplete_indexes.pop(str(user_id))
+
+
+# Other workers only know the user, not the day, so drop all of that user's tokens
+invalidation.register("intake", lambda user_id: bump_intake_version(user_id))
+invalidation.register("favorites", bump_favorites_version)
+# Reconnected listener: every ETag and read guard above may be stale
+invalidation.register_reset(data_versions.bump_all)
 
-def insert_intake_record(session, intake_data: dict):
-    """
-    Insert a food intake record into the database.
-    """
-    query = text("""
-        INSERT INTO daily_food_intake (
-            user_id, product_name, quantity_grams, carbs, protein, fat,
-            fiber, sugar, sodium, calories, meal_type, intake_date, intake_time,
-            barcode, created_at
-        ) VALUES (
-            :user_id, :product_name, :quantity, :carbs, :protein, :fat,
-            :fiber, :sugar, :sodium, :calories, :meal_type, :intake_date, :intake_time,
-            :barcode, :created_at
-        )
-        RETURNING id, user_id, product_name, quantity_grams, carbs, protein, fat,
-                  calories, meal_type, intake_date, intake_time, created_at
-    """)
-    
-    result = session.execute(query, intake_data)
-    session.commit()
-    return result.fetchone()._asdict()
+
+# ==================== GROUP COMMIT ====================
+
+# Opt-in: with INTAKE_GROUP_COMMIT_MS > 0, /intake/add and /intake/add-from-barcode
+# rows arriving within that many milliseconds share one INSERT and one commit.
+# Callers are still only answered after their row is committed.
+INTAKE_GROUP_COMMIT_MS = float(os.getenv("INTAKE_GROUP_COMMIT_MS", "0"))
+
+
+async def _notify_group_intake(session, saved: List[Dict[str, Any]]) -> None:
+    for user_id in {row["user_id"] for row in saved}:
+        await notify_intake_changed(session, user_id)
+
+
+def _bump_group_intake(saved: List[Dict[str, Any]]) -> None:
+    for row in saved:
+        bump_intake_version(row["user_id"], row["intake_date"])
+
+
+intake_writer = GroupCommitWriter(
+    AsyncSessionLocal,
+    stmts.GROUP_INSERT_INTAKE,
+    window_ms=INTAKE_GROUP_COMMIT_MS,
+    max_batch=int(os.getenv("INTAKE_GROUP_COMMIT_MAX_BATCH", "256")),
+    check_fields=("user_id", "product_name"),
+    before_commit=_notify_group_intake,
+    after_commit=_bump_group_intake,
+) if INTAKE_GROUP_COMMIT_MS > 0 else None
 
 
 @app.post("/intake/add")
-def add_intake(intake: AddIntakeRequest):
+async def add_intake(intake: AddIntakeRequest):
     """
     Add a food intake record.
     """
@@ -848,15 +1364,15 @@ def add_intake(intake: AddIntakeRequest):
         "created_at": current_time
     }
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            saved_record = insert_intake_record(session, record)
+            saved_record = await insert_intake_record(session, record)
             return {
                 "message": "Food intake added successfully",
                 "record": saved_record
             }
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
@@ -897,48 +1413,39 @@ async def add_intake_from_barcode(intake: AddIntakeFromBarcodeRequest):
         "created_at": current_time
     }
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            saved_record = insert_intake_record(session, record)
+            saved_record = await insert_intake_record(session, record)
             return {
                 "message": "Food intake added from barcode successfully",
                 "record": saved_record
             }
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/intake/daily/{user_id}")
-def get_daily_intake(
+async def get_daily_intake(
     user_id: str,
+    request: Request,
+    response: Response,
     intake_date: Optional[str] = Query(None, description="Date in YYYY-MM-DD format")
 ):
     """
     Get daily intake summary for a user.
+    Supports If-None-Match: an unchanged day is answered with 304 and no query.
     """
     target_date = intake_date or date.today().isoformat()
+
+    etag = _etag(_intake_key(user_id, target_date))
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     
-    query = text("""
-        SELECT 
-            id,
-            product_name,
-            quantity_grams,
-            calories,
-            protein,
-            carbs,
-            fat,
-            meal_type,
-            intake_time,
-            intake_date
-        FROM daily_food_intake
-        WHERE user_id = :user_id 
-        AND intake_date = :target_date
-        ORDER BY intake_time
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {"user_id": user_id, "target_date": target_date})
+            result = await session.execute(stmts.DAILY_INTAKE, {"user_id": user_id, "target_date": target_date})
             records = [dict(row._mapping) for row in result]
             
             # Calculate totals
@@ -961,25 +1468,22 @@ def get_daily_intake(
 
 
 @app.delete("/intake/delete/{id}")
-def delete_intake(id: str):
+async def delete_intake(id: str):
     """
     Delete a food intake record.
     """
-    query = text("""
-        DELETE FROM daily_food_intake
-        WHERE id = :id
-        RETURNING id
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {"id": id})
+            result = await session.execute(stmts.DELETE_INTAKE, {"id": id})
             deleted = result.fetchone()
             
             if not deleted:
                 raise HTTPException(status_code=404, detail="Intake record not found")
             
-            session.commit()
+            await notify_intake_changed(session, deleted.user_id)
+            await session.commit()
+            bump_intake_version(deleted.user_id, deleted.intake_date)
             return {
                 "message": "Intake record deleted successfully",
                 "id": id
@@ -987,12 +1491,12 @@ def delete_intake(id: str):
         except HTTPException:
             raise
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @app.get("/intake/range/{user_id}")
-def get_intake_range(
+async def get_intake_range(
     user_id: str,
     start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: str = Query(..., description="End date (YYYY-MM-DD)")
@@ -1000,24 +1504,10 @@ def get_intake_range(
     """
     Get intake records for a date range.
     """
-    query = text("""
-        SELECT 
-            intake_date,
-            COUNT(*) as total_records,
-            SUM(calories) as total_calories,
-            SUM(protein) as total_protein,
-            SUM(carbs) as total_carbs,
-            SUM(fat) as total_fat
-        FROM daily_food_intake
-        WHERE user_id = :user_id
-        AND intake_date BETWEEN :start_date AND :end_date
-        GROUP BY intake_date
-        ORDER BY intake_date
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {
+            result = await session.execute(stmts.INTAKE_DAILY_TOTALS, {
                 "user_id": user_id,
                 "start_date": start_date,
                 "end_date": end_date
@@ -1048,7 +1538,7 @@ def get_intake_range(
 
 
 @app.get("/intake/week/{user_id}")
-def get_weekly_summary(
+async def get_weekly_summary(
     user_id: str,
     week_date: Optional[str] = Query(None, description="Any date in the week (YYYY-MM-DD)")
 ):
@@ -1061,27 +1551,13 @@ def get_weekly_summary(
     week_start = target_date - timedelta(days=target_date.weekday())
     week_end = week_start + timedelta(days=6)
     
-    query = text("""
-        SELECT 
-            intake_date,
-            COUNT(*) as total_records,
-            SUM(calories) as total_calories,
-            SUM(protein) as total_protein,
-            SUM(carbs) as total_carbs,
-            SUM(fat) as total_fat
-        FROM daily_food_intake
-        WHERE user_id = :user_id
-        AND intake_date BETWEEN :week_start AND :week_end
-        GROUP BY intake_date
-        ORDER BY intake_date
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {
+            result = await session.execute(stmts.INTAKE_DAILY_TOTALS, {
                 "user_id": user_id,
-                "week_start": week_start.date().isoformat(),
-                "week_end": week_end.date().isoformat()
+                "start_date": week_start.date().isoformat(),
+                "end_date": week_end.date().isoformat()
             })
             
             daily_summaries = [
@@ -1109,69 +1585,97 @@ def get_weekly_summary(
 
 
 @app.put("/intake/update/{record_id}")
-def update_intake(record_id: str, update: UpdateIntakeRequest):
+async def update_intake(record_id: str, update: UpdateIntakeRequest):
     """
-    Update an existing intake record.
+    Update an existing intake record. A new quantity rescales all nutrients
+    proportionally; the updated row is returned.
     """
-    # Build dynamic update query based on provided fields
     update_fields = update.dict(exclude_none=True)
     
     if not update_fields:
         raise HTTPException(status_code=400, detail="No fields to update")
     
-    set_clause = ", ".join([f"{key} = :{key}" for key in update_fields.keys()])
+    # Fixed-shape statement: fields left as None keep their current value
+    params = {**update.dict(), "record_id": record_id}
     
-    query = text(f"""
-        UPDATE daily_food_intake
-        SET {set_clause}
-        WHERE id = :record_id
-        RETURNING id, product_name, quantity_grams, calories, protein, carbs, fat
-    """)
-    
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            update_fields["record_id"] = record_id
-            result = session.execute(query, update_fields)
+            result = await session.execute(stmts.UPDATE_INTAKE, params)
             updated = result.fetchone()
             
             if not updated:
                 raise HTTPException(status_code=404, detail="Intake record not found")
             
-            session.commit()
+            record = updated._asdict()
+            previous_date = record.pop("previous_intake_date")
+            await notify_intake_changed(session, updated.user_id)
+            await session.commit()
+            bump_intake_version(updated.user_id, previous_date)
+            if previous_date != updated.intake_date:
+                bump_intake_version(updated.user_id, updated.intake_date)
             return {
                 "message": "Intake record updated successfully",
                 "record_id": record_id,
-                "updated_fields": update.dict(exclude_none=True)
+                "updated_fields": update_fields,
+                "record": record
             }
         except HTTPException:
             raise
         except Exception as e:
-            session.rollback()
+            await session.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.post("/intake/copy")
+async def copy_intake(request: CopyIntakeRequest):
+    """
+    Copy all intake records of one day (or one meal of it) to another date
+    with a single INSERT ... SELECT. Returns the new records.
+    """
+    try:
+        source_date = date.fromisoformat(request.source_date).isoformat()
+        target_date = date.fromisoformat(request.target_date).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="source_date and target_date must be YYYY-MM-DD")
+
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(stmts.COPY_INTAKE, {
+                "user_id": request.user_id,
+                "source_date": source_date,
+                "target_date": target_date,
+                "meal_type": request.meal_type,
+                "created_at": datetime.now().isoformat()
+            })
+            records = [row._asdict() for row in result]
+
+            if records:
+                await notify_intake_changed(session, request.user_id)
+                await session.commit()
+                bump_intake_version(request.user_id, target_date)
+
+            return {
+                "message": f"Copied {len(records)} intake records",
+                "source_date": source_date,
+                "target_date": target_date,
+                "total_records": len(records),
+                "records": records
+            }
+        except Exception as e:
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 # ==================== FAVORITES OPERATIONS ====================
 
 @app.post("/favorites/add")
-def add_favorite(favorite: AddFavoriteRequest):
+async def add_favorite(favorite: AddFavoriteRequest):
     """
     Add a product to user's favorites.
     """
     favorite_id = str(uuid.uuid4())
     current_time = datetime.now().isoformat()
     
-    query = text("""
-        INSERT INTO user_favorites (
-            id, user_id, product_name, default_quantity, unit,
-            calories, protein, carbs, fat, fiber, sugar, sodium,
-            barcode, notes, created_at
-        ) VALUES (
-            :id, :user_id, :product_name, :default_quantity, :unit,
-            :calories, :protein, :carbs, :fat, :fiber, :sugar, :sodium,
-            :barcode, :notes, :created_at
-        )
-        RETURNING id, user_id, product_name, default_quantity, unit, created_at
-    """)
     
     record = {
         "id": favorite_id,
@@ -1191,18 +1695,20 @@ def add_favorite(favorite: AddFavoriteRequest):
         "created_at": current_time
     }
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, record)
+            result = await session.execute(stmts.INSERT_FAVORITE, record)
             saved = result.fetchone()._asdict()
-            session.commit()
+            await notify_favorites_changed(session, favorite.user_id)
+            await session.commit()
+            bump_favorites_version(favorite.user_id)
             
             return {
                 "message": "Favorite added successfully",
                 "favorite": saved
             }
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
@@ -1224,18 +1730,6 @@ async def add_favorite_from_barcode(favorite: AddFavoriteFromBarcodeRequest):
     favorite_id = str(uuid.uuid4())
     current_time = datetime.now().isoformat()
     
-    query = text("""
-        INSERT INTO user_favorites (
-            id, user_id, product_name, default_quantity, unit,
-            calories, protein, carbs, fat, fiber, sugar, sodium,
-            barcode, notes, created_at
-        ) VALUES (
-            :id, :user_id, :product_name, :default_quantity, :unit,
-            :calories, :protein, :carbs, :fat, :fiber, :sugar, :sodium,
-            :barcode, :notes, :created_at
-        )
-        RETURNING id, user_id, product_name, barcode, created_at
-    """)
     
     record = {
         "id": favorite_id,
@@ -1255,39 +1749,38 @@ async def add_favorite_from_barcode(favorite: AddFavoriteFromBarcodeRequest):
         "created_at": current_time
     }
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, record)
+            result = await session.execute(stmts.INSERT_FAVORITE, record)
             saved = result.fetchone()._asdict()
-            session.commit()
+            await notify_favorites_changed(session, favorite.user_id)
+            await session.commit()
+            bump_favorites_version(favorite.user_id)
             
             return {
                 "message": "Favorite added from barcode successfully",
                 "favorite": saved
             }
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @app.get("/favorites/{user_id}")
-def get_favorites(user_id: str):
+async def get_favorites(user_id: str, request: Request, response: Response):
     """
     Get all favorites for a user.
+    Supports If-None-Match: an unchanged list is answered with 304 and no query.
     """
-    query = text("""
-        SELECT 
-            id, product_name, default_quantity, unit,
-            calories, protein, carbs, fat,
-            barcode, notes, created_at
-        FROM user_favorites
-        WHERE user_id = :user_id
-        ORDER BY created_at DESC
-    """)
+    etag = _etag(_favorites_key(user_id))
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {"user_id": user_id})
+            result = await session.execute(stmts.FAVORITES_BY_USER, {"user_id": user_id})
             favorites = [dict(row._mapping) for row in result]
             
             return {
@@ -1300,22 +1793,17 @@ def get_favorites(user_id: str):
 
 
 @app.get("/favorites/detail/{favorite_id}")
-def get_favorite_detail(
+async def get_favorite_detail(
     favorite_id: str,
     user_id: str = Query(..., description="User ID to verify ownership")
 ):
     """
     Get detailed information about a specific favorite.
     """
-    query = text("""
-        SELECT *
-        FROM user_favorites
-        WHERE id = :favorite_id AND user_id = :user_id
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {"favorite_id": favorite_id, "user_id": user_id})
+            result = await session.execute(stmts.FAVORITE_BY_ID, {"favorite_id": favorite_id, "user_id": user_id})
             favorite = result.fetchone()
             
             if not favorite:
@@ -1329,28 +1817,25 @@ def get_favorite_detail(
 
 
 @app.delete("/favorites/{favorite_id}")
-def delete_favorite(
+async def delete_favorite(
     favorite_id: str,
     user_id: str = Query(..., description="User ID to verify ownership")
 ):
     """
     Delete a favorite.
     """
-    query = text("""
-        DELETE FROM user_favorites
-        WHERE id = :favorite_id AND user_id = :user_id
-        RETURNING id
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {"favorite_id": favorite_id, "user_id": user_id})
+            result = await session.execute(stmts.DELETE_FAVORITE, {"favorite_id": favorite_id, "user_id": user_id})
             deleted = result.fetchone()
             
             if not deleted:
                 raise HTTPException(status_code=404, detail="Favorite not found")
             
-            session.commit()
+            await notify_favorites_changed(session, user_id)
+            await session.commit()
+            bump_favorites_version(user_id)
             return {
                 "message": "Favorite deleted successfully",
                 "favorite_id": favorite_id
@@ -1358,25 +1843,20 @@ def delete_favorite(
         except HTTPException:
             raise
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @app.post("/favorites/add-to-intake")
-def add_favorite_to_intake(request: AddFavoriteToIntakeRequest):
+async def add_favorite_to_intake(request: AddFavoriteToIntakeRequest):
     """
     Add a favorite to intake log.
     """
     # Fetch favorite details
-    fetch_query = text("""
-        SELECT *
-        FROM user_favorites
-        WHERE id = :favorite_id AND user_id = :user_id
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(fetch_query, {
+            result = await session.execute(stmts.FAVORITE_BY_ID, {
                 "favorite_id": request.favorite_id,
                 "user_id": request.user_id
             })
@@ -1392,18 +1872,6 @@ def add_favorite_to_intake(request: AddFavoriteToIntakeRequest):
             intake_id = str(uuid.uuid4())
             current_time = datetime.now().isoformat()
             
-            insert_query = text("""
-                INSERT INTO daily_food_intake (
-                    id, user_id, product_name, quantity_grams,
-                    calories, protein, carbs, fat, fiber, sugar, sodium,
-                    meal_type, intake_date, intake_time, barcode, created_at
-                ) VALUES (
-                    :id, :user_id, :product_name, :quantity,
-                    :calories, :protein, :carbs, :fat, :fiber, :sugar, :sodium,
-                    :meal_type, :intake_date, :intake_time, :barcode, :created_at
-                )
-                RETURNING id, product_name, quantity_grams, calories, protein, carbs, fat
-            """)
             
             record = {
                 "id": intake_id,
@@ -1424,9 +1892,11 @@ def add_favorite_to_intake(request: AddFavoriteToIntakeRequest):
                 "created_at": current_time
             }
             
-            result = session.execute(insert_query, record)
+            result = await session.execute(stmts.INSERT_INTAKE_WITH_ID, record)
             saved = result.fetchone()._asdict()
-            session.commit()
+            await notify_intake_changed(session, request.user_id)
+            await session.commit()
+            bump_intake_version(request.user_id, record["intake_date"])
             
             return {
                 "message": "Favorite added to intake successfully",
@@ -1435,79 +1905,86 @@ def add_favorite_to_intake(request: AddFavoriteToIntakeRequest):
         except HTTPException:
             raise
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
         
 
 # Add these endpoints to your FastAPI backend
 
-@app.get("/goals/{user_id}")
-def get_user_goals(user_id: str):
-    """
-    Get nutrition goals for a user.
-    """
-    query = text("""
-        SELECT 
-            calorie_goal,
-            carbs_goal,
-            protein_goal,
-            fat_goal,
-            updated_at
-        FROM user_nutrition_goals
-        WHERE user_id = :user_id
-    """)
-    
-    with SessionLocal() as session:
-        try:
-            result = session.execute(query, {"user_id": user_id})
-            goals = result.fetchone()
-            
-            if not goals:
-                # Return default goals if none exist
-                return {
-                    "calorie_goal": 2000,
-                    "carbs_goal": 200,
-                    "protein_goal": 150,
-                    "fat_goal": 60,
-                    "has_custom_goals": False
-                }
-            
-            return {
-                "calorie_goal": goals.calorie_goal,
-                "carbs_goal": goals.carbs_goal,
-                "protein_goal": goals.protein_goal,
-                "fat_goal": goals.fat_goal,
-                "updated_at": goals.updated_at.isoformat() if hasattr(goals.updated_at, 'isoformat') else goals.updated_at,
-                "has_custom_goals": True
-            }
+# Goals used when a user has no row in user_nutrition_goals
+DEFAULT_GOALS = {
+    "calorie_goal": 2000,
+    "carbs_goal": 200,
+    "protein_goal": 150,
+    "fat_goal": 60,
+}
+
+# Goal responses per user_id (custom or synthesized defaults). Writes go through
+# this cache and are broadcast to the other workers; the TTL is only a safety net.
+goals_cache = TTLCache(maxsize=50000, ttl=6 * 3600)
+
+
+def _goals_key(user_id) -> tuple:
+    return ("goals", str(user_id))
+
+
+def drop_goals(user_id) -> None:
+    """Forget a user's cached goals, and make reads already in flight skip caching theirs."""
+    data_versions.bump(_goals_key(user_id))
+    goals_cache.pop(user_id)
+
+
+invalidation.register("goals", drop_goals)
+invalidation.register_reset(goals_cache.clear)
+
+
+def _goals_response(row) -> Dict[str, Any]:
+    """Shape a user_nutrition_goals row (or None) the way /goals/{user_id} returns it."""
+    if not row:
+        return {**DEFAULT_GOALS, "has_custom_goals": False}
+    return {
+        "calorie_goal": row.calorie_goal,
+        "carbs_goal": row.carbs_goal,
+        "protein_goal": row.protein_goal,
+        "fat_goal": row.fat_goal,
+        "updated_at": row.updated_at.isoformat() if hasattr(row.updated_at, 'isoformat') else row.updated_at,
+        "has_custom_goals": True
+    }
+
+
+@app.get("/goals/{user_id}")
+async def get_user_goals(user_id: str):
+    """
+    Get nutrition goals for a user.
+    """
+    cached = goals_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    
+    version = data_versions.current(_goals_key(user_id))
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(stmts.GOALS_BY_USER, {"user_id": user_id})
+            # Default goals are returned (and cached) if none exist
+            response = _goals_response(result.fetchone())
+            # An update that committed meanwhile already cached the newer goals
+            if data_versions.current(_goals_key(user_id)) == version:
+                goals_cache.set(user_id, response)
+            return response
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @app.post("/goals/update")
-def update_user_goals(goals: UpdateGoalsRequest):
+async def update_user_goals(goals: UpdateGoalsRequest):
     """
     Update or create nutrition goals for a user.
     """
-    query = text("""
-        INSERT INTO user_nutrition_goals (
-            user_id, calorie_goal, carbs_goal, protein_goal, fat_goal, created_at, updated_at
-        ) VALUES (
-            :user_id, :calorie_goal, :carbs_goal, :protein_goal, :fat_goal, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-        )
-        ON CONFLICT (user_id) 
-        DO UPDATE SET
-            calorie_goal = EXCLUDED.calorie_goal,
-            carbs_goal = EXCLUDED.carbs_goal,
-            protein_goal = EXCLUDED.protein_goal,
-            fat_goal = EXCLUDED.fat_goal,
-            updated_at = CURRENT_TIMESTAMP
-        RETURNING calorie_goal, carbs_goal, protein_goal, fat_goal, updated_at
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {
+            result = await session.execute(stmts.UPSERT_GOALS, {
                 "user_id": goals.user_id,
                 "calorie_goal": goals.calorie_goal,
                 "carbs_goal": goals.carbs_goal,
@@ -1515,52 +1992,784 @@ def update_user_goals(goals: UpdateGoalsRequest):
                 "fat_goal": goals.fat_goal
             })
             updated = result.fetchone()
-            session.commit()
-            
+            await invalidation.anotify(session, "goals", goals.user_id)
+            await session.commit()
+
+            response = _goals_response(updated)
+            drop_goals(goals.user_id)
+            goals_cache.set(goals.user_id, response)
+
             return {
                 "message": "Goals updated successfully",
-                "goals": {
-                    "calorie_goal": updated.calorie_goal,
-                    "carbs_goal": updated.carbs_goal,
-                    "protein_goal": updated.protein_goal,
-                    "fat_goal": updated.fat_goal,
-                    "updated_at": updated.updated_at.isoformat() if hasattr(updated.updated_at, 'isoformat') else updated.updated_at
-                }
+                "goals": {k: v for k, v in response.items() if k != "has_custom_goals"}
             }
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @app.delete("/goals/{user_id}")
-def reset_user_goals(user_id: str):
+async def reset_user_goals(user_id: str):
     """
     Delete custom goals for a user (will revert to defaults).
     """
-    query = text("""
-        DELETE FROM user_nutrition_goals
-        WHERE user_id = :user_id
-        RETURNING user_id
-    """)
     
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
-            result = session.execute(query, {"user_id": user_id})
+            result = await session.execute(stmts.DELETE_GOALS, {"user_id": user_id})
             deleted = result.fetchone()
             
             if not deleted:
                 raise HTTPException(status_code=404, detail="No custom goals found for this user")
-            
-            session.commit()
+
+            await invalidation.anotify(session, "goals", user_id)
+            await session.commit()
+            drop_goals(user_id)
+            goals_cache.set(user_id, _goals_response(None))
             return {
                 "message": "Goals reset to defaults successfully",
                 "user_id": user_id
             }
         except HTTPException:
             raise
+        except Exception as e:
+            await session.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ==================== RECIPES ====================
+
+NUTRIENTS = ["calories", "protein", "carbs", "fat", "fiber", "sugar", "sodium"]
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+async def _resolve_recipe_items(session, user_id: str, items: List[RecipeItemRequest]) -> List[Dict[str, Any]]:
+    """Turn favorites/barcodes into recipe_items rows with a per-100g nutrient vector."""
+    favorite_ids = [item.favorite_id for item in items if item.favorite_id]
+    favorites = {}
+    if favorite_ids:
+        result = await session.execute(stmts.FAVORITES_BY_IDS, {"user_id": user_id, "favorite_ids": favorite_ids})
+        favorites = {row.id: row for row in result}
+
+    barcodes = sorted({item.barcode for item in items if item.barcode and not item.favorite_id})
+    products = await asyncio.gather(*(get_product_by_barcode_openfoodfacts(code) for code in barcodes))
+    products = {code: format_product(product, 100) for code, product in zip(barcodes, products) if product}
+
+    rows = []
+    for position, item in enumerate(items):
+        if item.favorite_id:
+            favorite = favorites.get(item.favorite_id)
+            if favorite is None:
+                raise HTTPException(status_code=404, detail=f"Favorite not found: {item.favorite_id}")
+            base = float(favorite.default_quantity or 0)
+            row = {
+                "product_name": favorite.product_name,
+                "barcode": favorite.barcode,
+                "quantity_grams": item.quantity or base,
+            }
+            for nutrient in NUTRIENTS:
+                value = _to_float(getattr(favorite, nutrient))
+                row[f"{nutrient}_per_100g"] = value * 100 / base if value is not None and base else None
+        elif item.barcode:
+            product = products.get(item.barcode)
+            if product is None:
+                raise HTTPException(status_code=404, detail=f"Product not found in OpenFoodFacts database: {item.barcode}")
+            if not item.quantity:
+                raise HTTPException(status_code=422, detail=f"quantity is required for barcode {item.barcode}")
+            row = {
+                "product_name": product["product_name"] or "Unknown Product",
+                "barcode": item.barcode,
+                "quantity_grams": item.quantity,
+            }
+            for nutrient in NUTRIENTS:
+                row[f"{nutrient}_per_100g"] = _to_float(product["nutrients_per_100g"][nutrient])
+        else:
+            raise HTTPException(status_code=422, detail="Each recipe item needs a favorite_id or a barcode")
+
+        row.update({"position": position, "favorite_id": item.favorite_id})
+        rows.append(row)
+    return rows
+
+
+@app.post("/recipes")
+async def create_recipe(recipe: CreateRecipeRequest):
+    """
+    Save a named meal made of favorites and/or barcodes with quantities.
+    Nutrients are resolved to a per-100g vector once, here.
+    """
+    if not recipe.items:
+        raise HTTPException(status_code=422, detail="A recipe needs at least one item")
+
+    recipe_id = str(uuid.uuid4())
+
+    async with AsyncSessionLocal() as session:
+        try:
+            items = await _resolve_recipe_items(session, recipe.user_id, recipe.items)
+            result = await session.execute(stmts.INSERT_RECIPE, {
+                "id": recipe_id,
+                "user_id": recipe.user_id,
+                "name": recipe.name,
+                "meal_type": recipe.meal_type,
+                "notes": recipe.notes
+            })
+            saved = result.fetchone()._asdict()
+            await session.execute(stmts.INSERT_RECIPE_ITEM, [{**item, "recipe_id": recipe_id} for item in items])
+            await session.commit()
+
+            return {
+                "message": "Recipe created successfully",
+                "recipe": {**saved, "items": items}
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            await session.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.get("/recipes/{user_id}")
+async def get_recipes(user_id: str):
+    """
+    Get all recipes of a user with their items.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(stmts.RECIPES_BY_USER, {"user_id": user_id})
+            recipes = [dict(row._mapping) for row in result]
+
+            return {
+                "user_id": user_id,
+                "total_recipes": len(recipes),
+                "recipes": recipes
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.delete("/recipes/{recipe_id}")
+async def delete_recipe(
+    recipe_id: str,
+    user_id: str = Query(..., description="User ID to verify ownership")
+):
+    """
+    Delete a recipe and its items.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(stmts.DELETE_RECIPE, {"recipe_id": recipe_id, "user_id": user_id})
+            if not result.fetchone():
+                raise HTTPException(status_code=404, detail="Recipe not found")
+
+            await session.commit()
+            return {
+                "message": "Recipe deleted successfully",
+                "recipe_id": recipe_id
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            await session.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.post("/recipes/{recipe_id}/log")
+async def log_recipe(recipe_id: str, request: LogRecipeRequest):
+    """
+    Log every item of a recipe to the intake with one multi-row INSERT ... SELECT,
+    in one transaction.
+    """
+    if request.scale <= 0:
+        raise HTTPException(status_code=422, detail="scale must be positive")
+
+    intake_date = request.intake_date or date.today().isoformat()
+
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(stmts.LOG_RECIPE, {
+                "recipe_id": recipe_id,
+                "user_id": request.user_id,
+                "scale": request.scale,
+                "meal_type": request.meal_type,
+                "intake_date": intake_date,
+                "intake_time": request.intake_time or datetime.now().strftime("%H:%M:%S"),
+                "created_at": datetime.now().isoformat()
+            })
+            records = [row._asdict() for row in result]
+
+            if not records:
+                raise HTTPException(status_code=404, detail="Recipe not found")
+
+            await notify_intake_changed(session, request.user_id)
+            await session.commit()
+            bump_intake_version(request.user_id, intake_date)
+
+            return {
+                "message": "Recipe logged successfully",
+                "recipe_id": recipe_id,
+                "total_records": len(records),
+                "records": records
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            await session.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ==================== SUGGESTIONS ====================
+
+# A use in the requested meal/time-of-day counts this many times a use elsewhere
+SUGGESTION_CONTEXT_WEIGHT = 2.0
+
+
+def _tod_bucket(hour: int) -> str:
+    """Same buckets as intake_tod_bucket() in 006_user_suggestions.sql."""
+    if hour < 5:
+        return "night"
+    if hour < 11:
+        return "morning"
+    if hour < 15:
+        return "midday"
+    if hour < 18:
+        return "afternoon"
+    if hour < 22:
+        return "evening"
+    return "night"
+
+
+@app.get("/suggestions/{user_id}")
+async def get_suggestions(
+    user_id: str,
+    meal_type: Optional[str] = Query(None, description="Rank for this meal"),
+    hour: Optional[int] = Query(None, ge=0, le=23, description="Client's local hour, used when meal_type is not given"),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """
+    Quick-add suggestions: favorites and logged items ranked by recency-decayed
+    frequency, boosted for the given meal_type or time of day.
+    Reads a precomputed index (kept up to date by triggers), not the history.
+    """
+    if meal_type:
+        context = f"meal:{meal_type}"
+    else:
+        context = f"tod:{_tod_bucket(hour if hour is not None else datetime.now().hour)}"
+
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(stmts.SUGGESTIONS, {
+                "user_id": user_id,
+                "context": context,
+                "context_boost": math.log(SUGGESTION_CONTEXT_WEIGHT),
+                "k": limit * 2,
+                "limit": limit
+            })
+            suggestions = [row._asdict() for row in result]
+
+            return {
+                "user_id": user_id,
+                "context": context,
+                "total_suggestions": len(suggestions),
+                "suggestions": suggestions
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ==================== AUTOCOMPLETE ====================
+
+# Prefix indexes of active users, built on first use and dropped on writes
+# (see bump_intake_version / bump_favorites_version) or after the TTL
+autocomplete_indexes = TTLCache(maxsize=int(os.getenv("AUTOCOMPLETE_MAX_USERS", "5000")), ttl=900)
+invalidation.register_reset(autocomplete_indexes.clear)
+
+# Shared index of the most used products across all users
+product_index_cache = TTLCache(maxsize=1, ttl=600)
+AUTOCOMPLETE_TOP_PRODUCTS = 20000
+
+
+async def _user_autocomplete_index(user_id: str) -> autocomplete.PrefixIndex:
+    index = autocomplete_indexes.get(user_id)
+    if index is None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmts.AUTOCOMPLETE_USER_ITEMS, {"user_id": user_id})
+            index = autocomplete.PrefixIndex(
+                {
+                    "product_name": row.product_name,
+                    "barcode": row.barcode,
+                    "favorite_id": row.favorite_id,
+                    "source": "favorite" if row.context == "fav" else "history",
+                    "weight": row.score,
+                }
+                for row in result
+            )
+        autocomplete_indexes.set(user_id, index)
+    return index
+
+
+async def _product_autocomplete_index() -> autocomplete.PrefixIndex:
+    index = product_index_cache.get("products")
+    if index is None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmts.AUTOCOMPLETE_TOP_PRODUCTS, {"limit": AUTOCOMPLETE_TOP_PRODUCTS})
+            index = autocomplete.PrefixIndex(
+                {
+                    "product_name": row.product_name,
+                    "barcode": row.barcode,
+                    "favorite_id": None,
+                    "source": "popular",
+                    "weight": float(row.uses),
+                }
+                for row in result
+            )
+        product_index_cache.set("products", index)
+    return index
+
+
+@app.get("/autocomplete")
+async def autocomplete_products(
+    user_id: str = Query(..., description="User whose history and favorites come first"),
+    prefix: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    remote: bool = Query(False, description="Fill up with an OpenFoodFacts search if local results are short")
+):
+    """
+    Typeahead over the user's logged items, their favorites and the most used
+    products, answered from in-memory prefix indexes. OpenFoodFacts is only
+    queried when `remote=true`.
+    """
+    try:
+        user_index = await _user_autocomplete_index(user_id)
+        product_index = await _product_autocomplete_index()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    started = time.perf_counter()
+    matches = autocomplete.merge_results(prefix, limit, user_index, product_index)
+    took_ms = (time.perf_counter() - started) * 1000
+
+    results = [
+        {key: entry[key] for key in ("product_name", "barcode", "favorite_id", "source")}
+        for entry in matches
+    ]
+
+    if remote and len(results) < limit:
+        products, _ = await search_products_openfoodfacts(prefix, limit, 1)
+        names = {autocomplete.normalize(r["product_name"]) for r in results}
+        for product in products:
+            name = product.get("product_name") or ""
+            if not name or autocomplete.normalize(name) in names:
+                continue
+            names.add(autocomplete.normalize(name))
+            results.append({"product_name": name, "barcode": product.get("barcode"), "favorite_id": None, "source": "openfoodfacts"})
+            if len(results) >= limit:
+                break
+
+    return {
+        "prefix": prefix,
+        "total_results": len(results),
+        "results": results,
+        "took_ms": round(took_ms, 3)
+    }
+
+
+# ==================== DELTA SYNC ====================
+
+SYNC_ENTITIES = {"intake", "favorites", "goals"}
+SYNC_OPS = {"upsert", "delete"}
+
+INTAKE_SYNC_FIELDS = [
+    "product_name", "quantity", "calories", "protein", "carbs", "fat", "fiber",
+    "sugar", "sodium", "meal_type", "intake_date", "intake_time", "barcode"
+]
+FAVORITE_SYNC_FIELDS = [
+    "product_name", "default_quantity", "unit", "calories", "protein", "carbs",
+    "fat", "fiber", "sugar", "sodium", "barcode", "notes"
+]
+
+
+async def _replayed_create(session, user_id: str, m: SyncMutation) -> Optional[str]:
+    """
+    For a create carrying a client_ref: the id made by an earlier push of the
+    same client_ref, or None after claiming the ref for this push.
+    """
+    params = {"user_id": user_id, "client_ref": m.client_ref}
+    claimed = (await session.execute(stmts.SYNC_CLAIM_CLIENT_REF, {**params, "entity": m.entity})).fetchone()
+    if claimed:
+        return None
+    row = (await session.execute(stmts.SYNC_CLIENT_REF_ENTITY, params)).fetchone()
+    return row.entity_id
+
+
+async def _apply_sync_mutation(session, user_id: str, m: SyncMutation) -> Dict[str, Any]:
+    """Apply one client mutation inside the caller's transaction."""
+    outcome = {"client_ref": m.client_ref, "entity": m.entity, "op": m.op}
+
+    # Creates are made once per client_ref, however often the client pushes them
+    creating = m.op != "delete" and not m.id and m.entity in ("intake", "favorites") and m.client_ref
+    if creating:
+        existing = await _replayed_create(session, user_id, m)
+        if existing is not None:
+            outcome.update({"id": existing, "status": "applied"})
+            return outcome
+
+    if m.entity == "intake":
+        if m.op == "delete":
+            row = (await session.execute(stmts.SYNC_DELETE_INTAKE, {"id": m.id, "user_id": user_id})).fetchone()
+        else:
+            params = {field: m.data.get(field) for field in INTAKE_SYNC_FIELDS}
+            params["user_id"] = user_id
+            if m.id:
+                params["id"] = m.id
+                row = (await session.execute(stmts.SYNC_UPDATE_INTAKE, params)).fetchone()
+            else:
+                params["intake_date"] = params["intake_date"] or date.today().isoformat()
+                params["intake_time"] = params["intake_time"] or datetime.now().strftime("%H:%M:%S")
+                params["created_at"] = datetime.now().isoformat()
+                row = (await session.execute(stmts.INSERT_INTAKE, params)).fetchone()
+
+    elif m.entity == "favorites":
+        if m.op == "delete":
+            row = (await session.execute(stmts.DELETE_FAVORITE, {"favorite_id": m.id, "user_id": user_id})).fetchone()
+        else:
+            params = {field: m.data.get(field) for field in FAVORITE_SYNC_FIELDS}
+            params.update({
+                "id": m.id or str(uuid.uuid4()),
+                "user_id": user_id,
+                "created_at": datetime.now().isoformat()
+            })
+            row = (await session.execute(stmts.SYNC_UPSERT_FAVORITE, params)).fetchone()
+
+    else:
+        if m.op == "delete":
+            row = (await session.execute(stmts.DELETE_GOALS, {"user_id": user_id})).fetchone()
+        else:
+            params = {key: m.data.get(key) for key in DEFAULT_GOALS}
+            params.update({f"default_{key}": default for key, default in DEFAULT_GOALS.items()})
+            params["user_id"] = user_id
+            row = (await session.execute(stmts.SYNC_UPSERT_GOALS, params)).fetchone()
+
+    outcome["id"] = str(row[0]) if row else m.id
+    outcome["status"] = "applied" if row else "not_found"
+    if creating and row:
+        await session.execute(stmts.SYNC_RECORD_CLIENT_REF, {
+            "user_id": user_id,
+            "client_ref": m.client_ref,
+            "entity_id": outcome["id"]
+        })
+    return outcome
+
+
+async def _changes_since(session, user_id: str, since: int) -> Dict[str, Any]:
+    result = await session.execute(stmts.SYNC_CHANGES, {"user_id": user_id, "since": since})
+
+    next_cursor = since
+    upserts = {entity: [] for entity in SYNC_ENTITIES}
+    deletes = {entity: [] for entity in SYNC_ENTITIES}
+    for row in result:
+        next_cursor = row.seq + 1
+        if row.op == "D":
+            deletes[row.entity].append(row.entity_id)
+        else:
+            upserts[row.entity].append(row.data)
+
+    return {
+        "user_id": user_id,
+        "since": since,
+        "next": next_cursor,
+        "upserts": {entity: rows for entity, rows in upserts.items() if rows},
+        "deletes": {entity: ids for entity, ids in deletes.items() if ids}
+    }
+
+
+@app.get("/sync/{user_id}")
+async def sync_changes(
+    user_id: str,
+    since: int = Query(0, ge=0, description="Cursor returned as 'next' by the previous sync")
+):
+    """
+    Intake records, favorites and goals changed since the cursor, plus
+    tombstones for deleted ones. Pass the returned `next` on the following call.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            return await _changes_since(session, user_id, since)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.post("/sync/{user_id}")
+async def sync_push(user_id: str, request: SyncRequest):
+    """
+    Apply a batch of offline mutations in one transaction, then return
+    everything changed since `request.since` (including these mutations).
+    """
+    for m in request.mutations:
+        if m.entity not in SYNC_ENTITIES or m.op not in SYNC_OPS:
+            raise HTTPException(status_code=422, detail=f"Unsupported mutation {m.entity}/{m.op}")
+        if m.op == "delete" and m.entity != "goals" and not m.id:
+            raise HTTPException(status_code=422, detail=f"Deleting {m.entity} requires an id")
+
+    touched = {m.entity for m in request.mutations}
+
+    async with AsyncSessionLocal() as session:
+        try:
+            results = [await _apply_sync_mutation(session, user_id, m) for m in request.mutations]
+
+            if "intake" in touched:
+                await notify_intake_changed(session, user_id)
+            if "favorites" in touched:
+                await notify_favorites_changed(session, user_id)
+            if "goals" in touched:
+                await invalidation.anotify(session, "goals", user_id)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+        if "intake" in touched:
+            bump_intake_version(user_id)
+        if "favorites" in touched:
+            bump_favorites_version(user_id)
+        if "goals" in touched:
+            drop_goals(user_id)
+
+        try:
+            response = await _changes_since(session, user_id, request.since)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    response["results"] = results
+    return response
+
+
+# ==================== EXPORT ====================
+
+EXPORT_BATCH_SIZE = 50000
+
+EXPORT_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+async def _stream_intake_export(fmt: str, user_id, trainers_code, start_date, end_date):
+    query = stmts.intake_export(bool(user_id), bool(trainers_code), bool(start_date), bool(end_date))
+    params = {"user_id": user_id, "trainers_code": trainers_code, "start_date": start_date, "end_date": end_date}
+
+    async with AsyncSessionLocal() as session:
+        # Server-side cursor: rows are fetched EXPORT_BATCH_SIZE at a time
+        result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE), params)
+        async for chunk in export.encode_batches(result.partitions(EXPORT_BATCH_SIZE), fmt):
+            yield chunk
+
+
+@app.get("/export/intake.{fmt}")
+async def export_intake(
+    fmt: str,
+    user_id: Optional[str] = Query(None, description="Export a single user"),
+    trainers_code: Optional[str] = Query(None, description="Export every client linked to this trainer"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
+):
+    """
+    Stream daily_food_intake as zstd-compressed Parquet (/export/intake.parquet)
+    or an Arrow IPC stream (/export/intake.arrow). Filters combine with AND.
+    """
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Export format must be 'parquet' or 'arrow'")
+    if export.pa is None:
+        raise HTTPException(status_code=501, detail="Columnar export requires pyarrow to be installed")
+    if not (user_id or trainers_code or start_date or end_date):
+        raise HTTPException(status_code=422, detail="Provide user_id, trainers_code or a date range")
+
+    try:
+        start = date.fromisoformat(start_date) if start_date else None
+        end = date.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="start_date and end_date must be YYYY-MM-DD")
+
+    if trainers_code:
+        trainers_code = trainers_code.strip().upper()
+
+    # Only safe characters in the header, whatever the caller passed
+    filename_key = re.sub(r"[^A-Za-z0-9_-]", "", str(user_id or trainers_code or "")) or "all"
+    filename = f"intake-{filename_key}.{fmt}"
+    return StreamingResponse(
+        _stream_intake_export(fmt, user_id, trainers_code, start, end),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+# ==================== TRAINER COHORT ====================
+
+# Cohort results per (trainers_code, start, end); short TTL since clients keep logging
+cohort_cache = TTLCache(maxsize=256, ttl=60)
+
+def _adherence(total, days_logged: int, goal) -> Optional[float]:
+    """Average daily intake on logged days as a percentage of the goal."""
+    if not days_logged or not goal:
+        return None
+    return round(float(total or 0) / days_logged / float(goal) * 100, 1)
+
+
+@app.get("/trainer/{trainers_code}/cohort")
+def get_trainer_cohort(
+    trainers_code: str,
+    start: Optional[str] = Query(None, description="Start date (YYYY-MM-DD), defaults to 6 days before end"),
+    end: Optional[str] = Query(None, description="End date (YYYY-MM-DD), defaults to today")
+):
+    """
+    Per-client intake totals, goal adherence and last-log time for every client
+    linked to a trainer, computed in one set-based query.
+    """
+    trainers_code = trainers_code.strip().upper()
+    try:
+        end_date = date.fromisoformat(end) if end else date.today()
+        start_date = date.fromisoformat(start) if start else end_date - timedelta(days=6)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="start and end must be YYYY-MM-DD")
+
+    if start_date > end_date:
+        raise HTTPException(status_code=422, detail="start must be on or before end")
+
+    cache_key = (trainers_code, start_date, end_date)
+    cached = cohort_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    with SessionLocal() as session:
+        try:
+            result = session.execute(stmts.COHORT, {
+                "trainers_code": trainers_code,
+                "start_date": start_date,
+                "end_date": end_date
+            })
+
+            clients = []
+            for row in result:
+                goals = {
+                    key: getattr(row, key) if getattr(row, key) is not None else default
+                    for key, default in DEFAULT_GOALS.items()
+                }
+                totals = {
+                    "calories": round(float(row.total_calories or 0), 2),
+                    "protein": round(float(row.total_protein or 0), 2),
+                    "carbs": round(float(row.total_carbs or 0), 2),
+                    "fat": round(float(row.total_fat or 0), 2)
+                }
+                clients.append({
+                    "client_id": row.client_id,
+                    "first_name": row.first_name,
+                    "last_name": row.last_name,
+                    "email": row.email,
+                    "total_records": row.total_records,
+                    "days_logged": row.days_logged,
+                    "totals": totals,
+                    "goals": goals,
+                    "has_custom_goals": row.calorie_goal is not None,
+                    "adherence_pct": {
+                        "calories": _adherence(row.total_calories, row.days_logged, goals["calorie_goal"]),
+                        "protein": _adherence(row.total_protein, row.days_logged, goals["protein_goal"]),
+                        "carbs": _adherence(row.total_carbs, row.days_logged, goals["carbs_goal"]),
+                        "fat": _adherence(row.total_fat, row.days_logged, goals["fat_goal"])
+                    },
+                    "last_intake_date": row.last_intake_date.isoformat() if hasattr(row.last_intake_date, 'isoformat') else row.last_intake_date,
+                    "last_intake_time": row.last_intake_time.isoformat() if hasattr(row.last_intake_time, 'isoformat') else row.last_intake_time
+                })
+
+            response = {
+                "trainers_code": trainers_code,
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "days_in_range": (end_date - start_date).days + 1,
+                "total_clients": len(clients),
+                "clients": clients
+            }
+            cohort_cache.set(cache_key, response)
+            return response
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ==================== FORM ASSIGNMENT ====================
+
+@app.post("/trainer/{trainers_code}/forms/{form_id}/assign")
+def assign_form_to_clients(trainers_code: str, form_id: str):
+    """
+    Assign one of the trainer's forms to every client linked to the trainer,
+    in one set-based statement. Clients who already have it are counted, not
+    assigned again.
+    """
+    trainers_code = trainers_code.strip().upper()
+
+    with SessionLocal() as session:
+        try:
+            row = session.execute(stmts.ASSIGN_FORM_TO_CLIENTS, {
+                "trainers_code": trainers_code,
+                "form_id": form_id
+            }).fetchone()
+            session.commit()
         except Exception as e:
             session.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if not row.found:
+        raise HTTPException(status_code=404, detail="Form not found for this trainer")
+
+    created = list(row.created)
+    return {
+        "trainers_code": trainers_code,
+        "form_id": form_id,
+        "form_version_id": row.version_id,
+        "total_clients": row.targets,
+        "created": len(created),
+        "already_assigned": row.targets - len(created),
+        "created_client_ids": created
+    }
+
+
+@app.get("/client/forms/assigned")
+def client_assigned_forms(
+    email: str = Query(..., description="Client email"),
+    pending: bool = Query(False, description="Only forms not answered since they were assigned")
+):
+    """Forms the client's trainers assigned to them, with whether each was answered."""
+    try:
+        assignments = get_client_form_assignments(email, pending_only=pending)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if assignments is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+
+    return {
+        "email": email,
+        "count": len(assignments),
+        "assignments": [
+            {
+                "form_id": a["form_uid"],
+                "trainers_code": a["trainers_code"],
+                "form_version_id": a["form_version_id"],
+                "title": a["title"],
+                "description": a["description"],
+                "assigned_at": a["assigned_at"].isoformat() if a["assigned_at"] else None,
+                "answered_at": a["answered_at"].isoformat() if a["answered_at"] else None,
+                "pending": a["answered_at"] is None
+            }
+            for a in assignments
+        ]
+    }
+
+
 # ==================== HEALTH CHECK ====================
 
 @app.get("/")
@@ -1570,4 +2779,13 @@ def root():
         "status": "ok",
         "message": "Nutrition API is running",
         "version": "1.0.0"
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/metrics/statements")
+def statement_metrics():
+    """Execution counts and timings per registered SQL statement."""
+    metrics = {"statements": stmts.stats(), "identities": identities.stats()}
+    if intake_writer is not None:
+        metrics["intake_group_commit"] = intake_writer.stats()
+    return metrics
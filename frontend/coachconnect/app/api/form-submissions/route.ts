@@ -11,7 +11,12 @@ export async function GET(request: Request) {
     }
 
     const backendUrl = "http://127.0.0.1:8000/api/form-submissions"
-    const query = trainers_code ? `?trainers_code=${encodeURIComponent(trainers_code)}` : `?email=${encodeURIComponent(email!)}`
+    let query = trainers_code ? `?trainers_code=${encodeURIComponent(trainers_code)}` : `?email=${encodeURIComponent(email!)}`
+    // Pagination / projection options pass straight through
+    for (const key of ["limit", "cursor", "fields", "summary"]) {
+      const value = url.searchParams.get(key)
+      if (value) query += `&${key}=${encodeURIComponent(value)}`
+    }
 
     const res = await fetch(`${backendUrl}${query}`, {
       method: "GET",
@@ -27,6 +27,7 @@ export async function POST(req: NextRequest) {
         trainer_code: body.trainer_code,
         form_id: body.form_id,
         values: body.values,
+        form_version_id: body.form_version_id, // versie die de client invulde
         email: body.email, // Email wordt nu meegestuurd naar backend
       }),
     })
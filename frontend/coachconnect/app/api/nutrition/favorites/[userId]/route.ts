@@ -7,14 +7,24 @@ export async function GET(
   { params }: { params: { userId: string } }
 ) {
   try {
-    const response = await fetch(`${BACKEND_URL}/favorites/${params.userId}`)
+    // Forward the browser's ETag so an unchanged list comes back as 304 without a body
+    const ifNoneMatch = request.headers.get('if-none-match')
+    const response = await fetch(`${BACKEND_URL}/favorites/${params.userId}`, {
+      headers: ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : undefined,
+      cache: 'no-store',
+    })
+    const etag = response.headers.get('etag')
+
+    if (response.status === 304) {
+      return new NextResponse(null, { status: 304, headers: etag ? { ETag: etag } : undefined })
+    }
 
     if (!response.ok) {
       return NextResponse.json({ error: 'Failed to fetch favorites' }, { status: response.status })
     }
 
     const data = await response.json()
-    return NextResponse.json(data)
+    return NextResponse.json(data, { headers: etag ? { ETag: etag } : undefined })
   } catch (error) {
     console.error('Fetch favorites error:', error)
     return NextResponse.json({ error: 'Internal server error' }, { status: 500 })
@@ -14,14 +14,24 @@ export async function GET(request: NextRequest, context: any) {
       ? `${BACKEND_URL}/intake/daily/${params.userId}?intake_date=${intakeDate}`
       : `${BACKEND_URL}/intake/daily/${params.userId}`
 
-    const response = await fetch(url)
+    // Forward the browser's ETag so unchanged days come back as 304 without a body
+    const ifNoneMatch = request.headers.get('if-none-match')
+    const response = await fetch(url, {
+      headers: ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : undefined,
+      cache: 'no-store',
+    })
+    const etag = response.headers.get('etag')
+
+    if (response.status === 304) {
+      return new NextResponse(null, { status: 304, headers: etag ? { ETag: etag } : undefined })
+    }
 
     if (!response.ok) {
       return NextResponse.json({ error: 'Failed to fetch daily intake' }, { status: response.status })
     }
 
     const data = await response.json()
-    return NextResponse.json(data)
+    return NextResponse.json(data, { headers: etag ? { ETag: etag } : undefined })
   } catch (error) {
     console.error('Daily intake error:', error)
     return NextResponse.json({ error: 'Internal server error' }, { status: 500 })